@@ -0,0 +1,298 @@
+"""
+admission.py — Queued admission to the per-speaker play locks.
+
+A speaker may only be driven by one play at a time.  Each speaker has its
+own ``flock`` file next to the base lock path (``/run/flag.lock`` gives
+``/run/flag-<ip>.lock``), and a play locks every speaker it targets, so:
+
+* plays on disjoint speaker sets (the flagpole and the chapel) run at the
+  same time;
+* plays sharing a speaker still run one after the other.
+
+Plays used to take a single install-wide lock without waiting (``flock -n``),
+so a play that fired while another was still running was simply dropped.
+:class:`PlayAdmission` queues it instead:
+
+* each request has a *priority* (higher first, then first come, first
+  served) and a *max wait* — how late it may still start;
+* a waiting request takes its locks as soon as none of its speakers is in
+  use and no request ahead of it in the queue wants one of them;
+* a request that cannot start within its max wait is skipped, as before.
+
+Priorities are honoured among the requests of one process — in practice the
+resident daemon (``flagd.py``), which runs every scheduled play.  A play in
+another process (the daemon-less fallback) holds the same ``flock`` files; a
+request with no conflict in this process polls for them until its deadline.
+
+The queue is observable: :meth:`PlayAdmission.status` reports the plays in
+progress, the waiting requests and the wait-time totals (``flagd.py queue``
+prints them), and every queued request logs its depth and wait.
+"""
+
+import bisect
+import fcntl
+import itertools
+import logging
+import os
+import threading
+import time
+
+_log = logging.getLogger(__name__)
+
+# How often a request retries locks held by another process.
+_POLL_SECS = 0.2
+
+
+def try_flock(path):
+    """
+    Take the ``flock`` on *path* without blocking.
+
+    Returns:
+        file | None: The open lock file (held until closed), or ``None`` if
+        another open file holds the lock.
+    """
+    lock_file = None
+    try:
+        lock_file = open(path, "w")
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return lock_file
+    except OSError:
+        if lock_file is not None:
+            lock_file.close()
+        return None
+
+
+def speaker_lock_path(path, speaker):
+    """
+    Return the lock file of *speaker* for the base lock *path*.
+
+    ``speaker_lock_path("/run/flag.lock", "10.0.40.86")`` is
+    ``/run/flag-10.0.40.86.lock``; a ``None`` speaker locks *path* itself.
+    """
+    if speaker is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{speaker.replace(os.sep, '_')}{ext}"
+
+
+class PlayLock:
+    """The ``flock`` files of one admitted play; :meth:`close` releases them all."""
+
+    def __init__(self, files, speakers):
+        self.files = files
+        self.speakers = speakers
+
+    def fds(self):
+        """Return the file descriptors of the held lock files."""
+        return [f.fileno() for f in self.files]
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+
+class PlayAdmission:
+    """
+    Priority queue in front of the per-speaker play locks of base path *path*.
+
+    Thread-safe; :meth:`acquire` blocks the calling thread while it waits.
+    """
+
+    def __init__(self, path, poll_secs=_POLL_SECS):
+        self.path = path
+        self.poll_secs = poll_secs
+        self._cond = threading.Condition()
+        self._queue = []          # sorted (-priority, seq, request)
+        self._seq = itertools.count()
+        self._holders = {}        # id(PlayLock) -> request holding it
+        self._admitted = 0
+        self._skipped = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def acquire(self, name="play", priority=0, max_wait=0, speakers=None):
+        """
+        Wait for the locks of *speakers* in priority order, for at most *max_wait* seconds.
+
+        Args:
+            name (str): Request name for logs and :meth:`status`.
+            priority (int): Higher values are admitted first.
+            max_wait (float): Longest wait before the request is skipped;
+                ``0`` behaves like ``flock -n``.
+            speakers (list[str] | None): Speakers (IP addresses) the play
+                targets.  ``None`` locks the base path itself, i.e. one play
+                at a time among the requests that do the same.
+
+        Returns:
+            PlayLock | None: The held locks (release them with
+            :meth:`release`), or ``None`` if the request was skipped.
+        """
+        keys = sorted(set(speakers)) if speakers else [None]
+        request = {"name": name, "priority": priority, "speakers": keys,
+                   "queued_at": time.monotonic()}
+        entry = (-priority, next(self._seq), request)
+        deadline = request["queued_at"] + max_wait
+        logged = False
+        with self._cond:
+            bisect.insort(self._queue, entry)
+            try:
+                while True:
+                    blockers = self._blockers(entry)
+                    if not blockers:
+                        lock = self._try_locks(keys)
+                        if lock is not None:
+                            self._queue.remove(entry)
+                            return self._admit(request, lock)
+                        blockers = ["another process"]
+                    if not logged:
+                        _log.info(
+                            "Play '%s' queued behind %s (queue depth %d, priority %d, may wait %g s)",
+                            name, ", ".join(f"'{b}'" for b in blockers), len(self._queue),
+                            priority, max_wait,
+                        )
+                        logged = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._skip(entry)
+                        return None
+                    # Locks held by another process are polled; conflicts in
+                    # this process wake us through release/skip.
+                    in_process = blockers != ["another process"]
+                    self._cond.wait(remaining if in_process else min(remaining, self.poll_secs))
+            except BaseException:
+                if entry in self._queue:
+                    self._skip(entry)
+                raise
+
+    def try_acquire(self, name, speakers):
+        """
+        Take whichever locks of *speakers* are free right now, without queueing.
+
+        For speakers a play reaches only through their group (see
+        ``sonos_play._lock_group_members``): a held one is reported instead
+        of waited for, and the caller leaves it alone.
+
+        Args:
+            name (str): Holder name for logs and :meth:`status`.
+            speakers (list[str]): Speakers (IP addresses) to lock.
+
+        Returns:
+            tuple[PlayLock | None, list[str]]: The locks taken (``None`` if
+            none were free; release them with :meth:`release`) and the
+            speakers another play holds.
+        """
+        files, taken, busy = [], [], []
+        with self._cond:
+            for key in sorted(set(speakers)):
+                lock_file = try_flock(speaker_lock_path(self.path, key))
+                if lock_file is None:
+                    busy.append(key)
+                else:
+                    files.append(lock_file)
+                    taken.append(key)
+            if not files:
+                return None, busy
+            lock = PlayLock(files, taken)
+            now = time.monotonic()
+            self._holders[id(lock)] = {"name": name, "priority": 0, "speakers": taken,
+                                       "queued_at": now, "admitted_at": now}
+            return lock, busy
+
+    def _blockers(self, entry):
+        """
+        Return the names of the requests keeping *entry* from its locks.
+
+        That is every play in progress sharing one of its speakers, and every
+        request ahead of it in the queue that wants one of them — so a later
+        request never overtakes an earlier one for the same speaker.  Caller
+        holds the condition.
+        """
+        keys = set(entry[2]["speakers"])
+        blockers = [r["name"] for r in self._holders.values() if keys & set(r["speakers"])]
+        for other in self._queue:
+            if other is entry:
+                break
+            if keys & set(other[2]["speakers"]):
+                blockers.append(other[2]["name"])
+        return blockers
+
+    def _try_locks(self, keys):
+        """Take every ``flock`` in *keys* (sorted), or none of them."""
+        files = []
+        for key in keys:
+            lock_file = try_flock(speaker_lock_path(self.path, key))
+            if lock_file is None:
+                for f in files:
+                    f.close()
+                return None
+            files.append(lock_file)
+        return PlayLock(files, keys)
+
+    def _admit(self, request, lock):
+        """Record *request* as the holder of *lock* (caller holds the condition)."""
+        waited = time.monotonic() - request["queued_at"]
+        request["admitted_at"] = time.monotonic()
+        self._holders[id(lock)] = request
+        self._admitted += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+        if waited >= self.poll_secs:
+            _log.info("Play '%s' admitted after waiting %.1f s", request["name"], waited)
+        return lock
+
+    def _skip(self, entry):
+        """Drop a waiting *entry* that ran out of time (caller holds the condition)."""
+        self._queue.remove(entry)
+        self._skipped += 1
+        request = entry[2]
+        _log.warning(
+            "Play '%s' skipped: its speakers were still in use after %.1f s",
+            request["name"], time.monotonic() - request["queued_at"],
+        )
+        self._cond.notify_all()
+
+    def release(self, lock):
+        """Close *lock* (from :meth:`acquire`) and admit the requests waiting for it."""
+        with self._cond:
+            lock.close()
+            self._holders.pop(id(lock), None)
+            self._cond.notify_all()
+
+    def status(self):
+        """
+        Return a snapshot of the queue for monitoring.
+
+        Returns:
+            dict: ``playing`` (name, speakers and seconds held of each play in
+            progress), ``waiting`` (name, priority, speakers and seconds
+            waited, in admission order), and the ``admitted`` / ``skipped``
+            counts with ``mean_wait_secs`` / ``max_wait_secs`` over admitted
+            requests.
+        """
+        now = time.monotonic()
+        with self._cond:
+            playing = [
+                {
+                    "name": request["name"],
+                    "speakers": request["speakers"],
+                    "held_secs": round(now - request["admitted_at"], 1),
+                }
+                for request in sorted(self._holders.values(), key=lambda r: r["admitted_at"])
+            ]
+            waiting = [
+                {
+                    "name": request["name"],
+                    "priority": request["priority"],
+                    "speakers": request["speakers"],
+                    "waited_secs": round(now - request["queued_at"], 1),
+                }
+                for _, _, request in self._queue
+            ]
+            return {
+                "playing": playing,
+                "waiting": waiting,
+                "admitted": self._admitted,
+                "skipped": self._skipped,
+                "mean_wait_secs": round(self._total_wait / self._admitted, 1) if self._admitted else 0.0,
+                "max_wait_secs": round(self._max_wait, 1),
+            }
@@ -0,0 +1,189 @@
+"""
+coalesce.py — Merge schedules that fire within a few seconds of each other.
+
+Every schedule unit locks its speakers (``/run/flag-<ip>.lock``), so when two
+schedules on the same speakers fire close together — typically two sunset
+offsets, or a fixed time that lands on today's sunset — the second finds the
+first still playing and has to wait for it, or is dropped.  Instead,
+schedules on the same speakers whose fire times today fall within
+``coalesce_window_seconds`` of an earlier schedule's form one *coalesced
+play*:
+
+* the earliest schedule (the *leader*) appends the clips of the others (its
+  *followers*) to its own and plays them back to back in its session, so the
+  speakers are grouped and restored once;
+* right before its first ``play_uri`` the leader claims the followers in
+  ``MERGED_PLAYS_FILE`` (under ``/run``, so it is cleared on reboot);
+* when a follower's own unit fires it finds itself claimed there and exits
+  quietly instead of playing the clip a second time.  If the leader never
+  played (it failed before getting that far, or was skipped), the follower
+  is not claimed and plays on its own as before;
+* a schedule going ahead on its own marks itself started in the same file,
+  and a leader does not claim a follower that has started: its clip is then
+  dropped from the leader's session.
+
+Claiming and starting are each one read-modify-write of the record under an
+exclusive ``flock``, so whichever comes first wins and the clip plays once.
+Schedules are recorded by :func:`config.schedule_key`, the name their units
+pass on the command line.
+
+:func:`group_fire_times` is shared by ``schedule_sonos.py`` (which reports
+the coalesced plays when scheduling) and ``sonos_play.py`` (which decides at
+play time), so both agree on the grouping.  This module only uses the
+standard library; the ``flagd.py`` client checks the record before taking
+the play lock.
+"""
+
+import fcntl
+import json
+import logging
+from datetime import date
+
+from config import MERGED_PLAYS_FILE, save_file, schedule_key
+
+_log = logging.getLogger(__name__)
+
+
+def group_fire_times(fire_times, window_secs):
+    """
+    Group schedules whose fire times fall within *window_secs* of a group's first.
+
+    Args:
+        fire_times (list[tuple[str, int]]): ``(schedule name, seconds since
+            midnight)`` for today's fire times, in configured order.
+        window_secs (int): Coalescing window; ``0`` puts every schedule in its
+            own group.
+
+    Returns:
+        list[list[str]]: Schedule names per group, earliest fire time first
+        (configured order breaks ties); the first name of each group leads it.
+    """
+    groups = []
+    group_start = None
+    for name, secs in sorted(fire_times, key=lambda item: item[1]):
+        if groups and window_secs > 0 and secs - group_start <= window_secs:
+            groups[-1].append(name)
+        else:
+            groups.append([name])
+            group_start = secs
+    return groups
+
+
+def _read(path):
+    """Return today's record as ``(merged, started)`` (empty if missing, stale or unreadable).
+
+    *merged* maps each claimed follower to its leader; *started* lists the
+    schedules that went ahead on their own.
+    """
+    try:
+        with open(path) as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return {}, []
+    except (OSError, ValueError) as e:
+        _log.warning("Ignoring unreadable merged-play record %s: %s", path, e)
+        return {}, []
+    if not isinstance(raw, dict) or raw.get("date") != date.today().isoformat():
+        return {}, []
+    merged = raw.get("merged")
+    started = raw.get("started")
+    return (
+        merged if isinstance(merged, dict) else {},
+        started if isinstance(started, list) else [],
+    )
+
+
+def _write(path, merged, started):
+    """Atomically replace the record at *path*; return ``False`` on failure."""
+    text = json.dumps({"date": date.today().isoformat(), "merged": merged, "started": started})
+    return save_file(path, text, "merged-play record")
+
+
+def _locked(path):
+    """Return an open file holding an exclusive ``flock`` on *path*'s record, or ``None``."""
+    try:
+        lock = open(path + ".lock", "a")
+    except OSError as e:
+        _log.warning("Could not lock merged-play record %s: %s", path, e)
+        return None
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+    except OSError as e:
+        _log.warning("Could not lock merged-play record %s: %s", path, e)
+        lock.close()
+        return None
+    return lock
+
+
+def merged_into(name, path=None):
+    """
+    Return the schedule whose play today already covered *name* (``None`` if none).
+
+    Args:
+        name (str): Schedule name.
+        path (str | None): Record file path (default ``MERGED_PLAYS_FILE``).
+    """
+    return _read(path or MERGED_PLAYS_FILE)[0].get(schedule_key(name))
+
+
+def start_own_play(name, path=None):
+    """
+    Mark *name* as playing on its own today, unless a leader has claimed it.
+
+    Failures are logged and ignored: the schedule plays on its own, as it
+    did before coalescing existed.
+
+    Args:
+        name (str): Schedule name.
+        path (str | None): Record file path (default ``MERGED_PLAYS_FILE``).
+
+    Returns:
+        str | None: The leader whose session covers *name* (skip the play),
+        or ``None`` to go ahead.
+    """
+    path = path or MERGED_PLAYS_FILE
+    name = schedule_key(name)
+    lock = _locked(path)
+    if lock is None:
+        return None
+    with lock:
+        merged, started = _read(path)
+        if name in merged:
+            return merged[name]
+        if name not in started:
+            _write(path, merged, started + [name])
+    return None
+
+
+def claim_followers(leader, followers, path=None):
+    """
+    Claim *followers* for *leader*'s play today, skipping any already started.
+
+    A follower that started on its own, or was claimed by another leader, is
+    left out.  If the record cannot be written nothing is claimed, since the
+    followers would then play on their own as well.
+
+    Args:
+        leader (str): Name of the schedule playing the coalesced session.
+        followers (list[str]): Names of the schedules to merge into it.
+        path (str | None): Record file path (default ``MERGED_PLAYS_FILE``).
+
+    Returns:
+        list[str]: The followers claimed, in the order given.
+    """
+    path = path or MERGED_PLAYS_FILE
+    leader = schedule_key(leader)
+    followers = [schedule_key(name) for name in followers]
+    lock = _locked(path)
+    if lock is None:
+        return []
+    with lock:
+        merged, started = _read(path)
+        claimed = [
+            name for name in followers
+            if name not in started and merged.get(name, leader) == leader
+        ]
+        merged.update({name: leader for name in claimed})
+        if claimed and not _write(path, merged, started):
+            return []
+    return claimed
@@ -25,10 +25,16 @@ overrides fall back to the top-level ``"volume"`` key (default 30).  Both format
 are accepted by :func:`load_config` and all downstream consumers.
 
 Use :func:`speaker_ips` to extract a plain list of IP strings from either format.
+A schedule entry may list its own ``"speakers"`` (names or IPs of these
+entries) to play on a subset; see :func:`schedule_speakers`.
 """
+import importlib.util
 import json
 import logging
 import os
+import re
+import sys
+import tempfile
 
 try:
     import zoneinfo
@@ -39,6 +45,12 @@ INSTALL_DIR = os.environ.get("FLAG_INSTALL_DIR", "/opt/flag")
 CONFIG_PATH = os.environ.get("FLAG_CONFIG", os.path.join(INSTALL_DIR, "config.json"))
 AUDIO_DIR = os.path.join(INSTALL_DIR, "audio")
 LOG_FILE = os.path.join(INSTALL_DIR, "sonos_play.log")
+DURATION_CACHE_FILE = os.path.join(INSTALL_DIR, "duration_cache.json")
+LATENCY_STATS_FILE = os.path.join(INSTALL_DIR, "latency_stats.json")
+SUNSET_TABLE_FILE = os.path.join(INSTALL_DIR, "sunset_table.bin")
+FIRE_PLAN_FILE = os.path.join(INSTALL_DIR, "fire_plan.json")
+FLAGD_SOCKET = os.environ.get("FLAGD_SOCKET", "/run/flagd.sock")
+MERGED_PLAYS_FILE = "/run/flag-merged.json"
 
 logging.basicConfig(
     filename=LOG_FILE,
@@ -47,6 +59,117 @@ logging.basicConfig(
 )
 _log = logging.getLogger(__name__)
 
+
+def lazy_import(name):
+    """
+    Return module *name*, executed on its first attribute access.
+
+    The playback stack (soco alone takes about 0.3 s to import)
+    is only needed once a play is going ahead; modules that use it import it
+    this way so that a play the guard refuses never loads it.  Before Python
+    3.12 that first access is not thread-safe, so touch the module on one
+    thread before sharing it (see ``sonos_play.load_playback_stack``).
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def atomic_write(path, data, mode=None, owner=None):
+    """
+    Replace *path* with *data* (``str`` or ``bytes``) in one rename.
+
+    The data goes to a temporary file in the same directory, which is then
+    moved over *path* with ``os.replace()``, so a reader (or a power cut)
+    never sees a half-written file.  The temporary file is removed if
+    anything fails.
+
+    Args:
+        path (str): Destination file.
+        data (str | bytes): New content.
+        mode (int | None): Permission bits to give the new file.
+        owner (tuple | None): ``(uid, gid)`` to give the new file where the
+            process is allowed to; otherwise the current owner is kept.
+
+    Raises:
+        OSError: If the file cannot be written or renamed.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        if owner is not None and hasattr(os, "chown"):
+            try:
+                os.chown(tmp_path, *owner)
+            except OSError:
+                # Non-root or unsupported FS — the rename still works.
+                pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def save_file(path, data, what):
+    """
+    :func:`atomic_write` *data* to *path*, logging a failure instead of raising.
+
+    Used for the runtime state files (caches, plans, records) that are
+    best-effort: losing one write only costs recomputing it later.
+
+    Args:
+        path (str): Destination file.
+        data (str | bytes): New content.
+        what (str): What the file holds, for the warning.
+
+    Returns:
+        bool: ``True`` if the file was written.
+    """
+    try:
+        atomic_write(path, data)
+    except OSError as e:
+        _log.warning("Could not write %s %s: %s", what, path, e)
+        return False
+    return True
+
+
+def load_if_changed(path, load, memo):
+    """
+    Return ``load(path)``, reusing the last result while *path* is unchanged.
+
+    *memo* maps a path to ``(st_mtime_ns, result)`` and lives as long as the
+    caller wants the result reused — typically a module-level dict, so a
+    long-lived process reads the file again only after it is rewritten.
+
+    Returns:
+        The loaded value, or ``None`` if *path* does not exist.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        memo.pop(path, None)
+        return None
+    cached = memo.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    value = load(path)
+    memo[path] = (mtime, value)
+    return value
+
+
 # Convenience accessor — available after load_config() has been called
 def get_port(cfg: dict) -> int:
     """Return the configured HTTP port, falling back to 8000 on invalid values."""
@@ -58,7 +181,123 @@ def get_port(cfg: dict) -> int:
         return 8000
 
 
-def speaker_ips(config: dict) -> list:
+MAX_PREROLL_SECONDS = 120
+
+# Longest silence allowed between two clips of a schedule ``sequence``; the
+# speakers stay grouped (and any music stays paused) for the whole sequence.
+MAX_SEQUENCE_GAP_SECONDS = 600
+
+
+def read_number_setting(cfg: dict, key, default, minimum=None, maximum=None, cast=float):
+    """
+    Read a numeric setting *key* from *cfg*, falling back to *default*.
+
+    Missing keys silently use *default*; values that are not numbers or fall
+    outside ``minimum``–``maximum`` (inclusive) log a warning and use *default*.
+
+    Args:
+        cfg (dict): Parsed configuration dictionary (or a schedule entry).
+        key (str): Key to read.
+        default (int | float | None): Value used when the key is absent or invalid.
+        minimum (int | float | None): Smallest accepted value (``None``: no bound).
+        maximum (int | float | None): Largest accepted value (``None``: no bound).
+        cast (type): ``int`` or ``float``; applied to the raw value.
+
+    Returns:
+        int | float | None: The validated value.
+    """
+    raw = cfg.get(key)
+    if raw is None:
+        return default
+    try:
+        value = cast(raw)
+    except (TypeError, ValueError):
+        _log.warning("Config '%s' value %r is not a valid number; using %s.", key, raw, default)
+        return default
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        _log.warning(
+            "Config '%s' value %r is out of range (must be %s–%s); using %s.",
+            key, raw, minimum, maximum, default,
+        )
+        return default
+    return value
+
+
+def get_preroll_seconds(cfg: dict) -> int:
+    """
+    Return the configured ``preroll_seconds`` (0 disables the pre-roll).
+
+    Fixed-time schedule units start this many seconds before their fire time
+    so ``sonos_play.py`` can discover, snapshot and group the speakers early
+    and call ``play_uri`` on the minute.  Values that are not integers or fall
+    outside 0–``MAX_PREROLL_SECONDS`` log a warning and disable the pre-roll.
+    """
+    return read_number_setting(cfg, "preroll_seconds", 0, 0, MAX_PREROLL_SECONDS, cast=int)
+
+
+MAX_COALESCE_WINDOW_SECONDS = 900
+
+
+def get_coalesce_window_seconds(cfg: dict) -> int:
+    """
+    Return the configured ``coalesce_window_seconds`` (0 disables coalescing).
+
+    Schedules whose fire times today fall within this many seconds of an
+    earlier schedule's are played in that schedule's session (see
+    ``coalesce.py``).  Defaults to 60: two plays in the same minute always
+    collide on the play lock.  Invalid values log a warning and use 60.
+    """
+    return read_number_setting(cfg, "coalesce_window_seconds", 60, 0, MAX_COALESCE_WINDOW_SECONDS, cast=int)
+
+
+MAX_PLAY_LATENESS_SECONDS = 900
+
+
+def schedule_key(name) -> str:
+    """
+    Return the form of a schedule *name* used in unit names and ``--schedule``.
+
+    Any character that is not alphanumeric, a hyphen or an underscore becomes
+    a hyphen, and leading/trailing hyphens are stripped (``"Chapel Taps"`` →
+    ``"Chapel-Taps"``).  The units pass this form, the fire plan and the
+    merged-play record are keyed by it, and schedule lookups compare it, so
+    a play finds its entry whichever form it is given.  Returns ``""`` for
+    an empty or unusable name.
+    """
+    if not name:
+        return ""
+    return re.sub(r"[^a-zA-Z0-9_-]", "-", str(name)).strip("-")
+
+
+def find_schedule(cfg: dict, schedule_name):
+    """Return the ``schedules`` entry named *schedule_name* (see :func:`schedule_key`), or ``None``."""
+    key = schedule_key(schedule_name)
+    if not key:
+        return None
+    for candidate in cfg.get("schedules") or []:
+        if isinstance(candidate, dict) and schedule_key(candidate.get("name")) == key:
+            return candidate
+    return None
+
+
+def get_play_admission(cfg: dict, schedule_name=None) -> tuple:
+    """
+    Return ``(priority, max_wait_seconds)`` for a play of *schedule_name*.
+
+    A play that finds another one in progress waits for the play lock for up
+    to ``max_lateness_seconds`` (per-schedule value, else the top-level one,
+    default 60; ``0`` skips at once like before) and is admitted ahead of
+    waiting plays with a lower ``priority`` (per schedule, default 0).
+    Invalid values log a warning and fall back to the defaults.
+    """
+    entry = find_schedule(cfg, schedule_name) or {}
+    priority = read_number_setting(entry, "priority", 0, cast=int)
+    source = entry if "max_lateness_seconds" in entry else cfg
+    max_wait = read_number_setting(source, "max_lateness_seconds", 60, 0, MAX_PLAY_LATENESS_SECONDS, cast=int)
+    return priority, max_wait
+
+
+def speaker_ips(config: dict, schedule_name=None) -> list:
     """
     Return a list of IP address strings from the ``speakers`` config key.
 
@@ -67,11 +306,58 @@ def speaker_ips(config: dict) -> list:
 
     Args:
         config (dict): Configuration dictionary returned by :func:`load_config`.
+        schedule_name (str | None): Only the speakers this schedule targets
+            (see :func:`schedule_speakers`).
 
     Returns:
         list[str]: Ordered list of speaker IP addresses.
+
+    Raises:
+        ValueError: If *schedule_name*'s ``speakers`` list is invalid.
+    """
+    speakers = schedule_speakers(config, schedule_name) if schedule_name else config.get("speakers", [])
+    return [s["ip"] if isinstance(s, dict) else s for s in speakers]
+
+
+def schedule_speakers(cfg: dict, schedule_name=None) -> list:
     """
-    return [s["ip"] if isinstance(s, dict) else s for s in config.get("speakers", [])]
+    Return the ``speakers`` entries a play of *schedule_name* targets.
+
+    A schedule may list its own ``speakers`` — names or IP addresses of
+    top-level ``speakers`` entries — so that, say, the flagpole and the
+    chapel play different schedules.  Without such a list (and for plays not
+    started by a schedule) every configured speaker is targeted.
+
+    Args:
+        cfg (dict): Configuration dictionary returned by :func:`load_config`.
+        schedule_name (str | None): Schedule name.
+
+    Returns:
+        list: The targeted entries of ``cfg["speakers"]``, in configured order.
+
+    Raises:
+        ValueError: If the schedule's ``speakers`` is not a non-empty list or
+            names a speaker that is not configured.
+    """
+    configured = cfg.get("speakers") or []
+    entry = find_schedule(cfg, schedule_name)
+    wanted = entry.get("speakers") if entry else None
+    if wanted is None:
+        return list(configured)
+    if not isinstance(wanted, list) or not wanted:
+        raise ValueError("'speakers' must be a non-empty list of speaker names or IP addresses")
+    targets = []
+    for ref in wanted:
+        match = next(
+            (spk for spk in configured
+             if ref in ((spk.get("ip"), spk.get("name")) if isinstance(spk, dict) else (spk,))),
+            None,
+        )
+        if match is None:
+            raise ValueError(f"'speakers' entry {ref!r} is not a configured speaker name or IP")
+        if match not in targets:
+            targets.append(match)
+    return [spk for spk in configured if spk in targets]
 
 
 def validate_config(cfg: dict) -> None:
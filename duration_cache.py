@@ -0,0 +1,183 @@
+"""
+duration_cache.py — On-disk cache of audio durations for sonos_play.py.
+
+The same handful of MP3s (first_call, colors, taps, …) are played every day
+and their durations never change, yet measuring one costs at least a Range
+request and an MPEG header parse.  This module keeps a small JSON file that
+maps each audio URL to the duration measured for it, together with the HTTP
+validators (``ETag`` / ``Last-Modified``) and size the server reported at the
+time.  ``sonos_play.get_mp3_duration()`` revalidates an entry with one
+conditional ``HEAD`` request and only re-measures the file when it changed.
+
+The file is bounded both in entries and in bytes; the least recently used
+entries are evicted first.  Several lookups may run at once (one per clip
+of a sequence, and concurrent plays in the daemon), so :meth:`DurationCache.save`
+re-reads the file and applies only its own changes to it, one writer at a
+time, instead of overwriting entries another lookup saved meanwhile.  All I/O
+errors are logged and swallowed — a missing or corrupt cache only costs a
+re-measure, never a failed play.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from config import save_file
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_MAX_BYTES = 32 * 1024
+
+# Serialises the read-merge-write in DurationCache.save() within this process.
+_save_lock = threading.Lock()
+
+
+class DurationCache:
+    """
+    LRU map of audio URL to ``{duration, size, etag, last_modified, mtime}``.
+
+    ``mtime`` is the wall-clock time the entry was last measured or promoted
+    to most recently used.  Iteration order is least- to most-recently used,
+    and that order is preserved in the JSON file.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        # url -> entry written, or None for an entry dropped; applied on save().
+        self._changes = OrderedDict()
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        Return the cache stored at *path* (empty if the file is missing or unreadable).
+
+        Args:
+            path (str): Cache file path.
+            **kwargs: ``max_entries`` / ``max_bytes`` bounds.
+
+        Returns:
+            DurationCache: The loaded cache.
+        """
+        cache = cls(path, **kwargs)
+        try:
+            with open(path) as f:
+                raw = json.load(f, object_pairs_hook=OrderedDict)
+        except FileNotFoundError:
+            return cache
+        except (OSError, ValueError) as e:
+            _log.warning("Ignoring unreadable duration cache %s: %s", path, e)
+            return cache
+        if not isinstance(raw, dict):
+            _log.warning("Ignoring malformed duration cache %s", path)
+            return cache
+        for url, entry in raw.items():
+            if isinstance(entry, dict) and isinstance(entry.get("duration"), (int, float)):
+                cache._entries[url] = entry
+        return cache
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, url):
+        return url in self._entries
+
+    def get(self, url):
+        """Return a copy of the entry for *url*, or ``None`` if there is none."""
+        entry = self._entries.get(url)
+        return dict(entry) if entry is not None else None
+
+    def put(self, url, duration, size=None, etag=None, last_modified=None):
+        """
+        Record the *duration* measured for *url* as the most recently used entry.
+
+        Entries without a validator cannot be revalidated, so they are not
+        stored.
+
+        Returns:
+            bool: ``True`` if the entry was stored.
+        """
+        if not etag and not last_modified:
+            self.discard(url)
+            return False
+        self._entries.pop(url, None)
+        self._entries[url] = {
+            "duration": duration,
+            "size": size,
+            "etag": etag,
+            "last_modified": last_modified,
+            "mtime": time.time(),
+        }
+        self._changed(url, self._entries[url])
+        return True
+
+    def touch(self, url):
+        """
+        Mark the entry for *url* as just revalidated and most recently used.
+
+        Re-using the most recently used entry again changes nothing worth a
+        disk write, so the common "same call as last time" case stays
+        read-only.
+        """
+        entry = self._entries.get(url)
+        if entry is None or next(reversed(self._entries)) == url:
+            return
+        entry["mtime"] = time.time()
+        self._entries.move_to_end(url)
+        self._changed(url, entry)
+
+    def discard(self, url):
+        """Drop the entry for *url*, if any."""
+        if self._entries.pop(url, None) is not None:
+            self._changed(url, None)
+
+    def _changed(self, url, entry):
+        """Queue *entry* (``None``: removal) for *url* as the latest change to save."""
+        self._changes.pop(url, None)
+        self._changes[url] = entry
+
+    def _evict(self):
+        """Drop least recently used entries until both bounds hold; return the JSON."""
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        text = json.dumps(self._entries, indent=1)
+        while self._entries and len(text.encode()) > self.max_bytes:
+            self._entries.popitem(last=False)
+            text = json.dumps(self._entries, indent=1)
+        return text
+
+    def save(self):
+        """
+        Atomically write this cache's changes back to disk, if any.
+
+        The file is read again and only the entries this instance put,
+        touched or discarded are applied to it (most recently used last), so
+        entries saved by another lookup since :meth:`load` are kept.
+
+        Returns:
+            bool: ``True`` if the file was written.
+        """
+        if not self._changes:
+            return False
+        with _save_lock:
+            return self._merge_and_write()
+
+    def _merge_and_write(self):
+        """Apply the pending changes to the file's current entries and write it (caller holds the lock)."""
+        current = type(self).load(self.path, max_entries=self.max_entries, max_bytes=self.max_bytes)
+        entries = current._entries
+        for url, entry in self._changes.items():
+            entries.pop(url, None)
+            if entry is not None:
+                entries[url] = entry
+        self._entries = entries
+        text = self._evict()
+        if not save_file(self.path, text, "duration cache"):
+            return False
+        self._changes.clear()
+        return True
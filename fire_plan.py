@@ -0,0 +1,189 @@
+"""
+fire_plan.py — Today's and tomorrow's fire times, compiled by the reschedule run.
+
+``schedule_sonos.py`` resolves every schedule's fire time on its 02:00 (and
+boot) run; the play path used to resolve them all again on every play — the
+play guard for each schedule, ``--sleep-until-schedule`` and coalescing for
+theirs.  The reschedule run now writes what it resolved to a small JSON file
+(``FIRE_PLAN_FILE``), and the play path reads it instead:
+
+* fire times are keyed by local day (today's and tomorrow's, so plays
+  between midnight and the next reschedule run are covered) and by the
+  normalised ``time`` string, since that and the location are all a fire
+  time depends on;
+* each schedule's speaker IPs are recorded too;
+* the plan carries a hash of the config keys it was compiled from
+  (:func:`config_hash`).  :func:`current` ignores a plan whose hash no
+  longer matches config.json, that does not cover the day, or that cannot
+  be read — the caller then resolves the time live, as before.
+
+Only the standard library, ``config`` and ``schedule_resolve`` are imported.
+The file is replaced atomically, so a play never reads half a plan.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import date
+
+from config import FIRE_PLAN_FILE, load_if_changed, save_file, schedule_key, speaker_ips
+import schedule_resolve
+
+_log = logging.getLogger(__name__)
+
+PLAN_VERSION = 1
+
+# The config.json keys that fire times and speaker sets are derived from.
+_PLANNED_KEYS = ("schedules", "speakers", "latitude", "longitude", "timezone", "sunset_offset_minutes")
+
+# Path -> (st_mtime_ns, FirePlan) of plans already read by this process.
+_LOADED = {}
+
+
+def config_hash(config):
+    """Return a digest of the parts of *config* that a plan is compiled from."""
+    planned = {key: config.get(key) for key in _PLANNED_KEYS}
+    text = json.dumps(planned, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def time_key(time_str):
+    """Return the plan key of a schedule ``time`` string."""
+    return time_str.strip().lower()
+
+
+class FirePlan:
+    """
+    Resolved fire times per local day, and speaker IPs per schedule.
+
+    *fire_times* maps an ISO date to ``{time key: (hour, minute)}``;
+    *speakers* maps a schedule name to its speaker IPs.
+    """
+
+    def __init__(self, config_hash, fire_times, speakers):
+        self.config_hash = config_hash
+        self.fire_times = fire_times
+        self.speakers = speakers
+
+    @classmethod
+    def load(cls, path):
+        """Return the plan stored at *path*, or ``None`` if missing or unreadable."""
+        try:
+            with open(path) as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            _log.warning("Ignoring unreadable fire plan %s: %s", path, e)
+            return None
+        try:
+            if raw["version"] != PLAN_VERSION:
+                raise ValueError("not a fire plan of this version")
+            fire_times = {
+                day: {key: (int(hm[0]), int(hm[1])) for key, hm in times.items()}
+                for day, times in raw["fire_times"].items()
+            }
+            speakers = {name: list(ips) for name, ips in raw["speakers"].items()}
+            return cls(str(raw["config_hash"]), fire_times, speakers)
+        except (KeyError, TypeError, ValueError, IndexError, AttributeError) as e:
+            _log.warning("Ignoring malformed fire plan %s: %s", path, e)
+            return None
+
+    def save(self, path):
+        """
+        Atomically write the plan to *path*.
+
+        Returns:
+            bool: ``True`` if the file was written.
+        """
+        text = json.dumps({
+            "version": PLAN_VERSION,
+            "config_hash": self.config_hash,
+            "fire_times": {
+                day: {key: list(hm) for key, hm in sorted(times.items())}
+                for day, times in sorted(self.fire_times.items())
+            },
+            "speakers": self.speakers,
+        }, indent=1)
+        return save_file(path, text, "fire plan")
+
+    def fire_time(self, time_str, day):
+        """Return the planned ``(hour, minute)`` of *time_str* on *day*, or ``None``."""
+        return self.fire_times.get(day.isoformat(), {}).get(time_key(time_str))
+
+
+def _cached_plan(path):
+    """Return the plan at *path*, read again only when the file changed."""
+    return load_if_changed(path, FirePlan.load, _LOADED)
+
+
+def current(config, day=None, path=None):
+    """
+    Return the plan if it was compiled from *config* and covers *day*.
+
+    Args:
+        config (dict): Parsed configuration dictionary.
+        day (date | None): Local day the caller needs (default: today).
+        path (str | None): Plan file (default ``FIRE_PLAN_FILE``).
+
+    Returns:
+        FirePlan | None: The plan, or ``None`` if it is missing, stale or
+        unreadable — resolve live instead.
+    """
+    plan = _cached_plan(path or FIRE_PLAN_FILE)
+    if plan is None or (day or date.today()).isoformat() not in plan.fire_times:
+        return None
+    if plan.config_hash != config_hash(config):
+        return None
+    return plan
+
+
+def fire_time(config, time_str, plan=None):
+    """
+    Return today's local ``(hour, minute)`` for a schedule ``time`` string.
+
+    Read from *plan* (see :func:`current`) when it has the time; otherwise
+    resolved live with :func:`schedule_resolve.resolve_fire_time`.
+
+    Raises:
+        ValueError: If the time has to be resolved and cannot be.
+    """
+    if plan is not None and isinstance(time_str, str):
+        planned = plan.fire_time(time_str, date.today())
+        if planned is not None:
+            return planned
+    return schedule_resolve.resolve_fire_time(config, time_str)
+
+
+def schedule_speaker_ips(config, schedule_name, plan=None):
+    """
+    Return the speaker IPs *schedule_name* plays on.
+
+    Read from *plan* when it lists the schedule (plans are keyed by
+    :func:`config.schedule_key`); otherwise :func:`config.speaker_ips`.
+
+    Raises:
+        ValueError: If the IPs have to be looked up and the schedule names
+            an unknown speaker.
+    """
+    key = schedule_key(schedule_name)
+    if plan is not None and key in plan.speakers:
+        return list(plan.speakers[key])
+    return speaker_ips(config, schedule_name)
+
+
+def write(config_hash, fire_times, speakers, path=None):
+    """
+    Write a plan of *fire_times* and *speakers* compiled from config *config_hash*.
+
+    Returns:
+        bool: ``True`` if the file was written.
+    """
+    path = path or FIRE_PLAN_FILE
+    if not FirePlan(config_hash, fire_times, speakers).save(path):
+        return False
+    _log.info(
+        "Wrote fire plan %s for %s (%d schedule(s))",
+        path, ", ".join(sorted(fire_times)), len(speakers),
+    )
+    return True
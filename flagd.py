@@ -0,0 +1,360 @@
+"""
+flagd.py — Resident playback daemon for sonos_play.py.
+
+Every scheduled play used to start a fresh interpreter that imported soco
+and mutagen, loaded the config and built new SoCo objects before touching a
+speaker.  ``flagd.py serve`` (run by ``flag-flagd.service``) pays that cost
+once: it imports the playback stack up front, probes the configured
+speakers so soco's per-IP ``SoCo`` instances and their speaker info are
+already cached, and then runs :func:`sonos_play.main` in-process for each
+request it receives on a local Unix socket (``FLAGD_SOCKET``, default
+``/run/flagd.sock``).
+
+``flagd.py play [sonos_play args…]`` is the client the schedule service units
+run.  It only imports the standard library, sends the arguments to the
+daemon, waits for the play to finish and exits with its status.  If the
+daemon is not running, the client runs ``sonos_play.py`` itself with the same
+arguments, so a stopped or crashed daemon never costs a scheduled play.
+
+Protocol: the client sends one JSON line ``{"argv": [...]}``; the daemon
+answers with one JSON line ``{"status": <exit status>}`` once the play is
+over.  ``{"query": "queue"}`` is answered at once with the admission queue
+status.
+
+Locking: a plain play locks each of its speakers (``/run/flag-<ip>.lock``;
+all configured speakers unless its schedule lists its own) through the
+admission queue (``admission.py``), waiting in priority order for at most its
+``max_lateness_seconds`` while another play uses one of them.  Plays on
+disjoint speaker sets run concurrently.  ``--sleep-until-schedule`` requests
+do the same inside ``sonos_play`` after waking, so sunset requests can sleep
+concurrently.  ``flagd.py queue`` prints the queue.  A
+``--schedule`` request already played in an earlier schedule's coalesced
+session (see ``coalesce.py``) exits 0 before taking the lock.  The
+zone group topology is deliberately *not* cached between plays — each play
+reads it fresh, since restoring groups depends on the grouping at fire time.
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+
+from admission import PlayAdmission
+from coalesce import merged_into
+from config import FLAGD_SOCKET, get_play_admission, load_config, speaker_ips
+
+_log = logging.getLogger("flagd")
+
+SONOS_PLAY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sonos_play.py")
+
+# Exit status of a plain play skipped because another play held one of its
+# speakers for longer than it may wait (what ``flock -n`` returns when the
+# lock is held).
+_BUSY_STATUS = 1
+
+
+def _exit_status(exc):
+    """Return the process exit status Python would use for SystemExit *exc*."""
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    print(exc.code, file=sys.stderr)
+    return 1
+
+
+def _schedule_name(argv):
+    """Return the ``--schedule`` value in *argv*, or ``None``."""
+    if "--schedule" in argv[:-1]:
+        return argv[argv.index("--schedule") + 1]
+    return None
+
+
+def _admission_for(argv):
+    """
+    Return ``(name, priority, max_wait, speakers)`` for queueing the play *argv*.
+
+    Taken from the schedule's entry in config.json (see
+    :func:`config.get_play_admission` and :func:`config.speaker_ips`); an
+    unreadable config or ``speakers`` list gives the defaults, and the play
+    itself reports the config error.
+    """
+    name = _schedule_name(argv)
+    try:
+        config = load_config()
+    except RuntimeError:
+        config = {}
+    priority, max_wait = get_play_admission(config, name)
+    try:
+        speakers = speaker_ips(config, name)
+    except ValueError:
+        speakers = speaker_ips(config)
+    return name or "play", priority, max_wait, speakers
+
+
+def _already_played(argv):
+    """
+    Return True if *argv* is a schedule coalesced into an earlier play today.
+
+    Checked before the play lock is taken: the earlier (coalesced) play is
+    usually still holding it, and its follower must not count as a skipped,
+    failed play.  See ``coalesce.py``.
+    """
+    name = _schedule_name(argv)
+    if name is None:
+        return False
+    leader = merged_into(name)
+    if leader is None:
+        return False
+    _log.info("flagd: '%s' was played in the session of '%s'; skipping", name, leader)
+    return True
+
+
+def run_play(argv):
+    """
+    Run one play request in this process.
+
+    Args:
+        argv (list[str]): ``sonos_play.py`` command-line arguments.
+
+    Returns:
+        int: Exit status ``sonos_play.py`` would have exited with.
+    """
+    import sonos_play
+
+    sleeping = "--sleep-until-schedule" in argv
+    if _already_played(argv):
+        return 0
+    lock = None
+    if not sleeping:
+        lock = sonos_play.acquire_play_lock(*_admission_for(argv))
+        if lock is None and _already_played(argv):
+            # Claimed while waiting by the coalesced play that held the lock.
+            return 0
+        if lock is None:
+            _log.warning("flagd: another play was still using its speakers; skipping %s", argv)
+            return _BUSY_STATUS
+    try:
+        sonos_play.main(argv)
+        return 0
+    except SystemExit as exc:
+        return _exit_status(exc)
+    except Exception:
+        _log.exception("flagd: play %s failed", argv)
+        return 1
+    finally:
+        if lock is not None:
+            sonos_play.release_play_lock(lock)
+        if sleeping:
+            sonos_play.release_play_lock()
+
+
+class _PlayHandler(socketserver.StreamRequestHandler):
+    """Serve one ``{"argv": [...]}`` request per connection."""
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            if request.get("query") == "queue":
+                import sonos_play
+                self._reply(sonos_play._admission.status())
+                return
+            argv = [str(arg) for arg in request["argv"]]
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            _log.warning("flagd: malformed request: %s", e)
+            self._reply({"status": 2, "error": f"malformed request: {e}"})
+            return
+        _log.info("flagd: play request %s", argv)
+        self._reply({"status": run_play(argv)})
+
+    def _reply(self, message):
+        try:
+            self.wfile.write(json.dumps(message).encode() + b"\n")
+        except OSError as e:
+            # The client went away (e.g. its unit was stopped); nothing to do.
+            _log.warning("flagd: could not answer client: %s", e)
+
+
+class FlagDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server running each play request on its own thread.
+
+    Threads let sunset requests sleep until their fire time without blocking
+    other requests, and plays on disjoint speaker sets run side by side; the
+    per-speaker play locks still allow one play at a time on each speaker.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path):
+        # A socket file left behind by a previous daemon would make bind() fail.
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _PlayHandler)
+        os.chmod(path, 0o600)
+
+
+def warm_up():
+    """
+    Import the playback stack and connect to every configured speaker once.
+
+    Failures are logged and ignored — an offline speaker is probed again by
+    the next play like before.
+    """
+    import sonos_play
+    from config import load_config, speaker_ips
+
+    # sonos_play imports soco and mutagen lazily; load them here, on one thread.
+    sonos_play.load_playback_stack()
+
+    try:
+        config = load_config()
+    except RuntimeError as e:
+        _log.warning("flagd: could not load config for warm-up: %s", e)
+        return
+    entries = [(ip, 0) for ip in speaker_ips(config) if ip]
+    found, _ = sonos_play.discover_speakers(
+        entries, sonos_play._DEFAULT_DISCOVERY_WORKERS, sonos_play._DEFAULT_DISCOVERY_TIMEOUT_SECS,
+    )
+    _log.info("flagd: warmed up %d of %d speaker(s)", len(found), len(entries))
+
+
+def serve(path=FLAGD_SOCKET):
+    """Run the daemon on *path* until it is stopped."""
+    server = FlagDaemon(path)
+    threading.Thread(target=warm_up, name="flagd-warm-up", daemon=True).start()
+    _log.info("flagd: listening on %s", path)
+    print(f"🎺 flagd listening on {path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def _run_locally(argv):
+    """
+    Replace this process with ``sonos_play.py`` (the daemon is not running).
+
+    A plain play takes its speakers' play locks first (waiting up to its
+    allowed lateness) and hands them to ``sonos_play.py`` across the
+    ``exec``, like the ``flock`` wrapper units used to.
+    """
+    if _already_played(argv):
+        return 0
+    if "--sleep-until-schedule" not in argv:
+        # Same base path as sonos_play._PLAY_LOCK_FILE; not imported from
+        # there so the client stays free of soco/mutagen imports.  Without the
+        # daemon there is no shared queue: this process alone polls for the locks.
+        lock = PlayAdmission("/run/flag.lock").acquire(*_admission_for(argv))
+        if lock is None and _already_played(argv):
+            # Claimed while waiting by the coalesced play that held the lock.
+            return 0
+        if lock is None:
+            _log.warning("flagd: another play was still using its speakers; skipping %s", argv)
+            return _BUSY_STATUS
+        for fd in lock.fds():
+            os.set_inheritable(fd, True)
+    os.execv(sys.executable, [sys.executable, SONOS_PLAY] + argv)
+
+
+def request_play(argv, path=FLAGD_SOCKET):
+    """
+    Ask the daemon at *path* to play, falling back to a local run.
+
+    Args:
+        argv (list[str]): ``sonos_play.py`` command-line arguments.
+        path (str): Daemon socket path.
+
+    Returns:
+        int: Exit status of the play.
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path)
+    except OSError as e:
+        conn.close()
+        _log.info("flagd: daemon not reachable at %s (%s); playing locally", path, e)
+        return _run_locally(argv)
+    with conn:
+        try:
+            conn.sendall(json.dumps({"argv": argv}).encode() + b"\n")
+            reply = conn.makefile("rb").readline()
+        except OSError:
+            reply = b""
+    try:
+        return int(json.loads(reply)["status"])
+    except (ValueError, KeyError, TypeError):
+        # The daemon went away mid-request (e.g. restarted by an upgrade).
+        # A sunset request is safe to re-run: it recomputes the remaining
+        # sleep and skips a fire time that has passed.  A plain play may
+        # already have sounded, so it is not repeated.
+        if "--sleep-until-schedule" in argv:
+            _log.warning("flagd: daemon dropped %s; continuing locally", argv)
+            return _run_locally(argv)
+        _log.error("flagd: daemon dropped play request %s", argv)
+        return 1
+
+
+def request_queue_status(path=FLAGD_SOCKET):
+    """
+    Return the daemon's admission queue status (see ``PlayAdmission.status``).
+
+    Raises:
+        OSError: If the daemon is not reachable.
+        ValueError: If the daemon sent no valid answer.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(path)
+        conn.sendall(json.dumps({"query": "queue"}).encode() + b"\n")
+        return json.loads(conn.makefile("rb").readline())
+
+
+def _print_queue_status(path=FLAGD_SOCKET):
+    """Print the admission queue for ``flagd.py queue``; return the exit status."""
+    try:
+        status = request_queue_status(path)
+    except (OSError, ValueError) as e:
+        print(f"❌ flagd is not answering on {path}: {e}", file=sys.stderr)
+        return 1
+    print(f"Playing: {len(status['playing']) or 'nothing'}")
+    for play in status["playing"]:
+        print(f"  {play['name']} on {', '.join(map(str, play['speakers']))} for {play['held_secs']} s")
+    print(f"Waiting: {len(status['waiting'])}")
+    for request in status["waiting"]:
+        print(
+            f"  {request['name']} (priority {request['priority']}) for "
+            f"{', '.join(map(str, request['speakers']))}, {request['waited_secs']} s"
+        )
+    print(
+        f"Admitted {status['admitted']} play(s), skipped {status['skipped']}; "
+        f"wait mean {status['mean_wait_secs']} s, max {status['max_wait_secs']} s"
+    )
+    return 0
+
+
+def main(argv=None):
+    """
+    Command-line entry point: ``flagd.py serve``, ``flagd.py queue`` or ``flagd.py play ARGS…``.
+
+    Everything after ``play`` is passed through to ``sonos_play.py`` verbatim
+    (including its ``--`` options), so it is not parsed here.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["serve"]:
+        serve()
+        return 0
+    if argv[:1] == ["play"] and len(argv) > 1:
+        return request_play(argv[1:])
+    if argv[:1] == ["queue"]:
+        return _print_queue_status()
+    print("usage: flagd.py serve | flagd.py queue | flagd.py play [sonos_play.py arguments]", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+latency_stats.py — Rolling per-speaker SOAP latency statistics for sonos_play.py.
+
+``sonos_play.py`` times every speaker operation it issues (speaker probe,
+snapshot, pause, join, unjoin, volume, play_uri, stop, restore) and records
+the round-trip time here, keyed by speaker IP and operation.  Only the most
+recent samples of each (speaker, operation) pair are kept, so the file stays
+small and reflects the household as it is now rather than as it was a year
+ago.  The history shows which speakers make a play slow, and later plays
+consult it to pick a fast bugle coordinator.
+
+Alongside the samples, each speaker has a small cached *profile* (model
+number, wired or wireless) so the coordinator election still knows them on a
+play where the topology or speaker info could not be read.
+
+Run this module to print the statistics::
+
+    /opt/flag/sonos-env/bin/python /opt/flag/latency_stats.py
+
+A missing or corrupt stats file only loses history, never a play.
+"""
+
+import argparse
+import json
+import logging
+import math
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from config import LATENCY_STATS_FILE, save_file
+
+_log = logging.getLogger(__name__)
+
+DEFAULT_MAX_SAMPLES = 50
+DEFAULT_MAX_SPEAKERS = 64
+
+
+def percentile(samples, q):
+    """
+    Return the nearest-rank *q*-th percentile of *samples* (``None`` if empty).
+
+    Args:
+        samples (list[float]): Values in any order.
+        q (float): Percentile, 0–100.
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LatencyStats:
+    """
+    Map of speaker IP to ``{operation: [milliseconds, …]}``, oldest sample first.
+
+    Recording is thread-safe: ``sonos_play`` times operations from its worker
+    pools.  Speakers are kept in least- to most-recently-recorded order, and
+    the least recent are dropped beyond *max_speakers* (profiles likewise).
+
+    On disk: ``{"samples": {ip: {op: [ms, …]}}, "profiles": {ip: {…}}}``.
+    """
+
+    def __init__(self, path, max_samples=DEFAULT_MAX_SAMPLES, max_speakers=DEFAULT_MAX_SPEAKERS):
+        self.path = path
+        self.max_samples = max_samples
+        self.max_speakers = max_speakers
+        self._speakers = OrderedDict()
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        Return the statistics stored at *path* (empty if missing or unreadable).
+
+        Args:
+            path (str): Stats file path.
+            **kwargs: ``max_samples`` / ``max_speakers`` bounds.
+
+        Returns:
+            LatencyStats: The loaded statistics.
+        """
+        stats = cls(path, **kwargs)
+        try:
+            with open(path) as f:
+                raw = json.load(f, object_pairs_hook=OrderedDict)
+        except FileNotFoundError:
+            return stats
+        except (OSError, ValueError) as e:
+            _log.warning("Ignoring unreadable latency stats %s: %s", path, e)
+            return stats
+        if not isinstance(raw, dict):
+            _log.warning("Ignoring malformed latency stats %s", path)
+            return stats
+        samples_by_speaker = raw.get("samples")
+        profiles = raw.get("profiles")
+        for speaker, ops in (samples_by_speaker if isinstance(samples_by_speaker, dict) else {}).items():
+            if not isinstance(ops, dict):
+                continue
+            stats._speakers[speaker] = OrderedDict(
+                (op, [s for s in samples if isinstance(s, (int, float))][-stats.max_samples:])
+                for op, samples in ops.items()
+                if isinstance(samples, list)
+            )
+        for speaker, profile in (profiles if isinstance(profiles, dict) else {}).items():
+            if isinstance(profile, dict):
+                stats._profiles[speaker] = dict(profile)
+        return stats
+
+    def __contains__(self, speaker):
+        return speaker in self._speakers
+
+    def record(self, speaker, op, secs):
+        """
+        Add one sample of *secs* for operation *op* on *speaker*.
+
+        Args:
+            speaker (str): Speaker IP address.
+            op (str): Operation name, e.g. ``"join"``.
+            secs (float): Measured round-trip time in seconds.
+        """
+        with self._lock:
+            ops = self._speakers.pop(speaker, None)
+            if ops is None:
+                ops = OrderedDict()
+            self._speakers[speaker] = ops
+            samples = ops.setdefault(op, [])
+            samples.append(round(secs * 1000, 1))
+            del samples[:-self.max_samples]
+            while len(self._speakers) > self.max_speakers:
+                self._speakers.popitem(last=False)
+            self._dirty = True
+
+    def profile(self, speaker):
+        """Return a copy of the cached profile of *speaker* (empty if none)."""
+        with self._lock:
+            return dict(self._profiles.get(speaker, {}))
+
+    def update_profile(self, speaker, **fields):
+        """
+        Merge *fields* into the cached profile of *speaker*.
+
+        ``None`` values are ignored, so a play that could not read a field
+        keeps the value cached by an earlier one.
+
+        Args:
+            speaker (str): Speaker IP address.
+            **fields: Profile fields, e.g. ``model="S16"``, ``wired=True``.
+        """
+        fields = {k: v for k, v in fields.items() if v is not None}
+        with self._lock:
+            profile = self._profiles.pop(speaker, {})
+            self._profiles[speaker] = profile
+            if any(profile.get(k) != v for k, v in fields.items()):
+                profile.update(fields)
+                self._dirty = True
+            while len(self._profiles) > self.max_speakers:
+                self._profiles.popitem(last=False)
+
+    @contextmanager
+    def timed(self, speaker, op):
+        """Context manager recording how long its body took as *op* on *speaker*."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(speaker, op, time.monotonic() - start)
+
+    def samples(self, speaker, op=None):
+        """
+        Return a copy of the samples (milliseconds) for *speaker*.
+
+        Args:
+            speaker (str): Speaker IP address.
+            op (str | None): One operation, or ``None`` for all of them.
+
+        Returns:
+            list[float]: The samples, oldest first.
+        """
+        with self._lock:
+            ops = self._speakers.get(speaker, {})
+            if op is not None:
+                return list(ops.get(op, []))
+            return [s for values in ops.values() for s in values]
+
+    def summary(self):
+        """
+        Return one row per (speaker, operation) with sample count and percentiles.
+
+        Returns:
+            list[dict]: ``{speaker, op, n, p50, p95, p99}`` rows (milliseconds),
+            sorted by speaker then operation.
+        """
+        with self._lock:
+            items = [(sp, op, list(s)) for sp, ops in self._speakers.items() for op, s in ops.items()]
+        return [
+            {
+                "speaker": speaker,
+                "op": op,
+                "n": len(samples),
+                "p50": percentile(samples, 50),
+                "p95": percentile(samples, 95),
+                "p99": percentile(samples, 99),
+            }
+            for speaker, op, samples in sorted(items)
+            if samples
+        ]
+
+    def save(self):
+        """
+        Atomically write the statistics back to disk if they changed.
+
+        Returns:
+            bool: ``True`` if the file was written.
+        """
+        with self._lock:
+            if not self._dirty:
+                return False
+            text = json.dumps(
+                {"samples": self._speakers, "profiles": self._profiles}, separators=(",", ":"),
+            )
+            self._dirty = False
+        return save_file(self.path, text, "latency stats")
+
+
+def _speaker_names():
+    """Return ``{ip: name}`` from config.json's speaker objects (empty on any error)."""
+    try:
+        from config import load_config
+        speakers = load_config().get("speakers") or []
+    except Exception:
+        return {}
+    return {s.get("ip"): s.get("name") for s in speakers if isinstance(s, dict) and s.get("name")}
+
+
+def main(argv=None):
+    """Print the recorded latency percentiles, slowest p95 first within each speaker."""
+    parser = argparse.ArgumentParser(description="Show per-speaker Sonos latency statistics.")
+    parser.add_argument("--path", default=LATENCY_STATS_FILE, help="Stats file to read.")
+    args = parser.parse_args(argv)
+
+    rows = LatencyStats.load(args.path).summary()
+    if not rows:
+        print(f"No latency statistics recorded yet ({args.path}).")
+        return 0
+    names = _speaker_names()
+    print(f"{'Speaker':<28} {'Operation':<12} {'n':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows.sort(key=lambda r: (r["speaker"], -r["p95"]))
+    for row in rows:
+        label = row["speaker"]
+        if names.get(label):
+            label = f"{names[label]} ({label})"
+        print(
+            f"{label:<28} {row['op']:<12} {row['n']:>4} "
+            f"{row['p50']:>8.0f} {row['p95']:>8.0f} {row['p99']:>8.0f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""
+schedule_resolve.py — Today's fire time and clips of a schedule entry.
+
+The play path (``sonos_play.py``'s play guard, sunset sleep-wrapper and
+coalescing) only needs to turn a schedule entry into a local fire time, but
+``schedule_sonos.py`` also imports astral, pytz and the systemd unit builders.
+This module holds just the resolution, so a play — or a misfire the guard
+refuses — does not pay for the scheduler's imports:
+
+* only the standard library, ``config`` and ``sunset_table`` are imported;
+  local times use ``zoneinfo``;
+* sunset comes from the precomputed table, and astral (with pytz) is imported
+  only when the table cannot answer.
+
+``schedule_sonos.py`` re-exports these functions under their old names.
+"""
+
+import functools
+import os
+import re
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from config import MAX_SEQUENCE_GAP_SECONDS
+import sunset_table
+
+# Regex for sunset-offset time strings like "sunset-5min" or "sunset+1min".
+# re.IGNORECASE allows "Sunset-5min", "SUNSET+1MIN", etc.
+_SUNSET_OFFSET_RE = re.compile(r"^sunset([+-])(\d+)min$", re.IGNORECASE)
+
+# Location used for any coordinate missing from config.json (New York City).
+DEFAULT_LATITUDE = 40.7128
+DEFAULT_LONGITUDE = -74.0060
+
+
+def parse_sunset_offset(time_str: str):
+    """Return signed offset in minutes for 'sunset+Nmin' / 'sunset-Nmin', or None.
+
+    Args:
+        time_str (str): The raw time string from a schedule entry.
+
+    Returns:
+        int | None: Signed offset in minutes, or ``None`` if *time_str* does
+        not match the ``sunset±Nmin`` pattern.
+
+    Raises:
+        ValueError: If *time_str* matches the pattern but N is out of range
+            (must be 1–720; use plain ``'sunset'`` for zero offset).
+    """
+    m = _SUNSET_OFFSET_RE.match(time_str.strip())
+    if not m:
+        return None
+    sign, mins = m.group(1), int(m.group(2))
+    if mins < 1 or mins > 720:
+        raise ValueError(
+            f"Sunset offset out of range: '{time_str}' (must be 1-720 minutes)"
+        )
+    return -mins if sign == "-" else mins
+
+
+@functools.lru_cache(maxsize=None)
+def get_system_timezone():
+    """
+    Determine the current system timezone name.
+
+    Tries ``/etc/timezone`` (Debian/Ubuntu), then ``timedatectl``, falling
+    back to ``"UTC"`` on any error.  Resolved once per process: the answer
+    does not change under a running play, and ``timedatectl`` is a
+    subprocess (restart ``flag-flagd`` after changing the system timezone).
+
+    Returns:
+        str: IANA timezone name (e.g. ``"America/New_York"``).
+    """
+    try:
+        # Debian/Ubuntu provide a plain text timezone file
+        if os.path.exists("/etc/timezone"):
+            with open("/etc/timezone") as f:
+                return f.read().strip()
+        import subprocess
+
+        # timedatectl is available on most modern systemd systems
+        tz = subprocess.check_output(
+            ["timedatectl", "show", "-p", "Timezone"],
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+        if "=" in tz:
+            return tz.split("=", 1)[1]
+        if tz:
+            return tz
+    except Exception:
+        pass
+    return "UTC"
+
+
+def get_coordinates(config):
+    """
+    Return the ``(latitude, longitude, timezone)`` of the configured location.
+
+    Missing coordinates default to New York City; the timezone defaults to
+    the system timezone.
+
+    Args:
+        config (dict): Parsed configuration dictionary.
+
+    Returns:
+        tuple[float, float, str]: Degrees north, degrees east and IANA zone.
+    """
+    return (
+        config.get("latitude", DEFAULT_LATITUDE),
+        config.get("longitude", DEFAULT_LONGITUDE),
+        config.get("timezone") or get_system_timezone(),
+    )
+
+
+def local_now(config):
+    """
+    Return the current time in the configured ``timezone`` (default UTC).
+
+    Falls back to a naive local datetime if the timezone is invalid.
+    """
+    try:
+        return datetime.now(ZoneInfo(config.get("timezone", "UTC")))
+    except Exception:
+        return datetime.now()
+
+
+def _astral_sunset(day, latitude, longitude, tz_name):
+    """Compute the sunset of local *day* with astral (imported on first use)."""
+    from astral import LocationInfo
+    from astral.sun import sun
+    import pytz
+
+    loc = LocationInfo("", "", tz_name, latitude, longitude)
+    # astral raises ValueError if the sun never sets (polar day/night)
+    return sun(loc.observer, date=day, tzinfo=pytz.timezone(tz_name))["sunset"]
+
+
+@functools.lru_cache(maxsize=16)
+def sunset_on(day, latitude, longitude, tz_name):
+    """
+    Return the true sunset of local *day* at the location, memoized.
+
+    Read from the precomputed sunset table (see ``sunset_table.py``) when it
+    covers the location and day; otherwise computed with astral.  Each
+    ``sunset`` / ``sunset±Nmin`` entry only offsets this instant, so a
+    scheduler run or play guard check computes it once for all its entries,
+    and the resident daemon once per day.
+
+    Returns:
+        datetime: The aware sunset instant.
+
+    Raises:
+        ValueError: If the sun never sets at this location on *day* (not
+            memoized; polar days are rare enough to recompute).
+    """
+    sunset = sunset_table.lookup(latitude, longitude, tz_name, day)
+    if sunset is None:
+        sunset = _astral_sunset(day, latitude, longitude, tz_name)
+    return sunset
+
+
+def _offset_sunset(config, offset_minutes, day=None):
+    """
+    Return *day*'s sunset moved by *offset_minutes* as local ``(hour, minute)``.
+
+    Raises:
+        ValueError: If the sun never sets at this location that day, or if
+            the offset moves the time to another calendar day.
+    """
+    latitude, longitude, tz_name = get_coordinates(config)
+    tz_obj = ZoneInfo(tz_name)
+    sunset = sunset_on(day or datetime.now().date(), latitude, longitude, tz_name)
+    sunset_local = (sunset + timedelta(minutes=offset_minutes)).astimezone(tz_obj)
+    sunset_unadjusted_local = sunset.astimezone(tz_obj)
+    if sunset_local.date() != sunset_unadjusted_local.date():
+        raise ValueError(
+            f"Sunset offset crosses midnight in {tz_name}: "
+            f"sunset is {sunset_unadjusted_local:%Y-%m-%d %H:%M} but "
+            f"adjusted time is {sunset_local:%Y-%m-%d %H:%M}"
+        )
+    return sunset_local.hour, sunset_local.minute
+
+
+def get_sunset_local_time(config, day=None):
+    """
+    Calculate today's sunset hour and minute in the configured local timezone.
+
+    Applies the optional ``sunset_offset_minutes`` config value as a positive
+    or negative offset from the actual sunset time.  This offset is used only
+    when the schedule entry's ``time`` is the plain ``"sunset"`` string; it is
+    **not** applied when ``"sunset±Nmin"`` entries are used (see
+    :func:`get_sunset_local_time_with_offset`).
+
+    Args:
+        config (dict): Parsed configuration dictionary.
+        day (date | None): Local day (default: today).
+
+    Returns:
+        tuple[int, int]: ``(hour, minute)`` in local time of the (optionally
+        offset) sunset.
+
+    Raises:
+        ValueError: If the sun never sets at this location today (polar day/
+            night), which ``astral`` signals by raising ``ValueError``.
+        ValueError: If the offset pushes the resulting time to a different
+            calendar day than today's sunset (midnight wrap-around).
+    """
+    return _offset_sunset(config, config.get("sunset_offset_minutes", 0), day)
+
+
+def get_sunset_local_time_with_offset(config, extra_offset_minutes: int, day=None):
+    """
+    Calculate today's sunset hour and minute with a per-entry signed offset.
+
+    This function is used for schedule entries whose ``time`` field uses the
+    ``"sunset±Nmin"`` syntax (e.g. ``"sunset-5min"`` or ``"sunset+1min"``).
+    It applies **only** ``extra_offset_minutes`` to the true sunset time;
+    the top-level ``sunset_offset_minutes`` config value is intentionally
+    **ignored** so that the N in ``"sunset±Nmin"`` is always an absolute
+    offset from the actual sunset, regardless of any global config offset.
+
+    The top-level ``sunset_offset_minutes`` applies exclusively to plain
+    ``"sunset"`` entries (handled by :func:`get_sunset_local_time`).
+
+    Args:
+        config (dict): Parsed configuration dictionary.
+        extra_offset_minutes (int): Signed offset in minutes from true sunset
+            (negative = before sunset, positive = after sunset).
+        day (date | None): Local day (default: today).
+
+    Returns:
+        tuple[int, int]: ``(hour, minute)`` in local time of the adjusted sunset.
+
+    Raises:
+        ValueError: If the sun never sets at this location today (polar day/
+            night), which ``astral`` signals by raising ``ValueError``.
+        ValueError: If the offset pushes the resulting time to a different
+            calendar day than today's sunset (midnight wrap-around).
+    """
+    return _offset_sunset(config, extra_offset_minutes, day)
+
+
+def resolve_fire_time(config, time_str, day=None):
+    """
+    Return the local ``(hour, minute)`` of a schedule ``time`` string on *day*.
+
+    Args:
+        config (dict): Parsed configuration dictionary.
+        time_str (str): ``"HH:MM"``, ``"sunset"`` or ``"sunset±Nmin"``.
+        day (date | None): Local day (default: today); only sunset times
+            depend on it.
+
+    Returns:
+        tuple[int, int]: The fire time in local time.
+
+    Raises:
+        ValueError: If *time_str* is malformed or sunset cannot be computed.
+    """
+    if not isinstance(time_str, str):
+        raise ValueError(f"invalid time value {time_str!r} (expected a string)")
+    normalized = time_str.strip().lower()
+    offset = parse_sunset_offset(normalized)
+    if normalized == "sunset":
+        return get_sunset_local_time(config, day)
+    if offset is not None:
+        return get_sunset_local_time_with_offset(config, offset, day)
+    parts = normalized.split(":")
+    if len(parts) != 2:
+        raise ValueError(f"invalid time format {time_str!r}")
+    hour, minute = int(parts[0]), int(parts[1])
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        raise ValueError(f"time out of range: {time_str!r}")
+    return hour, minute
+
+
+def resolve_clips(entry):
+    """
+    Return the ``(audio_url, gap_seconds)`` clips a schedule entry plays, in order.
+
+    A plain entry plays its ``audio_url``; a ``sequence`` entry plays each of
+    its items (see ``schedule_sonos.py``), the first one at the fire time.
+
+    Args:
+        entry (dict): One schedule entry.
+
+    Returns:
+        list[tuple[str, int]]: The clips; the first gap is always ``0``.
+
+    Raises:
+        ValueError: If the entry has neither field, both, or an invalid item.
+    """
+    sequence = entry.get("sequence")
+    if sequence is None:
+        if not entry.get("audio_url"):
+            raise ValueError("missing required 'audio_url' (or 'sequence') field in schedule entry")
+        items = [entry["audio_url"]]
+    elif entry.get("audio_url"):
+        raise ValueError("'audio_url' and 'sequence' cannot both be set")
+    elif not isinstance(sequence, list) or not sequence:
+        raise ValueError("'sequence' must be a non-empty list of clips")
+    else:
+        items = sequence
+
+    clips = []
+    for position, item in enumerate(items, start=1):
+        gap = 0
+        if isinstance(item, dict):
+            audio_url = item.get("audio_url")
+            gap = item.get("gap_seconds", 0)
+            if isinstance(gap, bool) or not isinstance(gap, int) or not (
+                0 <= gap <= MAX_SEQUENCE_GAP_SECONDS
+            ):
+                raise ValueError(
+                    f"clip {position}: 'gap_seconds' must be an integer 0–{MAX_SEQUENCE_GAP_SECONDS}"
+                )
+        else:
+            audio_url = item
+        if not isinstance(audio_url, str) or not audio_url.startswith(("http://", "https://")):
+            what = "audio_url" if sequence is None else f"clip {position}: audio_url"
+            raise ValueError(f"{what} must start with http:// or https://")
+        clips.append((audio_url, gap if clips else 0))
+    return clips
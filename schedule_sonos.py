@@ -25,6 +25,15 @@ Schedule ``time`` field accepted values
   reschedule purposes: they are re-armed daily at 02:00 by ``flag-reschedule.timer``
   and on every boot by ``flag-boot-reschedule.service`` without a stop/start cycle.
 
+Schedule ``sequence`` entries
+-----------------------------
+Instead of ``audio_url`` an entry may give a ``sequence``: an ordered list of
+clips played back to back in one ``sonos_play.py`` session, so the speakers
+are grouped and restored once for the whole sequence.  Each item is either a
+URL string or ``{"audio_url": …, "gap_seconds": N}``, where N seconds of
+silence (0–``MAX_SEQUENCE_GAP_SECONDS``) precede that clip (ignored on the
+first one, which plays at the fire time).
+
 Multi-speaker note
 ------------------
 This script only generates the unit files that *invoke* ``sonos_play.py``.  The
@@ -32,24 +41,45 @@ actual multi-speaker playback logic (speaker discovery, temporary group formatio
 synchronized play, and state restoration) lives entirely in ``sonos_play.py``.
 The ``speakers`` list from config.json is passed through unchanged to each service
 unit so that ``sonos_play.py`` receives it at runtime.
+
+An entry may list its own ``speakers`` (names or IP addresses of configured
+speakers); ``sonos_play.py`` then plays it on those only, and it locks only
+those speakers, so schedules on disjoint speakers can play at the same time.
+The list is checked here and an entry naming an unknown speaker is skipped.
+
+Each run also writes today's and tomorrow's resolved fire times and the
+speakers of each schedule to the fire plan (``fire_plan.py``), which the play
+path reads instead of resolving them again.
+
+Service units run ``flagd.py play …``, which hands the play to the resident
+``flag-flagd.service`` daemon (already-imported playback stack, warm speaker
+connections) and falls back to running ``sonos_play.py`` directly when the
+daemon is not running.
 """
 
 import glob as _glob
 import json
 import logging
 import os
-import re
 import shlex
 import subprocess
 import sys
-import tempfile
 from datetime import date, datetime, time, timedelta
 
 from astral import LocationInfo
-from astral.sun import sun
 import pytz
 
-from config import CONFIG_PATH, load_config, INSTALL_DIR, LOG_FILE  # noqa: F401 (LOG_FILE triggers basicConfig)
+from config import (  # noqa: F401 (LOG_FILE triggers basicConfig)
+    CONFIG_PATH, atomic_write, load_config, get_coalesce_window_seconds, get_preroll_seconds, INSTALL_DIR,
+    LOG_FILE, schedule_key, speaker_ips,
+)
+from coalesce import group_fire_times
+import fire_plan
+from schedule_resolve import (  # noqa: F401 (re-exported for callers and tests)
+    DEFAULT_LATITUDE, DEFAULT_LONGITUDE, get_sunset_local_time, get_sunset_local_time_with_offset,
+    get_system_timezone, parse_sunset_offset, resolve_clips, resolve_fire_time,
+)
+import sunset_table
 
 _log = logging.getLogger("schedule_sonos")
 
@@ -60,75 +90,16 @@ _log = logging.getLogger("schedule_sonos")
 SYSTEMD_DIR = "/etc/systemd/system"
 PYTHON_BIN = os.path.join(INSTALL_DIR, "sonos-env", "bin", "python")
 SONOS_PLAY = os.path.join(INSTALL_DIR, "sonos_play.py")
+FLAGD = os.path.join(INSTALL_DIR, "flagd.py")
 SCHEDULE_SCRIPT = os.path.abspath(__file__)
 
 # Name suffixes (after "flag-") of units that must never be removed by stale cleanup
-_RESERVED_NAMES = {"audio-http", "reschedule", "boot-reschedule"}
-
-# Regex for sunset-offset time strings like "sunset-5min" or "sunset+1min".
-# re.IGNORECASE allows "Sunset-5min", "SUNSET+1MIN", etc.
-_SUNSET_OFFSET_RE = re.compile(r"^sunset([+-])(\d+)min$", re.IGNORECASE)
-
-
-def parse_sunset_offset(time_str: str):
-    """Return signed offset in minutes for 'sunset+Nmin' / 'sunset-Nmin', or None.
-
-    Args:
-        time_str (str): The raw time string from a schedule entry.
-
-    Returns:
-        int | None: Signed offset in minutes, or ``None`` if *time_str* does
-        not match the ``sunset±Nmin`` pattern.
-
-    Raises:
-        ValueError: If *time_str* matches the pattern but N is out of range
-            (must be 1–720; use plain ``'sunset'`` for zero offset).
-    """
-    m = _SUNSET_OFFSET_RE.match(time_str.strip())
-    if not m:
-        return None
-    sign, mins = m.group(1), int(m.group(2))
-    if mins < 1 or mins > 720:
-        raise ValueError(
-            f"Sunset offset out of range: '{time_str}' (must be 1-720 minutes)"
-        )
-    return -mins if sign == "-" else mins
-
+_RESERVED_NAMES = {"audio-http", "reschedule", "boot-reschedule", "flagd"}
 
 # ---------------------------------------------------------------------------
 # Timezone / Location helpers
 # ---------------------------------------------------------------------------
 
-def get_system_timezone():
-    """
-    Determine the current system timezone name.
-
-    Tries ``/etc/timezone`` (Debian/Ubuntu), then ``timedatectl``, falling
-    back to ``"UTC"`` on any error.
-
-    Returns:
-        str: IANA timezone name (e.g. ``"America/New_York"``).
-    """
-    try:
-        # Debian/Ubuntu provide a plain text timezone file
-        if os.path.exists("/etc/timezone"):
-            with open("/etc/timezone") as f:
-                return f.read().strip()
-        # timedatectl is available on most modern systemd systems
-        tz = subprocess.check_output(
-            ["timedatectl", "show", "-p", "Timezone"],
-            text=True,
-            stderr=subprocess.DEVNULL,
-        ).strip()
-        if "=" in tz:
-            return tz.split("=", 1)[1]
-        if tz:
-            return tz
-    except Exception:
-        pass
-    return "UTC"
-
-
 def get_location(config):
     """
     Build an astral ``LocationInfo`` object from config values.
@@ -145,96 +116,12 @@ def get_location(config):
     """
     city = config.get("city", "MyCity")
     country = config.get("country", "MyCountry")
-    latitude = config.get("latitude", 40.7128)   # Default: NYC
-    longitude = config.get("longitude", -74.0060)
+    latitude = config.get("latitude", DEFAULT_LATITUDE)
+    longitude = config.get("longitude", DEFAULT_LONGITUDE)
     timezone = config.get("timezone") or get_system_timezone()
     return LocationInfo(city, country, timezone, latitude, longitude)
 
 
-def get_sunset_local_time(config):
-    """
-    Calculate today's sunset hour and minute in the configured local timezone.
-
-    Applies the optional ``sunset_offset_minutes`` config value as a positive
-    or negative offset from the actual sunset time.  This offset is used only
-    when the schedule entry's ``time`` is the plain ``"sunset"`` string; it is
-    **not** applied when ``"sunset±Nmin"`` entries are used (see
-    :func:`get_sunset_local_time_with_offset`).
-
-    Args:
-        config (dict): Parsed configuration dictionary.
-
-    Returns:
-        tuple[int, int]: ``(hour, minute)`` in local time of the (optionally
-        offset) sunset.
-
-    Raises:
-        ValueError: If the sun never sets at this location today (polar day/
-            night), which ``astral`` signals by raising ``ValueError``.
-        ValueError: If the offset pushes the resulting time to a different
-            calendar day than today's sunset (midnight wrap-around).
-    """
-    loc = get_location(config)
-    tz_obj = pytz.timezone(loc.timezone)
-    # astral raises ValueError if the sun never sets (polar day/night)
-    s = sun(loc.observer, date=datetime.now().date(), tzinfo=tz_obj)
-    sunset = s["sunset"]
-    sunset_time = sunset + timedelta(minutes=config.get("sunset_offset_minutes", 0))
-    sunset_local = sunset_time.astimezone(tz_obj)
-    sunset_unadjusted_local = sunset.astimezone(tz_obj)
-    if sunset_local.date() != sunset_unadjusted_local.date():
-        raise ValueError(
-            f"Sunset offset crosses midnight in {tz_obj.zone}: "
-            f"sunset is {sunset_unadjusted_local:%Y-%m-%d %H:%M} but "
-            f"adjusted time is {sunset_local:%Y-%m-%d %H:%M}"
-        )
-    return sunset_local.hour, sunset_local.minute
-
-
-def get_sunset_local_time_with_offset(config, extra_offset_minutes: int):
-    """
-    Calculate today's sunset hour and minute with a per-entry signed offset.
-
-    This function is used for schedule entries whose ``time`` field uses the
-    ``"sunset±Nmin"`` syntax (e.g. ``"sunset-5min"`` or ``"sunset+1min"``).
-    It applies **only** ``extra_offset_minutes`` to the true sunset time;
-    the top-level ``sunset_offset_minutes`` config value is intentionally
-    **ignored** so that the N in ``"sunset±Nmin"`` is always an absolute
-    offset from the actual sunset, regardless of any global config offset.
-
-    The top-level ``sunset_offset_minutes`` applies exclusively to plain
-    ``"sunset"`` entries (handled by :func:`get_sunset_local_time`).
-
-    Args:
-        config (dict): Parsed configuration dictionary.
-        extra_offset_minutes (int): Signed offset in minutes from true sunset
-            (negative = before sunset, positive = after sunset).
-
-    Returns:
-        tuple[int, int]: ``(hour, minute)`` in local time of the adjusted sunset.
-
-    Raises:
-        ValueError: If the sun never sets at this location today (polar day/
-            night), which ``astral`` signals by raising ``ValueError``.
-        ValueError: If the offset pushes the resulting time to a different
-            calendar day than today's sunset (midnight wrap-around).
-    """
-    loc = get_location(config)
-    tz_obj = pytz.timezone(loc.timezone)
-    s = sun(loc.observer, date=datetime.now().date(), tzinfo=tz_obj)
-    sunset = s["sunset"]
-    sunset_time = sunset + timedelta(minutes=extra_offset_minutes)
-    sunset_local = sunset_time.astimezone(tz_obj)
-    sunset_unadjusted_local = sunset.astimezone(tz_obj)
-    if sunset_local.date() != sunset_unadjusted_local.date():
-        raise ValueError(
-            f"Sunset offset crosses midnight in {tz_obj.zone}: "
-            f"sunset is {sunset_unadjusted_local:%Y-%m-%d %H:%M} but "
-            f"adjusted time is {sunset_local:%Y-%m-%d %H:%M}"
-        )
-    return sunset_local.hour, sunset_local.minute
-
-
 # ---------------------------------------------------------------------------
 # Config / schedule helpers
 # ---------------------------------------------------------------------------
@@ -257,7 +144,7 @@ def sanitise_name(name):
     """
     if not name:
         raise ValueError("Schedule name must not be empty.")
-    sanitised = re.sub(r"[^a-zA-Z0-9_-]", "-", str(name)).strip("-")
+    sanitised = schedule_key(name)
     if not sanitised:
         raise ValueError(
             f"Schedule name {name!r} is empty or invalid after sanitisation "
@@ -279,7 +166,7 @@ def resolve_schedules(config):
 
     Returns:
         list[dict]: List of schedule entries, each containing ``"name"``,
-        ``"audio_url"``, and ``"time"`` keys.
+        ``"audio_url"`` (or ``"sequence"``), and ``"time"`` keys.
     """
     if "schedules" in config:
         schedules = config["schedules"]
@@ -317,6 +204,47 @@ def resolve_schedules(config):
     return []
 
 
+def _write_fire_plan(config, plan_hash, entries, today_times, speaker_sets, today=None):
+    """
+    Write the fire plan read by ``sonos_play.py`` (see ``fire_plan.py``).
+
+    Args:
+        config (dict): Parsed configuration dictionary.
+        plan_hash (str): :func:`fire_plan.config_hash` of config.json as loaded.
+        entries (list[dict]): Processed schedule entries (``name``, ``time``).
+        today_times (dict[str, tuple[int, int]]): Today's fire time of each
+            scheduled entry; entries missing here were skipped.
+        speaker_sets (dict[str, frozenset]): Speaker IPs of each scheduled entry.
+        today (date | None): The plan's first day (default: today).
+
+    Returns:
+        bool: ``True`` if the plan was written.
+    """
+    today = today or date.today()
+    tomorrow = today + timedelta(days=1)
+    fire_times = {today.isoformat(): {}, tomorrow.isoformat(): {}}
+    for entry in entries:
+        name = entry["name"]
+        if name not in today_times:
+            continue
+        key = fire_plan.time_key(entry["time"])
+        fire_times[today.isoformat()][key] = today_times[name]
+        try:
+            fire_times[tomorrow.isoformat()][key] = resolve_fire_time(config, entry["time"], tomorrow)
+        except ValueError as exc:
+            # Resolved live tomorrow (and reported by tomorrow's run).
+            _log.debug("Fire plan: no time for '%s' on %s: %s", name, tomorrow.isoformat(), exc)
+    speakers = {name: sorted(speaker_sets[name]) for name in today_times if name in speaker_sets}
+    return fire_plan.write(plan_hash, fire_times, speakers)
+
+
+def _play_args(clips):
+    """Return the shell-quoted ``sonos_play.py`` arguments that play *clips*."""
+    gaps = [gap for _, gap in clips[1:]]
+    gaps_arg = f"--gaps {','.join(map(str, gaps))} " if any(gaps) else ""
+    return gaps_arg + " ".join(shlex.quote(url) for url, _ in clips)
+
+
 # ---------------------------------------------------------------------------
 # Systemd unit file builders
 # ---------------------------------------------------------------------------
@@ -359,22 +287,10 @@ def _write_unit_file(path, content):
     Raises:
         OSError: If the write or rename fails (e.g. permission denied).
     """
-    dir_path = os.path.dirname(path)
-    fd, tmp_path = tempfile.mkstemp(dir=dir_path, suffix=".tmp")
-    try:
-        with os.fdopen(fd, "w") as f:
-            f.write(content)
-        os.replace(tmp_path, path)
-    except Exception:
-        # Clean up the temp file on failure so it doesn't litter /etc/systemd/system/
-        try:
-            os.unlink(tmp_path)
-        except OSError:
-            pass
-        raise
+    atomic_write(path, content)
 
 
-def _build_service_unit(name, audio_url):
+def _build_service_unit(name, audio_url, play_at=None):
     """
     Return the content of a systemd ``.service`` unit that plays one audio file.
 
@@ -382,17 +298,32 @@ def _build_service_unit(name, audio_url):
     after playing), declares a dependency on network connectivity, and waits for
     ``flag-audio-http.service`` (the HTTP audio server) to be up before starting.
 
-    A non-blocking ``flock`` on ``/run/flag.lock`` is used as a single-instance
-    guard: if another scheduled play is already running, the second invocation
-    exits immediately without playing (preventing overlapping group/stop errors).
+    The play is sent to the resident daemon via ``flagd.py play`` (see
+    :func:`_build_flagd_service`).  An ``flock`` per targeted speaker
+    (``/run/flag-<ip>.lock``) — taken by the daemon, or by ``flagd.py``
+    itself when it falls back to running ``sonos_play.py`` — is used as a
+    single-instance guard: if another scheduled play is already running on
+    one of the speakers, the second invocation waits for it for up to its
+    ``max_lateness_seconds`` and otherwise exits without playing (preventing
+    overlapping group/stop errors).
+
+    With a pre-roll (*play_at* set, see :func:`_timer_start`), the timer
+    starts the unit early and ``--play-at HH:MM`` tells ``sonos_play.py`` to
+    hold ``play_uri`` until the fire time itself.
 
     Args:
-        name (str): Sanitised schedule name (used only in ``Description``).
-        audio_url (str): Full HTTP URL of the MP3 to play.
+        name (str): Sanitised schedule name (``Description`` and
+            ``--schedule``, used to coalesce near-simultaneous plays).
+        audio_url (str | list[tuple[str, int]]): Full HTTP URL of the MP3 to
+            play, or the clips of a ``sequence`` entry (see :func:`resolve_clips`).
+        play_at (tuple[int, int] | None): ``(hour, minute)`` fire time when
+            the unit is started ahead of it; ``None`` without a pre-roll.
 
     Returns:
         str: Unit file content ready to be written to disk.
     """
+    play_at_arg = f"--play-at {play_at[0]:02d}:{play_at[1]:02d} " if play_at else ""
+    clips = [(audio_url, 0)] if isinstance(audio_url, str) else audio_url
     return (
         "[Unit]\n"
         f"Description=Flag Audio — play {name}\n"
@@ -401,7 +332,8 @@ def _build_service_unit(name, audio_url):
         "\n"
         "[Service]\n"
         "Type=oneshot\n"
-        f"ExecStart=/usr/bin/flock -n /run/flag.lock {PYTHON_BIN} {SONOS_PLAY} {shlex.quote(audio_url)}\n"
+        f"ExecStart={PYTHON_BIN} {FLAGD} play {play_at_arg}--schedule {shlex.quote(name)} "
+        f"{_play_args(clips)}\n"
         "User=root\n"
     )
 
@@ -411,8 +343,8 @@ def _build_sunset_service_unit(name, audio_url):
     Return the content of a systemd ``.service`` unit for a sunset-based schedule.
 
     Unlike fixed-time services (which embed the pre-computed play time in the
-    timer's ``OnCalendar``), sunset service units invoke ``sonos_play.py`` with the
-    ``--sleep-until-schedule`` flag.  The script reads ``config.json`` at runtime,
+    timer's ``OnCalendar``), sunset service units invoke ``sonos_play.py`` (through
+    ``flagd.py play``) with the ``--sleep-until-schedule`` flag.  The script reads ``config.json`` at runtime,
     computes today's actual fire time (handling ``sunset`` / ``sunset±Nmin``), and
     sleeps until that moment before playing.
 
@@ -428,11 +360,13 @@ def _build_sunset_service_unit(name, audio_url):
 
     Args:
         name (str): Sanitised schedule name.
-        audio_url (str): Full HTTP URL of the MP3 to play.
+        audio_url (str | list[tuple[str, int]]): Full HTTP URL of the MP3 to
+            play, or the clips of a ``sequence`` entry (see :func:`resolve_clips`).
 
     Returns:
         str: Unit file content ready to be written to disk.
     """
+    clips = [(audio_url, 0)] if isinstance(audio_url, str) else audio_url
     return (
         "[Unit]\n"
         f"Description=Flag Audio — sleep until sunset then play {name}\n"
@@ -441,13 +375,32 @@ def _build_sunset_service_unit(name, audio_url):
         "\n"
         "[Service]\n"
         "Type=simple\n"
-        f"ExecStart={PYTHON_BIN} {SONOS_PLAY} --sleep-until-schedule {shlex.quote(name)} {shlex.quote(audio_url)}\n"
+        f"ExecStart={PYTHON_BIN} {FLAGD} play --sleep-until-schedule {shlex.quote(name)} {_play_args(clips)}\n"
         "Restart=no\n"
         "User=root\n"
     )
 
 
-def _build_timer_unit(name, hour, minute):
+def _timer_start(hour, minute, preroll_seconds=0):
+    """
+    Return the local time a fixed-time timer fires for an ``HH:MM`` schedule.
+
+    With a pre-roll the timer fires *preroll_seconds* before the schedule's
+    fire time, wrapping to the previous day for schedules just after midnight.
+
+    Args:
+        hour (int): Schedule hour (0–23).
+        minute (int): Schedule minute (0–59).
+        preroll_seconds (int): Seconds to start early (0 for none).
+
+    Returns:
+        datetime.time: The timer's ``OnCalendar`` time of day.
+    """
+    secs = (hour * 3600 + minute * 60 - preroll_seconds) % 86400
+    return time(secs // 3600, secs // 60 % 60, secs % 60)
+
+
+def _build_timer_unit(name, hour, minute, preroll_seconds=0):
     """
     Return the content of a systemd ``.timer`` unit that fires at a given local time.
 
@@ -460,19 +413,23 @@ def _build_timer_unit(name, hour, minute):
     as long as the system timezone is correctly set (which ``setup.sh`` ensures).
 
     Args:
-        name (str): Sanitised schedule name (used only in ``Description``).
+        name (str): Sanitised schedule name (``Description`` and
+            ``--schedule``, used to coalesce near-simultaneous plays).
         hour (int): Local hour to fire (0–23).
         minute (int): Local minute to fire (0–59).
+        preroll_seconds (int): Fire this many seconds early (see
+            :func:`_timer_start`).
 
     Returns:
         str: Unit file content ready to be written to disk.
     """
+    start = _timer_start(hour, minute, preroll_seconds)
     return (
         "[Unit]\n"
         f"Description=Flag Audio Timer — {name}\n"
         "\n"
         "[Timer]\n"
-        f"OnCalendar=*-*-* {hour:02d}:{minute:02d}:00\n"
+        f"OnCalendar=*-*-* {start:%H:%M:%S}\n"
         "Persistent=false\n"
         "\n"
         "[Install]\n"
@@ -495,7 +452,8 @@ def _build_sunset_timer_unit(name):
     mutated ``OnCalendar`` value) causes systemd to fire the service immediately.
 
     Args:
-        name (str): Sanitised schedule name (used only in ``Description``).
+        name (str): Sanitised schedule name (``Description`` and
+            ``--schedule``, used to coalesce near-simultaneous plays).
 
     Returns:
         str: Unit file content ready to be written to disk.
@@ -536,6 +494,60 @@ def _build_reschedule_service():
     )
 
 
+def _build_flagd_service():
+    """
+    Return the content of the ``flag-flagd.service`` unit.
+
+    Runs ``flagd.py serve``, the resident playback daemon that the schedule
+    service units send their plays to, so a play does not pay for interpreter
+    start-up and module imports.  ``Restart=always`` brings it back after a
+    crash; while it is down, ``flagd.py play`` runs ``sonos_play.py`` itself.
+
+    Returns:
+        str: Unit file content ready to be written to disk.
+    """
+    return (
+        "[Unit]\n"
+        "Description=Flag Audio — resident playback daemon\n"
+        "After=network-online.target flag-audio-http.service\n"
+        "Wants=network-online.target\n"
+        "\n"
+        "[Service]\n"
+        "Type=simple\n"
+        f"ExecStart={PYTHON_BIN} {FLAGD} serve\n"
+        "Restart=always\n"
+        "RestartSec=2\n"
+        "User=root\n"
+        "\n"
+        "[Install]\n"
+        "WantedBy=multi-user.target\n"
+    )
+
+
+def _ensure_flagd(unit_changed):
+    """
+    Make sure ``flag-flagd.service`` is enabled and running.
+
+    Enables and starts it when it is not enabled yet; restarts it when its
+    unit file changed.  Failures only cost the daemon's speed-up (service
+    units fall back to running ``sonos_play.py`` directly), so they are
+    reported but never fatal.
+
+    Args:
+        unit_changed (bool): Whether the unit file was rewritten this run.
+    """
+    try:
+        if not _is_timer_enabled("flag-flagd.service"):
+            _run_systemctl("enable", "--now", "flag-flagd.service")
+            print("  ✅ Enabled and started: flag-flagd.service")
+        elif unit_changed:
+            _run_systemctl("restart", "flag-flagd.service")
+            print("  ✅ Restarted: flag-flagd.service")
+    except RuntimeError as exc:
+        print(f"  ⚠️  Could not start flag-flagd.service: {exc}")
+        _log.warning("Could not start flag-flagd.service: %s", exc)
+
+
 def _build_reschedule_timer():
     """
     Return the content of the ``flag-reschedule.timer`` unit.
@@ -717,8 +729,8 @@ def _clean_stale_units(current_names):
     the corresponding unit files are disabled, stopped, and deleted so they
     do not continue to fire.
 
-    Reserved units (``flag-audio-http``, ``flag-reschedule``) are always
-    skipped.
+    Reserved units (``flag-audio-http``, ``flag-reschedule``, ``flag-flagd``)
+    are always skipped.
 
     Args:
         current_names (set[str]): Set of sanitised schedule names that should
@@ -735,7 +747,7 @@ def _clean_stale_units(current_names):
             # Extract the inner name: "flag-colors.timer" → "colors"
             inner_name = unit_file[len("flag-"):-len(suffix)]
             if inner_name in _RESERVED_NAMES:
-                # Never touch reserved units (audio-http, reschedule)
+                # Never touch reserved units (audio-http, reschedule, flagd)
                 continue
             if inner_name not in current_names:
                 # Best-effort disable/stop before removal
@@ -784,26 +796,10 @@ def _clear_pause_in_config(config_path: str) -> bool:
     cfg["paused_until"] = ""
     try:
         st = os.stat(config_path)
-        dir_path = os.path.dirname(config_path) or "."
-        fd, tmp_path = tempfile.mkstemp(dir=dir_path, suffix=".tmp")
-        try:
-            with os.fdopen(fd, "w") as f:
-                json.dump(cfg, f, indent=2)
-                f.write("\n")
-            os.chmod(tmp_path, st.st_mode & 0o7777)
-            if hasattr(os, "chown"):
-                try:
-                    os.chown(tmp_path, st.st_uid, st.st_gid)
-                except (OSError, PermissionError):
-                    # Non-root or unsupported FS — keep going; mv-replace still works
-                    pass
-            os.replace(tmp_path, config_path)
-        except Exception:
-            try:
-                os.unlink(tmp_path)
-            except OSError:
-                pass
-            raise
+        atomic_write(
+            config_path, json.dumps(cfg, indent=2) + "\n",
+            mode=st.st_mode & 0o7777, owner=(st.st_uid, st.st_gid),
+        )
     except OSError as exc:
         _log.warning("Auto-resume: could not rewrite %s: %s", config_path, exc)
         return False
@@ -921,10 +917,12 @@ def main():
        sunset in local time) and write a ``.service`` + ``.timer`` pair
        atomically.
     6. Write the ``flag-reschedule`` service/timer pair (daily at 02:00).
-    7. Write the ``flag-boot-reschedule.service`` oneshot unit (runs on boot).
+    7. Write the ``flag-boot-reschedule.service`` oneshot unit (runs on boot)
+       and the ``flag-flagd.service`` resident playback daemon.
     8. Remove any stale ``flag-*.timer`` / ``flag-*.service`` unit files that
        are no longer in the current schedule list.
     9. Run ``systemctl daemon-reload``; print a clear error and exit on failure.
+       Then make sure ``flag-flagd.service`` is enabled and running.
     10. Activate timers:
 
        - **Reschedule run**: fixed-time timers are restarted only when their
@@ -956,6 +954,8 @@ def main():
         )
 
     config = load_config()
+    # Hash the config as sonos_play will load it, before it is filled in below.
+    plan_hash = fire_plan.config_hash(config)
 
     # Apply debug log level before anything else so early messages are captured
     if config.get("debug", False):
@@ -968,6 +968,17 @@ def main():
     tz_name = config["timezone"]
 
     _log.info("schedule_sonos.py started (timezone=%s)", tz_name)
+    preroll = get_preroll_seconds(config)
+
+    # Keep the precomputed sunset table current for this location, so that
+    # sunset fire times (here, in the play guard and in the sunset services)
+    # are table lookups.  Rebuilt only when it is missing, for another
+    # location or about to run out; a failure just means astral is used.
+    loc = get_location(config)
+    try:
+        sunset_table.refresh(loc.latitude, loc.longitude, loc.timezone)
+    except Exception as exc:
+        _log.warning("Could not refresh the sunset table: %s", exc)
 
     # Resolve pause state up front.  If paused_until has elapsed, this clears
     # the flag in config.json (auto-resume) and returns is_paused=False so the
@@ -995,24 +1006,22 @@ def main():
                 "Each schedule entry must have a unique name."
             )
         seen_names.add(name)
-        audio_url = entry.get("audio_url")
         time_val = entry.get("time")
-        if not audio_url:
-            print(f"  ⚠️  Skipping '{name}': missing required 'audio_url' field in schedule entry.")
-            continue
-        if not isinstance(audio_url, str) or not (
-            audio_url.startswith("http://") or audio_url.startswith("https://")
-        ):
-            _log.warning("Skipping '%s': audio_url %r is not a valid http/https URL.", name, audio_url)
-            print(f"  ⚠️  Skipping '{name}': audio_url must start with http:// or https://.")
+        try:
+            clips = resolve_clips(entry)
+            speakers = speaker_ips(config, raw_name) if "speakers" in entry else None
+        except ValueError as exc:
+            _log.warning("Skipping '%s': %s.", name, exc)
+            print(f"  ⚠️  Skipping '{name}': {exc}.")
             continue
         if not time_val:
             print(f"  ⚠️  Skipping '{name}': missing required 'time' field in schedule entry.")
             continue
         processed.append({
             "name": name,
-            "audio_url": audio_url,
+            "clips": clips,
             "time": time_val,
+            "speakers": speakers,
         })
 
     # --- Detect reschedule vs first-install mode ---
@@ -1051,9 +1060,12 @@ def main():
     # sunset_names: set of schedule names that are sunset-based, used to
     # branch in the activation loop.
     sunset_names: set[str] = set()
+    # Maps schedule name → its speaker IPs (None for all speakers); only
+    # schedules on the same speakers are coalesced.
+    speaker_sets: dict[str, frozenset] = {}
     for entry in processed:
         name = entry["name"]
-        audio_url = entry["audio_url"]
+        clips = entry["clips"]
         time_str = entry["time"]
 
         # Normalise once for all comparisons and parsing.  The original
@@ -1126,8 +1138,8 @@ def main():
                 continue
             _log.info(
                 "Schedule '%s': fixed time %s %s "
-                "(OnCalendar=*-*-* %02d:%02d:00, Persistent=false)",
-                name, time_str, tz_name, hour, minute,
+                "(OnCalendar=*-*-* %s, Persistent=false)",
+                name, time_str, tz_name, f"{_timer_start(hour, minute, preroll):%H:%M:%S}",
             )
 
         service_path = os.path.join(SYSTEMD_DIR, f"flag-{name}.service")
@@ -1142,11 +1154,13 @@ def main():
             # Because neither file ever needs updating, the daily 02:00
             # reschedule run will find _unit_file_content_matches() == True and
             # skip the write entirely — no daemon-reload, no race condition.
-            service_content = _build_sunset_service_unit(name, audio_url)
+            service_content = _build_sunset_service_unit(name, clips)
             timer_content = _build_sunset_timer_unit(name)
         else:
-            service_content = _build_service_unit(name, audio_url)
-            timer_content = _build_timer_unit(name, hour, minute)
+            service_content = _build_service_unit(
+                name, clips, (hour, minute) if preroll else None
+            )
+            timer_content = _build_timer_unit(name, hour, minute, preroll)
 
         # Only write unit files when content has actually changed to avoid
         # unnecessary daemon-reload cycles.
@@ -1169,13 +1183,43 @@ def main():
             sunset_names.add(name)
         time_display = (
             f"{time_str} → {hour:02d}:{minute:02d} {tz_name}" if is_sunset_based
-            else f"{time_str} {tz_name}"
+            else f"{time_str} {tz_name}" + (f", starting {preroll} s early" if preroll else "")
         )
+        if len(clips) > 1:
+            time_display += f", {len(clips)}-clip sequence"
+        if entry["speakers"] is not None:
+            time_display += f", on {', '.join(entry['speakers'])}"
+        speaker_sets[name] = frozenset(entry["speakers"] or speaker_ips(config))
         print(
             f"  ✅ {name}: scheduled at {time_display} "
             f"(flag-{name}.timer → flag-{name}.service)"
         )
 
+    # --- Report today's coalesced plays ---
+    # The grouping itself is applied at play time by sonos_play.py (sunset
+    # fire times move daily); this only tells the user what to expect.
+    coalesce_window = get_coalesce_window_seconds(config)
+    groups = []
+    for speakers in dict.fromkeys(speaker_sets.values()):
+        groups.extend(group_fire_times(
+            [(name, hour * 3600 + minute * 60) for name, (hour, minute) in all_times.items()
+             if speaker_sets[name] == speakers],
+            coalesce_window,
+        ))
+    for group in groups:
+        if len(group) > 1:
+            _log.info(
+                "Coalescing today: %s fire within %d s of '%s'; played in its session",
+                ", ".join(group[1:]), coalesce_window, group[0],
+            )
+            print(
+                f"  🔗 {' + '.join(group)}: fire within {coalesce_window} s of each other today "
+                f"— played back to back by {group[0]}"
+            )
+
+    # --- Compile today's and tomorrow's fire times for the play path ---
+    _write_fire_plan(config, plan_hash, processed, all_times, speaker_sets)
+
     # --- Write the daily reschedule service/timer pair ---
     reschedule_svc_content = _build_reschedule_service()
     reschedule_timer_content = _build_reschedule_timer()
@@ -1205,6 +1249,14 @@ def main():
         "(flag-boot-reschedule.service)"
     )
 
+    # --- Write the resident playback daemon service ---
+    flagd_svc_content = _build_flagd_service()
+    flagd_svc_path = os.path.join(SYSTEMD_DIR, "flag-flagd.service")
+    flagd_changed = not _unit_file_content_matches(flagd_svc_path, flagd_svc_content)
+    if flagd_changed:
+        _write_unit_file(flagd_svc_path, flagd_svc_content)
+        any_file_written = True
+
     # --- Remove stale unit files from previous runs ---
     stale_removed = _clean_stale_units(written_names)
 
@@ -1223,6 +1275,10 @@ def main():
     else:
         _log.info("Skipping daemon-reload: no unit files changed and no stale units removed")
 
+    # The daemon runs whether or not plays are paused: it only plays what
+    # the (possibly disabled) timers send it.
+    _ensure_flagd(flagd_changed)
+
     # --- Activate timers ---
     if is_paused:
         # Vacation mode: unit files are written/refreshed normally so a future
@@ -1309,7 +1365,7 @@ def main():
                 hour, minute = all_times[name]
                 tz_obj = pytz.timezone(tz_name)
                 now_local = datetime.now(tz_obj).time()
-                fire_time = time(hour, minute)
+                fire_time = _timer_start(hour, minute, preroll)
                 already_elapsed_today = now_local >= fire_time
 
                 if name not in changed_units:
@@ -1395,6 +1451,7 @@ def main():
         print(f"  flag-{name}.timer  →  flag-{name}.service")
     print("  flag-reschedule.timer  →  flag-reschedule.service")
     print("  flag-boot-reschedule.service  (oneshot on boot)")
+    print("  flag-flagd.service  (resident playback daemon)")
     print("")
     print("To verify:   systemctl list-timers --all | grep flag")
     if written_names:
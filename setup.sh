@@ -1078,9 +1078,11 @@ PYEOF
         printf "  %-20s %-35s %-22s\n" "--------------------" "-----------------------------------" "----------------------"
         for i in $(seq 0 $((SCHEDULE_COUNT - 1))); do
             _name=$(jq -r ".schedules[$i].name // \"(unnamed)\"" "$CONFIG_FILE")
-            _url=$(jq -r ".schedules[$i].audio_url // \"(none)\"" "$CONFIG_FILE")
+            # A sequence entry lists its clips' file names joined with " + ".
+            _file=$(jq -r ".schedules[$i] | if .sequence then
+                    [.sequence[] | if type == \"object\" then .audio_url else . end | tostring | split(\"/\") | last] | join(\" + \")
+                else (.audio_url // \"(none)\" | split(\"/\") | last) end" "$CONFIG_FILE")
             _time=$(jq -r ".schedules[$i].time // \"(none)\"" "$CONFIG_FILE")
-            _file=$(basename "$_url")
             if [[ "$_time" == sunset* ]] && [ -n "$_sunset_resolved" ]; then
                 _resolved=$(printf '%s\n' "$_sunset_resolved" | awk -F'\t' -v n="$_name" '$1==n {print $3; exit}')
                 if [[ -n "$_resolved" && "$_resolved" != ERROR:* ]]; then
@@ -2433,6 +2435,9 @@ function upgrade_scripts() {
     local _whitelist=()
     for _f in $FILES; do _whitelist+=("$_f"); done
     _whitelist+=(setup.log sonos_play.log)
+    # Runtime state that later plays rely on: coordinator election profiles,
+    # measured audio durations, the sunset table and the compiled fire plan.
+    _whitelist+=(latency_stats.json duration_cache.json sunset_table.bin fire_plan.json)
 
     local _deprecated_count=0
 
@@ -2531,7 +2536,7 @@ function upgrade_scripts() {
     # from config.json schedules (requires jq, which is a system dependency).
     if [ -f "$CONFIG_FILE" ] && command -v jq &>/dev/null; then
         local _expected_timers=("flag-reschedule.timer")
-        local _expected_services=("flag-audio-http.service" "flag-reschedule.service" "flag-boot-reschedule.service")
+        local _expected_services=("flag-audio-http.service" "flag-reschedule.service" "flag-boot-reschedule.service" "flag-flagd.service")
         while IFS= read -r _sched_name; do
             [ -n "$_sched_name" ] || continue
             _expected_timers+=("flag-${_sched_name}.timer")
@@ -2593,6 +2598,10 @@ function upgrade_scripts() {
     log "🗓️  Regenerating systemd timer units..."
     maybe_sudo "$VENV_DIR/bin/python" "$INSTALL_DIR/schedule_sonos.py"
 
+    # The resident playback daemon still runs the old code; restart it.
+    # Sunset plays it was sleeping on re-run locally and keep their fire time.
+    maybe_sudo systemctl try-restart flag-flagd.service 2>/dev/null || true
+
     log ""
     log "✅ Upgrade complete. Your config.json was not changed."
     log "   🧹 Cleanup summary: $_deprecated_count deprecated file(s) removed, $_stale_unit_count stale unit(s) removed."
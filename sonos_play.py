@@ -1,10 +1,12 @@
 """
 sonos_play.py — Plays an MP3 URL on one or more Sonos speakers in synchronized playback.
 
-Accepts a single audio URL argument, temporarily groups the configured speakers,
-plays the requested file, waits for playback to finish, then dissolves the
-temporary group and restores each speaker to its prior state (group membership,
-transport state, and volume). All events are logged to LOG_FILE.
+Accepts one audio URL argument (or several, played back to back), temporarily
+groups the configured speakers (or the ``speakers`` listed by the schedule
+being played), plays the requested file(s), waits for
+playback to finish, then dissolves the temporary group and restores each
+speaker to its prior state (group membership, transport state, and volume).
+All events are logged to LOG_FILE.
 
 When only one speaker is configured, the same 7-phase flow applies — the
 group formation steps (join/unjoin) are simply no-ops because there are no
@@ -16,6 +18,10 @@ Before any speaker discovery or playback, a time-of-day guard verifies that the
 current local time is within ``play_guard_tolerance_minutes`` (default: 2) of at
 least one scheduled fire time from ``config.json``.  If the check fails, the
 script logs a clear ERROR and exits non-zero without touching any speaker.
+Fire times come from the reschedule run's plan (``fire_plan.py``) or, when it
+is stale, from the light ``schedule_resolve.py``; soco and mutagen are
+only imported once the guard has passed (see :func:`load_playback_stack`), so
+a refused misfire costs little more than starting the interpreter.
 
 This guard prevents spurious 2 AM plays caused by systemd daemon-reload races
 (see schedule_sonos.py for the full explanation).  The guard is bypassed by:
@@ -77,33 +83,159 @@ daemon-reload race entirely.
 # SCENARIO 8: Volume correctness
 #   [ ] Bugle plays at configured volume on every speaker.
 #   [ ] Each speaker's original volume is restored after playback.
+#
+# SCENARIO 9: Schedules on different speakers fire together
+#   [ ] Schedule X lists speaker A, schedule Y lists B; both fire at 18:00.
+#   [ ] A and B play at the same time, each its own clip.
+#   [ ] A schedule listing A and B at the same time waits until both finish.
 # =============================================================================
 import argparse
-import fcntl
+import contextlib
+import io
 import logging
 import os
 import shutil
 import socket
 import sys
-import soco
 import tempfile
+import threading
 import time
 import urllib.error
 import urllib.request
+from urllib.parse import unquote, urlparse
+from concurrent.futures import Future, ThreadPoolExecutor, wait as _wait_futures
 from datetime import datetime
-from mutagen.mp3 import MP3
-from soco.snapshot import Snapshot
-from config import load_config, LOG_FILE
-
-try:
-    from soco.exceptions import SoCoSlaveException  # may not exist in older soco
-except ImportError:
-    SoCoSlaveException = None
+from zoneinfo import ZoneInfo
+from admission import PlayAdmission
+from coalesce import claim_followers, group_fire_times, merged_into, start_own_play
+from config import (
+    load_config, get_port, get_coalesce_window_seconds, get_play_admission, get_preroll_seconds, AUDIO_DIR, LOG_FILE, DURATION_CACHE_FILE,
+    LATENCY_STATS_FILE, MAX_PREROLL_SECONDS, MAX_SEQUENCE_GAP_SECONDS, find_schedule, lazy_import, read_number_setting,
+    schedule_key, schedule_speakers,
+)
+from duration_cache import DurationCache
+import fire_plan
+from latency_stats import LatencyStats, percentile
+import schedule_resolve
+from sonos_topology import apply_join, apply_unjoin, load_topology, plan_regroup, wait_for_topology
+
+# soco, soco.snapshot and mutagen take most of a cold start; they are loaded
+# by load_playback_stack() once the play guard has passed, not on import.
+soco = lazy_import("soco")
 
 _log = logging.getLogger(__name__)
 
-# Path to the shared advisory lock file used to prevent concurrent plays.
+# Base path of the advisory per-speaker lock files (/run/flag-<ip>.lock) that
+# keep two plays off the same speaker.
 _PLAY_LOCK_FILE = "/run/flag.lock"
+# Plays that find one of their speakers locked queue for it (see admission.py).
+_admission = PlayAdmission(_PLAY_LOCK_FILE)
+# Play lock taken by _sleep_until_schedule on the current thread.
+_held_play_lock = threading.local()
+
+# Per-speaker operation timings of the plays in progress (see latency_stats.py);
+# None outside main(), so helpers called on their own record nothing.  Plays
+# on disjoint speaker sets run concurrently in the daemon and share one
+# instance, saved as each play ends and dropped when the last one does.
+_latency = None
+_latency_users = 0
+_latency_lock = threading.Lock()
+
+# Phase 0 discovery defaults: probe at most this many speakers at once, and
+# give up on any speaker that has not answered within the overall deadline.
+_DEFAULT_DISCOVERY_WORKERS = 16
+_DEFAULT_DISCOVERY_TIMEOUT_SECS = 10.0
+
+# Bugle coordinator election (see rank_coordinators).  Model numbers of older
+# hardware (Play:1, Play:3, first-generation Play:5, Connect, Connect:Amp,
+# ZP80/ZP100) whose slower CPUs make them poor group coordinators:
+_LEGACY_MODELS = frozenset({"S1", "S3", "S5", "ZP80", "ZP90", "ZP100", "ZP120"})
+# Speakers are compared on the response time of the Phase 0 probe, the one
+# operation every reachable speaker records on every play; the others depend
+# on the speaker's role (only coordinators pause, only members join).  Its
+# median only counts once it has this many samples, and differences within
+# one bucket are noise rather than a reason to pass over an earlier
+# configured speaker.
+_ELECTION_OP = "speaker_info"
+_ELECTION_MIN_SAMPLES = 5
+_ELECTION_LATENCY_BUCKET_MS = 50
+
+# Relative share of the ``play_deadline_seconds`` budget given to each pre-play
+# phase.  Shares are applied to the time *remaining* when a phase starts, so a
+# phase that finishes early hands its leftover time to the later ones.
+_PHASE_BUDGET_SHARES = (("discovery", 4), ("snapshot", 2), ("teardown", 2), ("group", 2))
+# Every phase gets at least this long, even once the budget is spent, so an
+# overrun degrades to "play slightly late on the fast speakers" rather than
+# "play on nothing".
+_MIN_PHASE_SECS = 0.5
+
+# Group settle: after a join/unjoin, poll the topology until it shows the new
+# grouping, for at most settle_timeout_seconds.  If the topology cannot be
+# read at all, fall back to the old fixed pause.
+_DEFAULT_SETTLE_TIMEOUT_SECS = 3.0
+_SETTLE_POLL_SECS = 0.2
+_FALLBACK_SETTLE_SECS = 1
+
+# MP3 duration: fetch this much of the file with a Range request and read the
+# length from the first frame's Xing/Info/VBRI header (or bitrate × size for
+# CBR).  Enough for the ID3-less start of the file plus several frames.
+_HEADER_PROBE_BYTES = 16 * 1024
+_AUDIO_FETCH_TIMEOUT_SECS = 15
+
+# Durations of files under AUDIO_DIR, keyed by (st_dev, st_ino, st_mtime_ns,
+# st_size) so a replaced or re-encoded file is measured again.
+_LOCAL_DURATIONS = {}
+# Host name -> whether it names this machine (see _is_local_host).
+_LOCAL_HOSTS = {}
+
+# Phase 4 end-of-playback detection.  The coordinator counts as busy with the
+# bugle call while its transport is in one of these states; anything else
+# (STOPPED, PAUSED_PLAYBACK, NO_MEDIA_PRESENT) means playback has ended.
+_ACTIVE_TRANSPORT_STATES = ("PLAYING", "TRANSITIONING")
+# Poll quickly right after play_uri and near the expected end, slowly between.
+_END_POLL_FAST_SECS = 0.5
+_END_POLL_SLOW_SECS = 5.0
+# An idle state seen before the speaker ever reported PLAYING is only trusted
+# after this long — play_uri can return before the transport has started.
+_START_GRACE_SECS = 5.0
+_DEFAULT_PLAYBACK_OVERRUN_SECS = 15
+
+
+def Snapshot(device):
+    """Return ``soco.snapshot.Snapshot(device)`` (imported on first use)."""
+    from soco.snapshot import Snapshot as _Snapshot
+
+    return _Snapshot(device)
+
+
+def MP3(filething):
+    """Return ``mutagen.mp3.MP3(filething)`` (imported on first use)."""
+    from mutagen.mp3 import MP3 as _MP3
+
+    return _MP3(filething)
+
+
+def MPEGInfo(fileobj):
+    """Return ``mutagen.mp3.MPEGInfo(fileobj)`` (imported on first use)."""
+    from mutagen.mp3 import MPEGInfo as _MPEGInfo
+
+    return _MPEGInfo(fileobj)
+
+
+def load_playback_stack():
+    """
+    Import soco, ``soco.snapshot`` and mutagen on the calling thread.
+
+    Called once a play is going ahead (and by the daemon's warm-up), before
+    any worker thread touches the lazily imported ``soco``.  Cheap once
+    loaded; the first call logs how long the imports took.
+    """
+    if "mutagen.mp3" in sys.modules and "soco.snapshot" in sys.modules:
+        return
+    started = time.perf_counter()
+    import soco.snapshot  # noqa: F401 (also executes the lazy ``soco`` module)
+    import mutagen.mp3  # noqa: F401
+    _log.info("Loaded playback stack (soco, mutagen) in %.0f ms", (time.perf_counter() - started) * 1000)
 
 
 def log(message):
@@ -125,6 +257,8 @@ def check_play_guard(config, now=None):
     Reads the ``schedules`` list from *config*, computes today's local fire time
     for every entry (including sunset-based ones), and returns ``True`` if *now*
     falls within ``±play_guard_tolerance_minutes`` of at least one fire time.
+    The window opens a further ``preroll_seconds`` early, since fixed-time
+    units with a pre-roll start that long before their fire time.
 
     Returns ``True`` immediately (bypassing all checks) when:
 
@@ -148,75 +282,39 @@ def check_play_guard(config, now=None):
         return True
 
     tolerance_mins = int(config.get("play_guard_tolerance_minutes", 2))
-    tz_name = config.get("timezone", "UTC")
 
-    # Attempt timezone-aware comparison; fall back to naive local time.
-    try:
-        import pytz as _pytz
-        tz_obj = _pytz.timezone(tz_name)
-        if now is None:
-            now_aware = datetime.now(tz_obj)
-        elif getattr(now, "tzinfo", None) is None:
-            now_aware = tz_obj.localize(now)
-        else:
+    # Compare in the configured timezone; fall back to naive local time.
+    if now is None:
+        now_aware = schedule_resolve.local_now(config)
+    elif getattr(now, "tzinfo", None) is None:
+        try:
+            now_aware = now.replace(tzinfo=ZoneInfo(config.get("timezone", "UTC")))
+        except Exception:
+            # Invalid timezone — fall back to the naive datetime.
             now_aware = now
-    except Exception:
-        # pytz unavailable or invalid timezone — fall back to naive datetime.
-        now_aware = now if now is not None else datetime.now()
+    else:
+        now_aware = now
 
     schedules = config.get("schedules") or []
     if not schedules:
         # No schedules → cannot determine expected fire time → allow.
         return True
 
-    # Lazy import of sunset helpers to avoid a hard dependency at module load.
-    try:
-        from schedule_sonos import (
-            parse_sunset_offset,
-            get_sunset_local_time,
-            get_sunset_local_time_with_offset,
-        )
-        _sunset_helpers_available = True
-    except ImportError:
-        _sunset_helpers_available = False
-
     tolerance_secs = tolerance_mins * 60
+    preroll_secs = get_preroll_seconds(config)
+    plan = fire_plan.current(config)
 
     for entry in schedules:
-        time_str = entry.get("time", "")
-        if not isinstance(time_str, str) or not time_str.strip():
-            continue
-        time_str_norm = time_str.strip().lower()
-
         try:
-            if _sunset_helpers_available:
-                offset = parse_sunset_offset(time_str_norm)
-            else:
-                offset = None
-
-            if time_str_norm == "sunset":
-                if not _sunset_helpers_available:
-                    continue
-                hour, minute = get_sunset_local_time(config)
-            elif offset is not None:
-                if not _sunset_helpers_available:
-                    continue
-                hour, minute = get_sunset_local_time_with_offset(config, offset)
-            else:
-                parts = time_str_norm.split(":")
-                if len(parts) != 2:
-                    continue
-                hour, minute = int(parts[0]), int(parts[1])
-                if not (0 <= hour <= 23 and 0 <= minute <= 59):
-                    continue
+            hour, minute = fire_plan.fire_time(config, entry.get("time", ""), plan)
         except Exception:
             continue
 
         try:
             fire_dt = now_aware.replace(hour=hour, minute=minute,
                                         second=0, microsecond=0)
-            delta_secs = abs((now_aware - fire_dt).total_seconds())
-            if delta_secs <= tolerance_secs:
+            delta_secs = (now_aware - fire_dt).total_seconds()
+            if -(tolerance_secs + preroll_secs) <= delta_secs <= tolerance_secs:
                 return True
         except Exception:
             continue
@@ -236,9 +334,10 @@ def _sleep_until_schedule(config, schedule_name):
     started after a reboot past sunset), exits with code 0 immediately without
     playing — missed plays are intentionally skipped.
 
-    After waking, acquires the shared advisory play lock (``/run/flag.lock``)
-    non-exclusively so that concurrent plays are still prevented (same semantics
-    as the ``flock -n`` wrapper used by fixed-time services).
+    After waking, acquires the advisory play locks of the schedule's speakers
+    so that concurrent plays on them are still prevented; if another play
+    holds one, the schedule queues for up to its ``max_lateness_seconds``
+    (same as fixed-time services).
 
     Args:
         config (dict): Parsed configuration from config.json.
@@ -248,8 +347,7 @@ def _sleep_until_schedule(config, schedule_name):
         Never returns normally; either sleeps-then-returns-to-caller OR sys.exit.
     """
     # Locate the schedule entry.
-    schedules = config.get("schedules") or []
-    entry = next((s for s in schedules if s.get("name") == schedule_name), None)
+    entry = find_schedule(config, schedule_name)
     if entry is None:
         _log.error(
             "--sleep-until-schedule: schedule '%s' not found in config.json; aborting.",
@@ -257,34 +355,10 @@ def _sleep_until_schedule(config, schedule_name):
         )
         sys.exit(1)
 
-    time_str = entry.get("time", "")
-    time_str_norm = (time_str.strip().lower() if isinstance(time_str, str)
-                     else "")
-
-    tz_name = config.get("timezone", "UTC")
-    try:
-        import pytz as _pytz
-        tz_obj = _pytz.timezone(tz_name)
-        now = datetime.now(tz_obj)
-    except Exception:
-        now = datetime.now()
-
+    now = schedule_resolve.local_now(config)
+    plan = fire_plan.current(config)
     try:
-        from schedule_sonos import (
-            parse_sunset_offset,
-            get_sunset_local_time,
-            get_sunset_local_time_with_offset,
-        )
-        offset = parse_sunset_offset(time_str_norm)
-        if time_str_norm == "sunset":
-            hour, minute = get_sunset_local_time(config)
-        elif offset is not None:
-            hour, minute = get_sunset_local_time_with_offset(config, offset)
-        else:
-            parts = time_str_norm.split(":")
-            if len(parts) != 2:
-                raise ValueError(f"Unexpected time format: {time_str!r}")
-            hour, minute = int(parts[0]), int(parts[1])
+        hour, minute = fire_plan.fire_time(config, entry.get("time", ""), plan)
     except Exception as exc:
         _log.error(
             "--sleep-until-schedule: cannot compute fire time for '%s': %s; aborting.",
@@ -303,6 +377,8 @@ def _sleep_until_schedule(config, schedule_name):
         )
         sys.exit(0)
 
+    # Import the playback stack now rather than after waking at the fire time.
+    load_playback_stack()
     _log.info(
         "sleep_until_schedule: sleeping %.0f s until %02d:%02d for schedule '%s'",
         sleep_secs, hour, minute, schedule_name,
@@ -313,86 +389,1399 @@ def _sleep_until_schedule(config, schedule_name):
         hour, minute, schedule_name,
     )
 
-    # Acquire the shared advisory lock (non-blocking) so that concurrent plays
-    # are prevented, matching the ``flock -n /run/flag.lock`` semantics used by
-    # fixed-time services.
+    # A schedule coalesced into an earlier one today has already been played
+    # (or is playing right now) in that schedule's session.
+    leader = merged_into(schedule_name)
+    if leader is not None:
+        _log.info(
+            "sleep_until_schedule: '%s' was played in the session of '%s'; skipping.",
+            schedule_name, leader,
+        )
+        sys.exit(0)
+
+    # Lock this schedule's speakers so that concurrent plays on them are
+    # prevented.  If another play holds one, wait in the admission queue for
+    # as long as this schedule may still start late (max_lateness_seconds).
     try:
-        lock_fd = open(_PLAY_LOCK_FILE, "w")
-        fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
-        # Keep lock_fd alive for the duration of the process (closed on exit).
-        # Assign to a module-level variable so it is not garbage-collected.
-        _sleep_until_schedule._lock_fd = lock_fd  # type: ignore[attr-defined]
-    except (OSError, IOError):
+        speakers = fire_plan.schedule_speaker_ips(config, schedule_name, plan)
+    except ValueError as exc:
+        _log.error("sleep_until_schedule: schedule '%s': %s; aborting.", schedule_name, exc)
+        sys.exit(1)
+    priority, max_wait = get_play_admission(config, schedule_name)
+    lock_fd = acquire_play_lock(schedule_name, priority, max_wait, speakers)
+    if lock_fd is not None:
+        # Keep lock_fd alive for the duration of the process (closed on exit,
+        # or by release_play_lock() in the resident daemon).  Held per thread
+        # because the daemon runs concurrent sleeping requests on separate
+        # threads, and each must only ever release its own lock.
+        _held_play_lock.fd = lock_fd
+    else:
         _log.error(
-            "sleep_until_schedule: another play is in progress; skipping '%s'.",
-            schedule_name,
+            "sleep_until_schedule: another play was still using its speakers after %d s; skipping '%s'.",
+            max_wait, schedule_name,
         )
         sys.exit(0)
 
     # Caller (main()) will proceed with the normal playback flow after we return.
 
 
-def get_mp3_duration(url, default_wait):
+def _play_at_deadline(config, play_at, now=None):
+    """
+    Return the ``time.monotonic()`` deadline for ``--play-at HH:MM``.
+
+    The fire time is ``HH:MM:00`` in the configured timezone on whichever day
+    puts it closest to *now* (a unit pre-rolled from 23:59:50 plays at 00:00
+    tomorrow).  Pre-roll units start at most ``MAX_PREROLL_SECONDS`` early, so
+    a fire time further ahead than that is not waited for.
+
+    Args:
+        config (dict): Parsed configuration from config.json.
+        play_at (str): ``HH:MM`` fire time.
+        now (datetime | None): Current time (defaults to now in the
+            configured timezone).
+
+    Returns:
+        float | None: The monotonic deadline (possibly already past), or
+        ``None`` if the fire time is too far ahead to wait for.
+
+    Raises:
+        ValueError: If *play_at* is not a valid ``HH:MM`` time.
+    """
+    parts = play_at.strip().split(":")
+    if len(parts) != 2:
+        raise ValueError(f"expected HH:MM, got {play_at!r}")
+    hour, minute = int(parts[0]), int(parts[1])
+    if now is None:
+        now = schedule_resolve.local_now(config)
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    delta = (target - now).total_seconds()
+    if delta > 43200:
+        delta -= 86400
+    elif delta < -43200:
+        delta += 86400
+    if delta > MAX_PREROLL_SECONDS:
+        log(f"WARNING: --play-at {play_at} is {delta:.0f} s away; not waiting for it")
+        return None
+    return time.monotonic() + delta
+
+
+def acquire_play_lock(name="play", priority=0, max_wait=0, speakers=None):
     """
-    Download an MP3 from *url* and return its duration in whole seconds.
+    Lock the play's speakers (``/run/flag-<ip>.lock``), queueing if one is held.
 
-    If the file cannot be downloaded or its duration cannot be read, the
-    function logs a warning and returns *default_wait* as the fallback.
+    With *max_wait* ``0`` this is ``flock -n`` on each lock.  Otherwise the
+    request waits in priority order until the plays using its speakers
+    finish, for at most *max_wait* seconds (see
+    :class:`admission.PlayAdmission`).  Plays on other speakers do not hold
+    it up.  The locks are held until :func:`release_play_lock` (or the
+    process exits).
+
+    Args:
+        name (str): Schedule name, for the queue logs and status.
+        priority (int): Higher values are admitted first.
+        max_wait (float): Longest wait for the locks in seconds.
+        speakers (list[str] | None): IP addresses of the targeted speakers
+            (see :func:`config.speaker_ips`).
+
+    Returns:
+        admission.PlayLock | None: The held locks, or ``None`` if another
+        play still used one of the speakers after *max_wait*.
+    """
+    return _admission.acquire(name, priority, max_wait, speakers)
+
+
+def release_play_lock(lock_fd=None):
+    """
+    Release *lock_fd*, or the lock taken by ``--sleep-until-schedule`` if any.
+
+    A one-shot process simply exits; the resident daemon (``flagd.py``) runs
+    :func:`main` repeatedly in one process and must release it explicitly so
+    the next queued play is admitted.
+    """
+    if lock_fd is None:
+        lock_fd = getattr(_held_play_lock, "fd", None)
+        _held_play_lock.fd = None
+    if lock_fd is not None:
+        _admission.release(lock_fd)
+
+
+class _PartialMP3(io.BytesIO):
+    """
+    The first bytes of an MP3 that report the size of the whole file.
+
+    mutagen estimates a CBR file's length as ``8 * (file size - first frame
+    offset) / bitrate``; reporting the real size on ``seek(0, 2)`` lets it do
+    that from a Range-request prefix.
+    """
+
+    def __init__(self, data, total_size):
+        super().__init__(data)
+        self._total_size = total_size
+
+    def seek(self, offset, whence=0):
+        if whence == 2:
+            return super().seek(self._total_size + offset - len(self.getbuffer()), 2)
+        return super().seek(offset, whence)
+
+
+def _fetch_range(url, start, length):
+    """
+    GET ``length`` bytes of *url* starting at *start* with a Range request.
+
+    Servers that ignore Range answer 200 with the whole file; only the first
+    *length* bytes of the body are read in that case.
+
+    Returns:
+        tuple[bytes, int | None, email.message.Message]: The bytes read, the
+        total size of the resource (``None`` if the server did not say) and
+        the response headers.
+    """
+    req = urllib.request.Request(url, headers={"Range": f"bytes={start}-{start + length - 1}"})
+    with urllib.request.urlopen(req, timeout=_AUDIO_FETCH_TIMEOUT_SECS) as response:
+        if response.status == 206:
+            # Content-Range: bytes 0-16383/123456  (total may be "*")
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            total = int(total) if total.isdigit() else None
+        else:
+            if start:
+                # Whole file came back; the caller's offset no longer applies.
+                return b"", None, response.headers
+            total = response.headers.get("Content-Length")
+            total = int(total) if total and total.isdigit() else None
+        return response.read(length), total, response.headers
+
+
+def _id3v2_size(data):
+    """Return the size of the ID3v2 tag at the start of *data* (0 if none)."""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in data[6:10]:  # 28-bit "syncsafe" integer
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _header_duration(url):
+    """
+    Read the duration of the MP3 at *url* from its first frames only.
+
+    Fetches ``_HEADER_PROBE_BYTES`` with a Range request (plus a second one
+    past a large ID3v2 tag, e.g. embedded cover art) and lets mutagen parse
+    the first MPEG frame: a Xing/Info/VBRI header gives the exact frame count
+    (LAME encoder delay and padding included), otherwise several consistent
+    CBR frames give the bitrate and the total size gives the length.
 
     Args:
         url (str): URL of the MP3 file.
-        default_wait (int): Fallback duration in seconds.
 
     Returns:
-        int: Duration of the MP3 in seconds, or *default_wait* on failure.
+        tuple[float | None, int | None, email.message.Message]: Duration in
+        seconds (``None`` when the header is inconclusive: no VBR header and
+        no total size, unsynchronised frames, or a tag that swallows the
+        whole probe), the file size, and the first response's headers.
+
+    Raises:
+        socket.timeout, urllib.error.URLError: On network failure.
+    """
+    data, total, headers = _fetch_range(url, 0, _HEADER_PROBE_BYTES)
+    offset = _id3v2_size(data)
+    if offset and total is not None and offset >= total:
+        return None, total, headers
+    if offset + 4 > len(data):
+        data, _, _ = _fetch_range(url, offset, _HEADER_PROBE_BYTES)
+    else:
+        data = data[offset:]
+    if not data or total is None:
+        return None, total, headers
+    try:
+        info = MPEGInfo(_PartialMP3(data, total - offset))
+    except Exception as e:
+        _log.debug("MP3 header probe inconclusive for %s: %s", url, e)
+        return None, total, headers
+    if info.sketchy or info.length <= 0:
+        return None, total, headers
+    return info.length, total, headers
+
+
+def _download_duration(url):
+    """
+    Download the whole MP3 at *url* to a temporary file and read its length.
+
+    Returns:
+        tuple[float, int, email.message.Message]: Duration in seconds, file
+        size in bytes, and the response headers.
+
+    Raises:
+        socket.timeout, urllib.error.URLError: On network failure.
+        Exception: Whatever mutagen raises for an unreadable file.
     """
     tmp = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False)
     temp_file = tmp.name
     tmp.close()
     try:
+        with urllib.request.urlopen(url, timeout=_AUDIO_FETCH_TIMEOUT_SECS) as response:
+            with open(temp_file, "wb") as f:
+                shutil.copyfileobj(response, f)
+            headers = response.headers
+        return MP3(temp_file).info.length, os.path.getsize(temp_file), headers
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def _is_local_host(host):
+    """
+    Return ``True`` if *host* names this machine.
+
+    Loopback names and this machine's own host names are recognised
+    directly; anything else is resolved and each address is tested by
+    binding a throwaway UDP socket to it, which only succeeds for addresses
+    assigned to a local interface.  No packets are sent.  Results are
+    memoized per process.
+    """
+    host = host.lower()
+    if host in _LOCAL_HOSTS:
+        return _LOCAL_HOSTS[host]
+    hostname = socket.gethostname().lower()
+    if host in ("localhost", "::1", hostname, hostname.split(".")[0]) or host.startswith("127."):
+        _LOCAL_HOSTS[host] = True
+        return True
+    local = False
+    try:
+        addrs = {info[4][0] for info in socket.getaddrinfo(host, None, proto=socket.IPPROTO_UDP)}
+    except (OSError, UnicodeError):
+        addrs = set()
+    for addr in addrs:
+        family = socket.AF_INET6 if ":" in addr else socket.AF_INET
         try:
-            with urllib.request.urlopen(url, timeout=15) as response:
-                with open(temp_file, "wb") as f:
-                    shutil.copyfileobj(response, f)
+            with socket.socket(family, socket.SOCK_DGRAM) as probe:
+                probe.bind((addr, 0))
+        except OSError:
+            continue
+        local = True
+        break
+    _LOCAL_HOSTS[host] = local
+    return local
+
+
+def _local_audio_path(url, audio_port):
+    """
+    Map *url* to a file under ``AUDIO_DIR`` if our own audio server serves it.
+
+    The flag-audio-http service runs ``python -m http.server <port>
+    --directory AUDIO_DIR`` on this machine, so ``http://<this host>:<port>/x.mp3``
+    is ``AUDIO_DIR/x.mp3``.
+
+    Args:
+        url (str): Audio URL.
+        audio_port (int): Port the local audio server listens on.
+
+    Returns:
+        str | None: Absolute file path, or ``None`` if the URL is not served
+        locally (other host or port, path escaping ``AUDIO_DIR``, or no such
+        file).
+    """
+    try:
+        parsed = urlparse(url)
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    except ValueError:
+        return None
+    if parsed.scheme != "http" or port != audio_port or not parsed.hostname:
+        return None
+    root = os.path.realpath(AUDIO_DIR)
+    path = os.path.realpath(os.path.join(root, unquote(parsed.path).lstrip("/")))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return None
+    if not _is_local_host(parsed.hostname):
+        return None
+    return path
+
+
+def _local_file_duration(path):
+    """
+    Return the duration of the local MP3 at *path*, memoized by inode and mtime.
+
+    mutagen only reads the ID3 tag and the first frames of a local file, so
+    even a miss costs a few KB of disk reads and no network I/O.
+
+    Raises:
+        OSError: If the file cannot be read.
+        Exception: Whatever mutagen raises for an unreadable file.
+    """
+    st = os.stat(path)
+    key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+    length = _LOCAL_DURATIONS.get(key)
+    if length is None:
+        length = MP3(path).info.length
+        _LOCAL_DURATIONS[key] = length
+    return length
+
+
+def _revalidate_cached_duration(url, entry):
+    """
+    Check with one conditional HEAD request that a cached duration still applies.
+
+    Args:
+        url (str): URL of the MP3 file.
+        entry (dict): Cache entry from :class:`duration_cache.DurationCache`.
+
+    Returns:
+        bool: ``True`` if the server answered 304, or 200 with the same
+        ``ETag`` / ``Last-Modified`` (and size) as when the duration was
+        measured.
+
+    Raises:
+        socket.timeout, urllib.error.URLError: On network failure or an HTTP
+            error other than 304.
+    """
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    req = urllib.request.Request(url, headers=headers, method="HEAD")
+    try:
+        with urllib.request.urlopen(req, timeout=_AUDIO_FETCH_TIMEOUT_SECS) as response:
+            current = response.headers
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return True
+        raise
+    if entry.get("etag"):
+        same = current.get("ETag") == entry["etag"]
+    else:
+        same = current.get("Last-Modified") == entry["last_modified"]
+    size = current.get("Content-Length")
+    if same and entry.get("size") is not None and size and size.isdigit():
+        same = int(size) == entry["size"]
+    return same
+
+
+def get_mp3_duration(url, default_wait, audio_port=None):
+    """
+    Return the duration of the MP3 at *url* in whole seconds.
+
+    When *audio_port* is given and *url* points at this machine's own audio
+    server on that port, the duration is read straight from the file in
+    ``AUDIO_DIR`` (see :func:`_local_audio_path`) with no network I/O.
+
+    Remote durations are cached on disk in ``DURATION_CACHE_FILE`` together with the
+    server's ``ETag`` / ``Last-Modified``; a cached duration is reused after a
+    conditional HEAD request confirms the file is unchanged (or, if that
+    request cannot reach the server, as the best estimate available).
+
+    Otherwise the duration is read from the first few KB of the file with an
+    HTTP Range request (see :func:`_header_duration`); the whole file is
+    downloaded only when that header is inconclusive or the server rejects
+    the Range request.  If the file cannot be fetched or its duration cannot
+    be read, the function logs a warning and returns *default_wait* as the
+    fallback.
+
+    Args:
+        url (str): URL of the MP3 file.
+        default_wait (int): Fallback duration in seconds.
+        audio_port (int, optional): Port of the local audio server
+            (``config.get_port()``); ``None`` skips the local-file check.
+
+    Returns:
+        int: Duration of the MP3 in seconds, or *default_wait* on failure.
+    """
+    local_path = _local_audio_path(url, audio_port) if audio_port else None
+    if local_path is not None:
+        try:
+            duration = int(_local_file_duration(local_path))
+        except Exception as e:
+            _log.warning("Could not read duration of %s (%s); trying %s", local_path, e, url)
+        else:
+            _log.info("MP3 duration is %d seconds (local file %s)", duration, local_path)
+            return duration
+
+    cache = DurationCache.load(DURATION_CACHE_FILE)
+    entry = cache.get(url)
+    if entry is not None:
+        try:
+            fresh = _revalidate_cached_duration(url, entry)
+        except urllib.error.HTTPError as e:
+            _log.info("Cached duration for %s not revalidated (%s); measuring again", url, e)
+            fresh = False
         except (socket.timeout, urllib.error.URLError) as e:
-            _log.warning("Could not download audio for duration check. Defaulting to %d sec. Error: %s", default_wait, e)
-            return default_wait
-        audio = MP3(temp_file)
-        duration = int(audio.info.length)
-        _log.info("MP3 duration is %d seconds", duration)
-        return duration
+            _log.warning("Could not revalidate cached duration for %s; using it anyway. Error: %s", url, e)
+            fresh = True
+        if fresh:
+            cache.touch(url)
+            cache.save()
+            duration = int(entry["duration"])
+            _log.info("MP3 duration is %d seconds (cached)", duration)
+            return duration
+        cache.discard(url)
+
+    try:
+        try:
+            length, size, headers = _header_duration(url)
+        except urllib.error.HTTPError as e:
+            _log.info("Range request for %s rejected (%s); downloading whole file", url, e)
+            length = None
+        if length is None:
+            length, size, headers = _download_duration(url)
+        else:
+            _log.debug("MP3 duration read from header")
+    except (socket.timeout, urllib.error.URLError) as e:
+        _log.warning("Could not download audio for duration check. Defaulting to %d sec. Error: %s", default_wait, e)
+        cache.save()
+        return default_wait
     except Exception as e:
         _log.warning("Could not get duration. Defaulting to %d sec. Error: %s", default_wait, e)
+        cache.save()
         return default_wait
+    cache.put(url, length, size=size,
+              etag=headers.get("ETag"), last_modified=headers.get("Last-Modified"))
+    cache.save()
+    duration = int(length)
+    _log.info("MP3 duration is %d seconds", duration)
+    return duration
+
+
+def start_duration_lookup(url, default_wait, audio_port=None):
+    """
+    Run :func:`get_mp3_duration` on a background thread.
+
+    Started before Phase 0 so the lookup (HEAD revalidation, Range request or
+    full download) overlaps discovery, snapshot and group formation instead
+    of sitting between "group formed" and ``play_uri``.  The thread is a
+    daemon so an early abort (e.g. every speaker offline) does not wait for
+    it.
+
+    Args:
+        url (str): URL of the MP3 file.
+        default_wait (int): Fallback duration in seconds.
+        audio_port (int, optional): Port of the local audio server.
+
+    Returns:
+        concurrent.futures.Future: Resolves to the duration in seconds.
+    """
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(get_mp3_duration(url, default_wait, audio_port=audio_port))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="duration-lookup", daemon=True).start()
+    return future
+
+
+def _timed(sp, op):
+    """
+    Return a context manager timing its body as operation *op* on speaker *sp*.
+
+    The sample goes into the current play's latency statistics; outside a
+    play this is a no-op.
+    """
+    stats = _latency
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.timed(str(sp.ip_address), op)
+
+
+def _timed_call(sp, op, *args):
+    """Call ``sp.<op>(*args)`` timed as *op* (see :func:`_timed`) and return its result."""
+    with _timed(sp, op):
+        return getattr(sp, op)(*args)
+
+
+def _begin_latency_stats():
+    """Start recording latency samples for a play (see :data:`_latency`)."""
+    global _latency, _latency_users
+    with _latency_lock:
+        if _latency is None:
+            _latency = LatencyStats.load(LATENCY_STATS_FILE)
+        _latency_users += 1
+        return _latency
+
+
+def _finish_latency_stats():
+    """Write the current play's latency samples to disk; stop recording after the last play."""
+    global _latency, _latency_users
+    with _latency_lock:
+        stats = _latency
+        _latency_users = max(0, _latency_users - 1)
+        if not _latency_users:
+            _latency = None
+        if stats is not None:
+            stats.save()
+
+
+def _run_concurrently(fn, items, max_workers, timeout=None):
+    """
+    Call ``fn(item)`` for every item on a bounded thread pool.
+
+    Results are reported in the order of *items*, not completion order, so
+    callers that care about ordering (e.g. coordinator selection) can rely on
+    it.  Exceptions raised by *fn* are captured per item and never propagate.
+
+    When *timeout* expires, items still running are reported as timed out and
+    the pool is shut down without waiting for them; their worker threads are
+    left to finish (or hit the SoCo request timeout) in the background.
+
+    Args:
+        fn (callable): Function taking a single item.
+        items (list): Work items.
+        max_workers (int): Upper bound on concurrently running calls.
+        timeout (float | None): Overall deadline in seconds, or ``None`` to
+            wait for every call.
+
+    Returns:
+        tuple[list, list, list]: ``(done, failed, timed_out)`` where *done* is a
+        list of ``(item, result)`` pairs, *failed* is a list of
+        ``(item, exception)`` pairs and *timed_out* is a list of items.
+    """
+    if not items:
+        return [], [], []
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items))))
+    try:
+        futures = [executor.submit(fn, item) for item in items]
+        _wait_futures(futures, timeout=timeout)
     finally:
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    done, failed, timed_out = [], [], []
+    for item, future in zip(items, futures):
+        if not future.done() or future.cancelled():
+            timed_out.append(item)
+        elif future.exception() is not None:
+            failed.append((item, future.exception()))
+        else:
+            done.append((item, future.result()))
+    return done, failed, timed_out
+
+
+class PlayBudget:
+    """
+    End-to-end "must be playing by" time budget for a single play.
+
+    Created when the play starts with the ``play_deadline_seconds`` config
+    value.  Each pre-play phase asks :meth:`phase_timeout` for its time limit;
+    speakers that have not finished the phase by then are dropped so the
+    rest can play on time.
 
+    Args:
+        total_secs (float): Seconds from *start* by which ``play_uri`` should
+            have been issued.
+        start (float | None): ``time.monotonic()`` value the budget counts
+            from.  Defaults to now.
+    """
+
+    def __init__(self, total_secs, start=None):
+        self.total_secs = total_secs
+        self.deadline = (time.monotonic() if start is None else start) + total_secs
+        self._shares = dict(_PHASE_BUDGET_SHARES)
+
+    def remaining(self):
+        """Return the seconds left until the deadline (negative once overrun)."""
+        return self.deadline - time.monotonic()
+
+    def phase_timeout(self, phase):
+        """
+        Return the time limit in seconds for *phase* and mark it as started.
+
+        Args:
+            phase (str): One of the names in ``_PHASE_BUDGET_SHARES``.
+
+        Returns:
+            float: The phase's proportional share of the remaining budget,
+            never less than ``_MIN_PHASE_SECS``.
+        """
+        share = self._shares.pop(phase, 0)
+        outstanding = share + sum(self._shares.values())
+        remaining = self.remaining()
+        allotted = remaining * share / outstanding if outstanding else remaining
+        return max(_MIN_PHASE_SECS, allotted)
+
+
+def _phase_timeout(budget, phase, default=None):
+    """
+    Return the time limit for *phase*: the budget share capped at *default*.
+
+    Args:
+        budget (PlayBudget | None): The play budget, or ``None`` when
+            ``play_deadline_seconds`` is not configured.
+        phase (str): Phase name (see ``_PHASE_BUDGET_SHARES``).
+        default (float | None): Limit used without a budget; ``None`` means
+            no limit.
+
+    Returns:
+        float | None: Seconds allowed for the phase, or ``None`` for no limit.
+    """
+    if budget is None:
+        return default
+    allotted = budget.phase_timeout(phase)
+    return allotted if default is None else min(default, allotted)
 
-def main():
+
+def _time_left(deadline):
+    """Return seconds until the monotonic *deadline* (``None`` = no deadline), floored at ``_MIN_PHASE_SECS``."""
+    if deadline is None:
+        return None
+    return max(_MIN_PHASE_SECS, deadline - time.monotonic())
+
+
+def _drop_laggards(speakers, late, phase):
+    """
+    Return *speakers* without the ones in *late*, logging each one dropped.
+
+    Args:
+        speakers (list): Speakers still taking part in the play.
+        late (list): Speakers that did not finish *phase* within its limit.
+        phase (str): Phase name used in the log message.
+
+    Returns:
+        list: The remaining speakers, in their original order.
+    """
+    for sp in late:
+        log(f"WARNING: {sp.ip_address} did not finish the {phase} phase within the play budget; dropping it")
+        print(f"  ⚠️  Speaker at {sp.ip_address} is too slow — dropped from this play.", file=sys.stderr)
+    late_ids = {id(sp) for sp in late}
+    return [sp for sp in speakers if id(sp) not in late_ids]
+
+
+def _probe_speaker(ip):
+    """
+    Connect to the speaker at *ip* and confirm it answers.
+
+    ``get_speaker_info(refresh=True)`` forces a network round-trip to the
+    device and raises if the speaker is unreachable.
+
+    Args:
+        ip (str): Speaker IP address.
+
+    Returns:
+        soco.SoCo: The connected speaker.
+    """
+    sp = soco.SoCo(ip)
+    with _timed(sp, "speaker_info"):
+        sp.get_speaker_info(refresh=True)
+    return sp
+
+
+def discover_speakers(speaker_entries, max_workers, timeout):
+    """
+    Phase 0: probe every configured speaker concurrently.
+
+    All speakers are probed in parallel on a pool of at most *max_workers*
+    threads, so one offline speaker costs at most the SoCo request timeout
+    instead of delaying every speaker behind it.  Speakers that have not
+    answered when *timeout* expires are skipped exactly like unreachable ones.
+
+    The returned list preserves the configured order; ``main`` then ranks it
+    for the coordinator election (see :func:`rank_coordinators`).
+
+    Args:
+        speaker_entries (list[tuple[str, int]]): ``(ip, volume)`` pairs in
+            configured order.
+        max_workers (int): Maximum number of concurrent probes.
+        timeout (float): Overall discovery deadline in seconds.
+
+    Returns:
+        tuple[list, dict]: ``(reachable, spk_vol_map)`` — the reachable SoCo
+        speakers in configured order and a map of IP address -> configured
+        playback volume.
+    """
+    vol_by_ip = dict(speaker_entries)
+    ips = [ip for ip, _ in speaker_entries]
+    done, failed, timed_out = _run_concurrently(_probe_speaker, ips, max_workers, timeout)
+
+    reachable = []
+    spk_vol_map = {}
+    for ip, sp in done:
+        reachable.append(sp)
+        spk_vol_map[ip] = vol_by_ip[ip]
+        log(f"INFO: Connected to speaker at {ip} ({sp.player_name}) volume={vol_by_ip[ip]}")
+    for ip, e in failed:
+        log(f"WARNING: Speaker at {ip} is unreachable: {e}. Skipping.")
+        print(f"  ⚠️  Speaker at {ip} is unreachable — skipping.", file=sys.stderr)
+    for ip in timed_out:
+        log(f"WARNING: Speaker at {ip} did not answer within {timeout:g} s. Skipping.")
+        print(f"  ⚠️  Speaker at {ip} did not answer in time — skipping.", file=sys.stderr)
+    return reachable, spk_vol_map
+
+
+def _coordinator_profile(sp, topology, stats):
+    """
+    Return ``{"model", "wired", "latency"}`` for *sp* and refresh its cached profile.
+
+    The model number comes from the speaker info fetched by the Phase 0 probe
+    and the wired status from the topology's ``EthLink``; either falls back
+    to the value cached by an earlier play.  ``latency`` is the median of the
+    speaker's recorded probe (``_ELECTION_OP``) times in ms (``None`` with
+    too few samples).
+    """
+    ip = str(sp.ip_address)
+    cached = stats.profile(ip)
+    info = getattr(sp, "speaker_info", None)
+    model = info.get("model_number") if isinstance(info, dict) else None
+    if not isinstance(model, str):
+        model = cached.get("model")
+    wired = topology.wired(sp.uid)
+    if wired is None:
+        wired = cached.get("wired")
+    stats.update_profile(ip, model=model, wired=wired)
+    samples = stats.samples(ip, _ELECTION_OP)
+    latency = percentile(samples, 50) if len(samples) >= _ELECTION_MIN_SAMPLES else None
+    return {"model": model, "wired": wired, "latency": latency}
+
+
+def rank_coordinators(speakers, topology, stats):
+    """
+    Order *speakers* from best to worst bugle coordinator.
+
+    The coordinator fetches the stream and fans it out to every member, so a
+    current model on Ethernet that answers quickly beats an old speaker on
+    weak Wi-Fi.  Speakers are ranked by, in order: legacy hardware last,
+    known-wireless after wired or unknown, median probe response time in
+    ``_ELECTION_LATENCY_BUCKET_MS`` buckets (a speaker without enough history
+    counts as typical), then configured order — so with no information at
+    all the first configured speaker still coordinates.
+
+    Args:
+        speakers (list[soco.SoCo]): Reachable speakers in configured order.
+        topology (Topology): Household topology of this play.
+        stats (LatencyStats): Response-time history and cached profiles.
+
+    Returns:
+        tuple[list, list[dict]]: The ranked speakers and their profiles (see
+        :func:`_coordinator_profile`), in the same order.
+    """
+    profiles = [_coordinator_profile(sp, topology, stats) for sp in speakers]
+    typical = percentile([p["latency"] for p in profiles if p["latency"] is not None], 50) or 0
+
+    def key(index):
+        profile = profiles[index]
+        latency = typical if profile["latency"] is None else profile["latency"]
+        return (
+            profile["model"] in _LEGACY_MODELS,
+            profile["wired"] is False,
+            int(latency // _ELECTION_LATENCY_BUCKET_MS),
+            index,
+        )
+
+    order = sorted(range(len(speakers)), key=key)
+    return [speakers[i] for i in order], [profiles[i] for i in order]
+
+
+def _describe_profile(profile):
+    """Return e.g. ``"S16, wired, ~12 ms"`` for a coordinator election log line."""
+    parts = [profile["model"] or "unknown model"]
+    if profile["wired"] is not None:
+        parts.append("wired" if profile["wired"] else "wireless")
+    if profile["latency"] is not None:
+        parts.append(f"~{profile['latency']:.0f} ms")
+    return ", ".join(parts)
+
+
+def _transport_state(coordinator):
+    """Return the coordinator's current transport state string (one SOAP call)."""
+    return coordinator.get_current_transport_info()["current_transport_state"]
+
+
+def _wait_for_end_via_events(coordinator, max_secs, start):
+    """
+    Wait for playback to end using a UPnP AVTransport event subscription.
+
+    Args:
+        coordinator (soco.SoCo): The bugle coordinator.
+        max_secs (float): Upper bound on the wait, counted from *start*.
+        start (float): ``time.monotonic()`` value when playback began.
+
+    Returns:
+        str | None: The idle transport state that ended playback, or ``None``
+        if *max_secs* elapsed first.
+
+    Raises:
+        Exception: If the subscription cannot be set up; the caller falls back
+            to polling.
+    """
+    import queue
+
+    sub = coordinator.avTransport.subscribe(auto_renew=True)
+    try:
+        seen_active = False
+        while True:
+            elapsed = time.monotonic() - start
+            if elapsed >= max_secs:
+                return None
+            try:
+                event = sub.events.get(timeout=min(max_secs - elapsed, _END_POLL_SLOW_SECS))
+            except queue.Empty:
+                continue
+            state = event.variables.get("transport_state")
+            if state in _ACTIVE_TRANSPORT_STATES:
+                seen_active = True
+            elif state and (seen_active or time.monotonic() - start >= _START_GRACE_SECS):
+                return state
+    finally:
+        try:
+            sub.unsubscribe()
+        except Exception as e:
+            _log.debug("AVTransport unsubscribe failed: %s", e)
+
+
+def wait_for_playback_end(coordinator, expected_secs, max_secs, use_events=False):
+    """
+    Phase 4: block until the coordinator's transport says playback has ended.
+
+    The transport state — not the computed duration — decides when teardown
+    starts, so a VBR file whose duration was misread, the
+    ``default_wait_seconds`` fallback, or a buffering stall at the speaker no
+    longer cut the call off or leave speakers grouped long after it ended.
+    *max_secs* is only an upper bound for a speaker that never reports idle.
+
+    By default the transport is polled adaptively: every
+    ``_END_POLL_FAST_SECS`` until the transport is seen active and within
+    ``_END_POLL_SLOW_SECS`` of *expected_secs*, and every
+    ``_END_POLL_SLOW_SECS`` otherwise.
+    With *use_events*, a UPnP AVTransport event subscription is used instead,
+    falling back to polling if the subscription cannot be set up.
+
+    An idle state is only accepted once the transport has been seen active
+    (PLAYING / TRANSITIONING) or ``_START_GRACE_SECS`` have passed, since
+    ``play_uri`` can return before the transport has started.
+
+    Args:
+        coordinator (soco.SoCo): The bugle coordinator.
+        expected_secs (float): Expected playback length (duration + 1 s).
+        max_secs (float): Never wait longer than this.
+        use_events (bool): Try an AVTransport event subscription first.
+
+    Returns:
+        tuple[str | None, float]: ``(state, elapsed)`` — the idle transport
+        state that ended playback (``None`` if *max_secs* was reached) and
+        the seconds waited.
+    """
+    start = time.monotonic()
+    if use_events:
+        try:
+            state = _wait_for_end_via_events(coordinator, max_secs, start)
+            return state, time.monotonic() - start
+        except Exception as e:
+            log(f"WARNING: AVTransport event subscription failed ({e}); polling transport state instead")
+
+    seen_active = False
+    # Sum of the sleeps requested so far.  Elapsed time can never be less than
+    # this, and it keeps the wait bounded even if the clock misbehaves.
+    slept = 0.0
+    while True:
+        elapsed = max(time.monotonic() - start, slept)
+        if elapsed >= max_secs:
+            return None, elapsed
+        try:
+            state = _transport_state(coordinator)
+        except Exception as e:
+            log(f"WARNING: Could not read transport state on {coordinator.ip_address}: {e}")
+            state = None
+        if state in _ACTIVE_TRANSPORT_STATES:
+            seen_active = True
+        elif state and (seen_active or elapsed >= _START_GRACE_SECS):
+            return state, elapsed
+
+        to_expected_end = expected_secs - elapsed
+        if not seen_active or abs(to_expected_end) <= _END_POLL_SLOW_SECS:
+            interval = _END_POLL_FAST_SECS
+        elif to_expected_end > 0:
+            # Slow down mid-clip, but never sleep past the fast window's start.
+            interval = max(_END_POLL_FAST_SECS,
+                           min(_END_POLL_SLOW_SECS, to_expected_end - _END_POLL_SLOW_SECS))
+        else:
+            interval = _END_POLL_SLOW_SECS
+        interval = min(interval, max_secs - elapsed)
+        time.sleep(interval)
+        slept += interval
+
+
+def _lock_group_members(name, targets, topology):
+    """
+    Lock the speakers that share a pre-existing group with *targets*.
+
+    The play locks only cover the targets, but Phase 2 pauses their whole
+    groups and Phase 6 rejoins and restores them, so a play also acts on its
+    targets' group mates.  Those are locked as well (without waiting), so a
+    play targeting one of them waits until this one has restored it.  A group
+    mate another play already holds is returned as busy: this play leaves it
+    out of its regroup and restore, so it never pulls the speaker out of the
+    other play's bugle group.
+
+    Args:
+        name (str): Schedule name, for the queue status.
+        targets (list[soco.SoCo]): Reachable target speakers.
+        topology (sonos_topology.Topology): Topology read at the start of Phase 1.
+
+    Returns:
+        tuple[admission.PlayLock | None, set[str]]: The extra locks (release
+        them with :func:`release_play_lock`) and the UIDs of busy group mates.
+    """
+    target_uids = {sp.uid for sp in targets}
+    uids_by_ip = {}
+    for sp in targets:
+        for uid in topology.members(sp.uid):
+            ip = topology.ip(uid)
+            if uid not in target_uids and ip:
+                uids_by_ip[ip] = uid
+    if not uids_by_ip:
+        return None, set()
+    lock, busy_ips = _admission.try_acquire(f"{name} (group members)", list(uids_by_ip))
+    busy = {uids_by_ip[ip] for ip in busy_ips}
+    for uid in busy:
+        log(f"WARNING: {topology.name(uid)} is in use by another play; not regrouping or restoring it")
+    return lock, busy
+
+
+def _snapshot_group(coord_uid, targets, topology, snapshot_idle, busy=frozenset()):
+    """
+    Phase 1 worker: record the volumes of *targets* and snapshot their group.
+
+    One worker runs per pre-existing group coordinator, so groups are
+    snapshotted concurrently.  Only the *coordinator* is snapshotted —
+    restoring the coordinator restores the whole group.  Group membership
+    comes from *topology*, so no per-speaker group query is made.  Errors
+    are isolated: a failed volume read only loses that speaker's volume, and
+    a failed snapshot only loses this group's restore record.
+
+    Snapshots are tiered: the full media/queue/position ``Snapshot`` (several
+    SOAP calls) is only taken for groups Phase 6 will actually restore — a
+    playing group, or any group when *snapshot_idle* is set.  An idle group
+    otherwise records just its membership (targets' volumes are always
+    recorded) and gets ``snapshot=None``.
+
+    Args:
+        coord_uid (str | None): UID of the group coordinator, or ``None`` for
+            targets missing from the topology (volumes only).
+        targets (list[soco.SoCo]): Reachable target speakers in this group.
+        topology (sonos_topology.Topology): Topology read at the start of Phase 1.
+        snapshot_idle (bool): Take the full snapshot of idle groups too
+            (``skip_restore_if_idle`` is false).
+        busy (set[str]): Group mates another play holds (see
+            :func:`_lock_group_members`).  They are left out of the group
+            record; a group coordinated by one is not snapshotted at all.
+
+    Returns:
+        tuple[dict[str, int], dict | None]: ``(volumes, group_info)`` where
+        *volumes* maps target UID to its current volume and *group_info* is
+        the pre-existing group record (see ``pre_existing_groups`` in
+        :func:`main`), or ``None`` if no snapshot was taken.
+    """
+    volumes = {}
+    for sp in targets:
+        try:
+            with _timed(sp, "volume"):
+                volumes[sp.uid] = sp.volume
+        except Exception as e:
+            log(f"WARNING: Could not read volume of {sp.ip_address}: {e}")
+    if coord_uid is None:
+        for sp in targets:
+            log(f"WARNING: Could not snapshot speaker {sp.ip_address}: speaker not found in zone group topology")
+        return volumes, None
+    if coord_uid in busy:
+        log(f"INFO: Not snapshotting group of {topology.name(coord_uid)}: another play is using it")
+        return volumes, None
+    try:
+        group_coord = topology.speaker(coord_uid)
+        state = group_coord.get_current_transport_info()["current_transport_state"]
+        was_playing = state == "PLAYING"
+        if was_playing or snapshot_idle:
+            snap = Snapshot(group_coord)
+            with _timed(group_coord, "snapshot"):
+                snap.snapshot()
+        else:
+            snap = None
+        member_uids = set(topology.members(coord_uid)) - set(busy)
+        # Exclude the coordinator itself; only non-coordinator members need to rejoin.
+        member_speakers = [topology.speaker(m) for m in topology.members(coord_uid)
+                           if m != coord_uid and m not in busy]
+        if snap is not None:
+            log(f"INFO: Snapshot taken on {group_coord.player_name} (was_playing={was_playing})")
+        else:
+            log(f"INFO: {group_coord.player_name} is idle; recorded group membership only")
+        return volumes, {
+            "snapshot": snap,                       # None for an idle group that will not be restored
+            "was_playing": was_playing,
+            "member_uids": member_uids,             # keep for any existing references
+            "member_speakers": member_speakers,     # full SoCo objects of non-coordinator members
+            "coordinator_speaker": group_coord,
+        }
+    except Exception as e:
+        log(f"WARNING: Could not snapshot group of {topology.name(coord_uid)}: {e}")
+        return volumes, None
+
+
+def _join_bugle_group(sp, coordinator, volume, join):
+    """Phase 3 worker: join *sp* to the bugle *coordinator* if *join*, then set its bugle *volume*."""
+    if join:
+        with _timed(sp, "join"):
+            sp.join(coordinator)
+    with _timed(sp, "volume"):
+        sp.volume = volume
+
+
+def _record_ops(grouping, done, failed, late, coordinator_uid=None):
+    """
+    Update *grouping* with the outcome of concurrent join/unjoin operations.
+
+    Speakers in *done* moved as planned (to *coordinator_uid*, or standalone
+    when it is ``None``); the state of *failed* and *late* speakers is
+    unknown, so the next plan treats them as needing an explicit operation.
+    """
+    for sp, _ in done:
+        if coordinator_uid is None:
+            apply_unjoin(grouping, sp.uid)
+        else:
+            apply_join(grouping, sp.uid, coordinator_uid)
+    for sp in [sp for sp, _ in failed] + list(late):
+        grouping[sp.uid] = None
+
+
+def _settle(speaker, expected, timeout, what):
+    """
+    Wait until the topology read from *speaker* reflects a join/unjoin step.
+
+    Replaces a fixed ``time.sleep(1)`` after each topology change: returns
+    as soon as every speaker in *expected* reports its expected coordinator
+    (see :func:`sonos_topology.wait_for_topology`), and logs how long that
+    took.  Gives up after *timeout* seconds with a warning; if the topology
+    cannot be read it falls back to a ``_FALLBACK_SETTLE_SECS`` pause.
+
+    Args:
+        speaker (soco.SoCo): Speaker to read the topology from.
+        expected (dict[str, str]): Speaker UID -> expected coordinator UID.
+        timeout (float): Cap on the wait in seconds.
+        what (str): Step name for the log, e.g. ``"unjoin"``.
+
+    Returns:
+        float: Seconds spent settling (0 when *expected* is empty).
+    """
+    if not expected:
+        return 0.0
+    confirmed, elapsed = wait_for_topology(speaker, expected, timeout, _SETTLE_POLL_SECS)
+    if confirmed is None:
+        time.sleep(_FALLBACK_SETTLE_SECS)
+        elapsed += _FALLBACK_SETTLE_SECS
+        log(f"INFO: Topology unreadable after {what}; settled for a fixed {_FALLBACK_SETTLE_SECS} s")
+    elif confirmed:
+        log(f"INFO: Topology confirmed after {what} in {elapsed:.2f} s")
+    else:
+        log(f"WARNING: Topology did not confirm {what} within {elapsed:.1f} s; continuing")
+    return elapsed
+
+
+def _restore_group(coord_uid, info, unjoin, member_uids, topology, settle_timeout, restore_transport,
+                   regrouped=None, after=()):
+    """
+    Phase 6 worker: put one pre-existing group back together, then restore it.
+
+    One worker runs per group, so independent groups are restored
+    concurrently; within a group the steps stay ordered — the coordinator
+    leaves the bugle group first (if planned), then its members rejoin it,
+    the topology settles, and only then is the snapshot restored.  If the
+    coordinator cannot leave the bugle group its members are not joined to
+    it and its snapshot is not restored, since either would act on the
+    whole bugle group.
+
+    The bugle coordinator's own group stays where it is, so it is only
+    restored once every other group has left the bugle group: its worker
+    waits for the *after* events, which the other workers set as their
+    regroup settles.
+
+    Args:
+        coord_uid (str): UID of the group's original coordinator.
+        info (dict | None): The pre-existing group record (``None`` for a
+            bugle speaker that was standalone and only needs to leave).
+        unjoin (bool): Whether the plan unjoins the coordinator first.
+        member_uids (list[str]): Members the plan joins to the coordinator.
+        topology (sonos_topology.Topology): Topology read in Phase 1.
+        settle_timeout (float): Cap on the settle wait in seconds.
+        restore_transport (bool): Restore the snapshot of an idle group too
+            (``skip_restore_if_idle`` is false).
+        regrouped (threading.Event | None): Set once this group has left the
+            bugle group and settled (or failed to).
+        after (list[threading.Event]): Wait for these before restoring.
+
+    Returns:
+        float: Seconds this group took from the start of Phase 6.
+    """
+    start = time.monotonic()
+    name = topology.name(coord_uid)
+    expected = {}
+    still_in_bugle_group = False
+    try:
+        if unjoin:
+            try:
+                coord = topology.speaker(coord_uid)
+                with _timed(coord, "unjoin"):
+                    coord.unjoin()
+                expected[coord_uid] = coord_uid
+                log(f"INFO: Unjoined {name} from bugle group")
+            except Exception as e:
+                log(f"WARNING: Could not unjoin {name} from bugle group: {e}")
+                if member_uids:
+                    log(f"WARNING: Not rejoining {len(member_uids)} member(s) to {name}")
+                member_uids = []
+                still_in_bugle_group = True
+        for uid in member_uids:
+            try:
+                member = topology.speaker(uid)
+                with _timed(member, "join"):
+                    member.join(topology.speaker(coord_uid))
+                expected[uid] = coord_uid
+            except Exception as e:
+                log(f"WARNING: Could not rejoin {topology.name(uid)} to original group: {e}")
+        if expected:
+            _settle(topology.speaker(coord_uid), expected, settle_timeout, f"rejoin of {name}")
+    finally:
+        if regrouped is not None:
+            regrouped.set()
+    for event in after:
+        event.wait()
+
+    if still_in_bugle_group:
+        if info is not None:
+            log(f"WARNING: Not restoring {name}: it is still in the bugle group")
+    elif info is not None:
+        try:
+            group_coord = info["coordinator_speaker"]
+            if info["was_playing"] or restore_transport:
+                with _timed(group_coord, "restore"):
+                    info["snapshot"].restore()
+                log(
+                    f"INFO: Restored {group_coord.player_name} "
+                    f"(was_playing={info['was_playing']})"
+                )
+            else:
+                log(
+                    f"INFO: Skipping restore for {group_coord.player_name} "
+                    f"(was idle and skip_restore_if_idle=True)"
+                )
+        except Exception as e:
+            log(f"ERROR: Failed to restore group for coordinator uid={coord_uid}: {e}")
+    return time.monotonic() - start
+
+
+def _restore_volume(sp, volume):
+    """Phase 7 worker: set *sp* back to its pre-bugle *volume*."""
+    with _timed(sp, "volume"):
+        sp.volume = volume
+    log(f"INFO: Restored volume on {sp.player_name}")
+
+
+def _coalesced_followers(config, schedule_name):
+    """
+    Return the schedules coalesced into *schedule_name*'s play today.
+
+    Schedules firing within ``coalesce_window_seconds`` of *schedule_name*
+    (when it is the earliest of them) are played in its session instead of
+    colliding with it on the play lock; see ``coalesce.py``.  Only schedules
+    targeting the same speakers are coalesced: one on other speakers plays
+    on its own, concurrently if the sets are disjoint.
+
+    Args:
+        config (dict): Parsed configuration from config.json.
+        schedule_name (str | None): Schedule this play was started for.
+
+    Returns:
+        list[tuple[str, list[tuple[str, int]]]]: ``(name, clips)`` of each
+        follower in fire-time order (empty if *schedule_name* leads no group).
+    """
+    window = get_coalesce_window_seconds(config)
+    # Names are compared (and recorded in coalesce.py) in their unit form.
+    schedule_name = schedule_key(schedule_name)
+    if not schedule_name or not window:
+        return []
+    plan = fire_plan.current(config)
+    try:
+        speakers = set(fire_plan.schedule_speaker_ips(config, schedule_name, plan))
+    except ValueError:
+        return []
+    fire_times = []
+    clips_by_name = {}
+    for entry in config.get("schedules") or []:
+        name = schedule_key(entry.get("name")) if isinstance(entry, dict) else None
+        if not name:
+            continue
+        try:
+            if set(fire_plan.schedule_speaker_ips(config, name, plan)) != speakers:
+                continue
+            hour, minute = fire_plan.fire_time(config, entry.get("time"), plan)
+            clips_by_name[name] = schedule_resolve.resolve_clips(entry)
+        except ValueError:
+            continue
+        fire_times.append((name, hour * 3600 + minute * 60))
+    for group in group_fire_times(fire_times, window):
+        if group[0] == schedule_name:
+            return [(name, clips_by_name[name]) for name in group[1:]]
+    return []
+
+
+def _parse_gaps(text, clip_count):
+    """
+    Return the silence in seconds before each of *clip_count* clips.
+
+    Args:
+        text (str | None): ``--gaps`` value: comma-separated seconds, one per
+            gap between clips or a single value for every gap.
+        clip_count (int): Number of clips in the sequence.
+
+    Returns:
+        list[float]: One gap per clip; the first is always ``0``.
+
+    Raises:
+        ValueError: If a value is not a number in 0–``MAX_SEQUENCE_GAP_SECONDS``
+            or the number of values does not match the clips.
+    """
+    if not text:
+        return [0] * clip_count
+    values = [float(v) for v in text.split(",")]
+    if any(not (0 <= v <= MAX_SEQUENCE_GAP_SECONDS) for v in values):
+        raise ValueError(f"gaps must be 0–{MAX_SEQUENCE_GAP_SECONDS} seconds")
+    if len(values) == 1:
+        values = values * (clip_count - 1)
+    if len(values) != clip_count - 1:
+        raise ValueError(f"expected {clip_count - 1} gap(s) for {clip_count} clips, got {len(values)}")
+    return [0] + [int(v) if v.is_integer() else v for v in values]
+
+
+def _start_clip(coordinator, audio_url, duration_future, default_wait, play_at_deadline=None):
+    """
+    Phase 4: start one clip on the bugle group.
+
+    ``play_uri`` goes out first: the duration lookup started before Phase 0
+    and is normally done by now, but it only shapes the end-of-playback
+    wait, so it is collected afterwards and never holds up the clip.  If it
+    is still running it gets at most ``_AUDIO_FETCH_TIMEOUT_SECS`` more
+    before *default_wait* is assumed; playback end is detected from the
+    transport state either way.
+
+    Args:
+        coordinator (soco.SoCo): Bugle group coordinator.
+        audio_url (str): URL of the MP3 to play.
+        duration_future (Future): Background duration lookup for *audio_url*.
+        default_wait (int): Duration assumed when the lookup has not finished.
+        play_at_deadline (float | None): Monotonic time to hold ``play_uri``
+            until (``--play-at`` pre-roll).
+
+    Returns:
+        float: Expected playback time in seconds (duration + 1 s).
+    """
+    if play_at_deadline is not None:
+        lead = play_at_deadline - time.monotonic()
+        if lead > 0:
+            log(f"INFO: Ready {lead:.2f} s before the fire time; holding play_uri until then")
+            time.sleep(lead)
+        else:
+            log(f"WARNING: Pre-roll finished {-lead:.2f} s after the fire time; playing now")
+
+    _timed_call(coordinator, "play_uri", audio_url)
+    log(f"SUCCESS: Playing {audio_url} on {coordinator.player_name} (and group members)")
+
+    lookup_wait = time.monotonic()
+    try:
+        duration = duration_future.result(timeout=_AUDIO_FETCH_TIMEOUT_SECS)
+    except Exception as e:
+        log(f"WARNING: Audio duration lookup not finished ({e!r}); assuming {default_wait} s")
+        duration = default_wait
+    lookup_wait = time.monotonic() - lookup_wait
+    if lookup_wait >= 0.1:
+        log(f"INFO: Waited {lookup_wait:.1f} s for the audio duration lookup after play_uri")
+    return duration + 1
+
+
+def main(argv=None):
     """
     Entry point: play the requested audio on all configured Sonos speakers in sync.
 
+    A ``--schedule`` / ``--sleep-until-schedule`` play targets only the
+    schedule's own ``speakers`` when it lists some (see
+    :func:`config.schedule_speakers`).
+
+    *argv* defaults to ``sys.argv[1:]``; the resident daemon (``flagd.py``)
+    passes the arguments of each play request instead.
+
     Phases:
-      0. Discovery — connect to each configured speaker IP; skip unreachable ones.
-      1. Snapshot  — capture pre-existing group state and volumes (one snapshot
-                     per pre-existing group coordinator, not per speaker).
-      2. Tear down — pause and unjoin all target speakers from their groups.
-      3. Bugle group — join all reachable speakers under one temporary coordinator.
-      4. Play      — play_uri on the coordinator; sleep for duration + 1 s.
-      5. Tear down — stop the coordinator; unjoin all bugle group members.
-      6. Restore   — rejoin original groups; call snapshot.restore() where needed.
-      7. Volumes   — restore each speaker's pre-bugle volume.
+      0. Discovery — probe every configured speaker IP concurrently (bounded
+                     pool, overall deadline); skip unreachable ones.
+      1. Snapshot  — read the zone group topology once, elect the bugle
+                     coordinator, then capture pre-existing group state and
+                     volumes (one snapshot per pre-existing group
+                     coordinator, not per speaker).
+      2. Tear down — pause playing groups; unjoin the bugle coordinator if it
+                     is not already coordinating a targets-only group.
+      3. Bugle group — join every reachable speaker not already grouped under
+                     the temporary coordinator.
+      4. Play      — play_uri on the coordinator; wait until its transport
+                     reports playback ended (duration + 1 s is only the
+                     expected length; duration + overrun is the upper bound).
+                     Several audio URLs (a schedule ``sequence``) play one
+                     after another here, separated by ``--gaps``, so the
+                     whole sequence costs one grouping and one restore.
+      5. Tear down — stop the coordinator; plan the regrouping.
+      6. Restore   — per pre-existing group, concurrently: unjoin its
+                     coordinator from the bugle group if needed, rejoin
+                     members that are not already with it, settle, then call
+                     snapshot.restore() where needed.
+      7. Volumes   — restore each speaker's pre-bugle volume, concurrently.
+
+    Phases 2, 3, 5 and 6 diff the current grouping against the desired one
+    (:func:`sonos_topology.plan_regroup`), so a speaker already in place costs
+    no join/unjoin call.
+
+    After each join/unjoin step (Phases 2, 3 and 6) the topology is re-read
+    until it shows the new grouping (capped by ``settle_timeout_seconds``)
+    rather than sleeping a fixed second.
+
+    The audio durations are looked up on background threads started before
+    Phase 0, so they overlap Phases 0–3 rather than delaying ``play_uri``.
+
+    With ``--play-at HH:MM`` (fixed-time units started ``preroll_seconds``
+    early) Phases 0–3 and the duration lookup run ahead of the fire time and
+    Phase 4 waits for ``HH:MM:00`` on a monotonic deadline before ``play_uri``.
+
+    Every speaker operation (probe, snapshot, pause, join, unjoin, volume,
+    play_uri, stop, restore) is timed per speaker and saved to the rolling
+    latency statistics (``latency_stats.py``) at the end of the play.
 
     A try/finally ensures that Phases 5–7 always execute, even when Phase 4 raises.
     """
     parser = argparse.ArgumentParser(description="Play an audio URL on Sonos speakers.")
-    parser.add_argument("audio_url", help="URL of the MP3 file to play")
+    parser.add_argument(
+        "audio_urls",
+        nargs="+",
+        metavar="audio_url",
+        help="URL of the MP3 file to play; several URLs play back to back in one grouping session",
+    )
+    parser.add_argument(
+        "--gaps",
+        metavar="SECONDS[,SECONDS…]",
+        help="Silence before each clip after the first (one value per gap, or one value for all).",
+    )
     parser.add_argument(
         "--ignore-guard",
         action="store_true",
         help="Skip the time-of-day play guard (for manual tests via setup.sh).",
     )
+    parser.add_argument(
+        "--play-at",
+        metavar="HH:MM",
+        help=(
+            "Fire time of a unit started early (preroll_seconds): prepare the "
+            "speakers now, then call play_uri at HH:MM:00."
+        ),
+    )
+    parser.add_argument(
+        "--schedule",
+        metavar="SCHEDULE_NAME",
+        help=(
+            "Schedule this play was started for; later schedules coalesced into it "
+            "(coalesce_window_seconds) are played in the same session."
+        ),
+    )
     parser.add_argument(
         "--sleep-until-schedule",
         metavar="SCHEDULE_NAME",
@@ -402,7 +1791,7 @@ def main():
             "service units to avoid daemon-reload races."
         ),
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     config = load_config()
 
@@ -417,6 +1806,22 @@ def main():
         # proceed with playback without the guard.
         args.ignore_guard = True
 
+    # The play budget (if configured) counts from here: the fire time for
+    # timer-started units, or the wake-up time for the sunset sleep-wrapper.
+    play_started = time.monotonic()
+
+    # Pre-roll: the unit started ahead of its fire time, so Phases 0–3 run
+    # now and Phase 4 holds play_uri until this deadline.  The play budget
+    # then counts from the fire time rather than the start of the pre-roll.
+    play_at_deadline = None
+    if args.play_at:
+        try:
+            play_at_deadline = _play_at_deadline(config, args.play_at)
+        except ValueError as e:
+            log(f"WARNING: Ignoring invalid --play-at {args.play_at!r}: {e}")
+    if play_at_deadline is not None:
+        play_started = play_at_deadline
+
     # ------------------------------------------------------------------
     # Play guard: refuse to play if now is not near any scheduled fire time.
     # This is the primary defense against spurious systemd misfires.
@@ -427,12 +1832,21 @@ def main():
             _log.error(
                 "play_guard refused to play %s at %s — no scheduled fire time "
                 "within ±%d min.  This is likely a systemd misfire; aborting.",
-                args.audio_url,
+                " ".join(args.audio_urls),
                 datetime.now().strftime("%H:%M:%S"),
                 tolerance,
             )
             sys.exit(1)
 
+    # A schedule coalesced into an earlier one today was played in that
+    # session (flagd.py normally catches this before taking the play lock).
+    # Otherwise it is marked started, so a leader no longer claims it.
+    schedule_name = args.sleep_until_schedule or args.schedule
+    leader = start_own_play(schedule_name) if schedule_name else None
+    if leader is not None:
+        log(f"INFO: '{schedule_name}' was played in the session of '{leader}'; skipping.")
+        sys.exit(0)
+
     # --- Validate speakers list ---
     speakers_cfg = config.get("speakers")
     if not isinstance(speakers_cfg, list) or not speakers_cfg:
@@ -455,10 +1869,17 @@ def main():
         print(f"  ⚠️  Volume {default_vol} is outside valid range 0–100; clamping to {clamped}.", file=sys.stderr)
         default_vol = clamped
 
+    # --- The schedule's own speakers (all of them unless it lists some) ---
+    try:
+        targets_cfg = schedule_speakers(config, schedule_name)
+    except ValueError as e:
+        log(f"ERROR: Schedule '{schedule_name}': {e}. Aborting.")
+        sys.exit(f"❌ Schedule '{schedule_name}': {e}")
+
     # --- Build per-speaker (ip, configured_volume) list ---
     # Supports both legacy string format and new object format.
     speaker_entries = []
-    for spk in speakers_cfg:
+    for spk in targets_cfg:
         if isinstance(spk, dict):
             ip = spk.get("ip", "")
             raw_vol = spk.get("volume", default_vol)
@@ -489,217 +1910,401 @@ def main():
         log(f"WARNING: 'default_wait_seconds' {config.get('default_wait_seconds')!r} is not a valid integer; using 60.")
         default_wait = 60
 
-    # --- Validate audio_url argument ---
-    audio_url = args.audio_url
-    if not audio_url.startswith("http://") and not audio_url.startswith("https://"):
-        log(f"ERROR: audio_url '{audio_url}' is not a valid HTTP URL. Aborting.")
-        sys.exit(f"❌ audio_url must start with http:// or https://. Got: {audio_url!r}")
-
-    # =========================================================================
-    # Phase 0: Discovery & validation
-    # =========================================================================
-    # spk_vol_map: speaker IP address -> configured playback volume
-    spk_vol_map = {}
-    reachable = []
-    for ip, vol in speaker_entries:
-        try:
-            sp = soco.SoCo(ip)
-            sp.get_speaker_info(refresh=True)  # forces a network round-trip to the device; raises if the speaker is unreachable
-            reachable.append(sp)
-            spk_vol_map[ip] = vol
-            log(f"INFO: Connected to speaker at {ip} ({sp.player_name}) volume={vol}")
-        except Exception as e:
-            log(f"WARNING: Speaker at {ip} is unreachable: {e}. Skipping.")
-            print(f"  ⚠️  Speaker at {ip} is unreachable — skipping.", file=sys.stderr)
-
-    if not reachable:
-        log("ERROR: All configured speakers are unreachable. Aborting.")
-        print("  ❌ All configured speakers are unreachable.", file=sys.stderr)
-        sys.exit(1)
+    discovery_workers = read_number_setting(
+        config, "discovery_max_workers", _DEFAULT_DISCOVERY_WORKERS, 1, 64, cast=int
+    )
+    discovery_timeout = read_number_setting(
+        config, "discovery_timeout_seconds", _DEFAULT_DISCOVERY_TIMEOUT_SECS, 1, 120
+    )
+    play_deadline = read_number_setting(config, "play_deadline_seconds", None, 1, 120)
+    playback_overrun = read_number_setting(
+        config, "playback_overrun_seconds", _DEFAULT_PLAYBACK_OVERRUN_SECS, 0, 600, cast=int
+    )
+    use_transport_events = config.get("playback_end_detection", "poll") == "events"
+    coordinator_election = config.get("coordinator_election", "auto")
+    if coordinator_election not in ("auto", "first"):
+        log(f"WARNING: 'coordinator_election' {coordinator_election!r} is not 'auto' or 'first'; using 'auto'.")
+        coordinator_election = "auto"
+    settle_timeout = read_number_setting(
+        config, "settle_timeout_seconds", _DEFAULT_SETTLE_TIMEOUT_SECS, 0.5, 30
+    )
+    budget = PlayBudget(play_deadline, start=play_started) if play_deadline else None
 
-    bugle_coordinator = reachable[0]
-    log(f"INFO: {len(reachable)} speaker(s) reachable. Bugle coordinator: {bugle_coordinator.player_name}")
-    print(f"  ⏳ Connected to {len(reachable)} speaker(s). Coordinator: {bugle_coordinator.player_name}")
+    # --- Validate audio_url arguments ---
+    for audio_url in args.audio_urls:
+        if not audio_url.startswith("http://") and not audio_url.startswith("https://"):
+            log(f"ERROR: audio_url '{audio_url}' is not a valid HTTP URL. Aborting.")
+            sys.exit(f"❌ audio_url must start with http:// or https://. Got: {audio_url!r}")
+    try:
+        gaps = _parse_gaps(args.gaps, len(args.audio_urls))
+    except ValueError as e:
+        log(f"ERROR: Invalid --gaps {args.gaps!r}: {e}. Aborting.")
+        sys.exit(f"❌ Invalid --gaps {args.gaps!r}: {e}")
+
+    # Coalescing: schedules firing right after this one play in this session,
+    # back to back after its own clips, instead of being dropped on the lock.
+    # They are only claimed right before the first play_uri (Phase 4), so a
+    # play that aborts before then leaves them to play on their own.
+    audio_urls = list(args.audio_urls)
+    clip_owners = [None] * len(audio_urls)
+    followers = _coalesced_followers(config, schedule_name)
+    for name, follower_clips in followers:
+        log(f"INFO: Coalescing '{name}' into this play ({len(follower_clips)} clip(s))")
+        audio_urls.extend(url for url, _ in follower_clips)
+        gaps.extend([0] + [gap for _, gap in follower_clips[1:]])
+        clip_owners.extend([name] * len(follower_clips))
+
+    # The play is going ahead: import soco and mutagen before any worker
+    # thread needs them (a no-op in the daemon, which loaded them at start).
+    load_playback_stack()
+
+    # Resolve the durations while the speakers are being discovered and grouped.
+    clips = [
+        (audio_url, gap, start_duration_lookup(audio_url, default_wait, audio_port=get_port(config)))
+        for audio_url, gap in zip(audio_urls, gaps)
+    ]
 
     # =========================================================================
-    # Phase 1: Snapshot (per pre-existing group, not per speaker)
+    # Phase 0: Discovery & validation
     # =========================================================================
-    # pre_existing_groups: coordinator_uid -> {snapshot, was_playing, member_uids, member_speakers, coordinator_speaker}
-    pre_existing_groups = {}
-    pre_bugle_volumes = {}  # speaker uid -> volume before we change it
-
-    for sp in reachable:
-        try:
-            pre_bugle_volumes[sp.uid] = sp.volume
-            group_coord = sp.group.coordinator
-            uid = group_coord.uid
-            # Snapshot the *coordinator only* of each pre-existing group — restoring the coordinator restores the whole group.
-            if uid not in pre_existing_groups:
-                state = group_coord.get_current_transport_info()["current_transport_state"]
-                was_playing = state == "PLAYING"
-                snap = Snapshot(group_coord)
-                snap.snapshot()
-                member_uids = {m.uid for m in sp.group.members}
-                # Exclude the coordinator itself; only non-coordinator members need to rejoin.
-                member_speakers = [m for m in sp.group.members if m.uid != group_coord.uid]
-                pre_existing_groups[uid] = {
-                    "snapshot": snap,
-                    "was_playing": was_playing,
-                    "member_uids": member_uids,             # keep for any existing references
-                    "member_speakers": member_speakers,     # full SoCo objects of non-coordinator members
-                    "coordinator_speaker": group_coord,
-                }
-                log(f"INFO: Snapshot taken on {group_coord.player_name} (was_playing={was_playing})")
-        except Exception as e:
-            log(f"WARNING: Could not snapshot speaker {sp.player_name}: {e}")
-
-    log(f"INFO: Snapshot summary — {len(pre_existing_groups)} pre-existing group(s)")
-
+    # Every speaker operation from here on is timed per speaker into the
+    # rolling latency statistics (see latency_stats.py).
+    latency = _begin_latency_stats()
+    member_lock = None
     try:
-        # =====================================================================
-        # Phase 2: Tear down pre-existing groups
-        # =====================================================================
-        for uid, info in pre_existing_groups.items():
-            if info["was_playing"]:
-                try:
-                    info["coordinator_speaker"].pause()
-                    log(f"INFO: Paused {info['coordinator_speaker'].player_name}")
-                except Exception as e:
-                    log(f"WARNING: Could not pause {info['coordinator_speaker'].player_name}: {e}")
+        # spk_vol_map: speaker IP address -> configured playback volume
+        reachable, spk_vol_map = discover_speakers(
+            speaker_entries, discovery_workers, _phase_timeout(budget, "discovery", discovery_timeout)
+        )
 
-        for sp in reachable:
-            try:
-                if len(sp.group.members) > 1:
-                    sp.unjoin()
-                    log(f"INFO: Unjoined {sp.player_name} from pre-existing group")
-            except Exception as e:
-                log(f"WARNING: Could not unjoin {sp.player_name}: {e}")
+        if not reachable:
+            log("ERROR: All configured speakers are unreachable. Aborting.")
+            print("  ❌ All configured speakers are unreachable.", file=sys.stderr)
+            sys.exit(1)
 
-        time.sleep(1)
+        log(f"INFO: {len(reachable)} speaker(s) reachable.")
 
         # =====================================================================
-        # Phase 3: Form temporary bugle group
+        # Phase 1: Snapshot (per pre-existing group, not per speaker)
         # =====================================================================
-        bugle_coordinator.volume = spk_vol_map.get(bugle_coordinator.ip_address, default_vol)
-        for sp in reachable[1:]:
-            try:
-                sp.join(bugle_coordinator)
-                sp.volume = spk_vol_map.get(sp.ip_address, default_vol)
-                log(f"INFO: {sp.player_name} joined bugle group")
-            except Exception as e:
-                log(f"WARNING: Could not add {sp.player_name} to bugle group: {e}")
+        # pre_existing_groups: coordinator_uid -> {snapshot, was_playing, member_uids, member_speakers, coordinator_speaker}
+        pre_existing_groups = {}
+        pre_bugle_volumes = {}  # speaker uid -> volume before we change it
+
+        # Read the zone group topology once; snapshot, teardown and restore all
+        # work from this map instead of querying each speaker's group.
+        topology = load_topology(reachable)
+        member_lock, busy = _lock_group_members(schedule_name or "play", reachable, topology)
+
+        # Elect the bugle coordinator.  ``reachable`` is kept in ranked order, so
+        # if the elected speaker is dropped as a laggard the next best one takes
+        # over in Phase 3.
+        if coordinator_election == "auto":
+            first_configured = reachable[0]
+            reachable, profiles = rank_coordinators(reachable, topology, latency)
+            if reachable[0] is not first_configured:
+                log(
+                    f"INFO: Elected {reachable[0].player_name} ({_describe_profile(profiles[0])}) as bugle "
+                    f"coordinator over first configured {first_configured.player_name} "
+                    f"({_describe_profile(profiles[reachable.index(first_configured)])})"
+                )
+        bugle_coordinator = reachable[0]
+        log(f"INFO: Bugle coordinator: {bugle_coordinator.player_name}")
+        print(f"  ⏳ Connected to {len(reachable)} speaker(s). Coordinator: {bugle_coordinator.player_name}")
+
+        # One snapshot worker per pre-existing group coordinator (bounded by the
+        # fan-out limit), so a site with many groups snapshots them side by side.
+        targets_by_coord = {}
+        for sp in reachable:
+            targets_by_coord.setdefault(topology.coordinator(sp.uid), []).append(sp)
+        done, failed, late = _run_concurrently(
+            lambda coord_uid: _snapshot_group(
+                coord_uid, targets_by_coord[coord_uid], topology, not skip_restore_if_idle, busy,
+            ),
+            list(targets_by_coord), discovery_workers, _phase_timeout(budget, "snapshot"),
+        )
+        for coord_uid, (volumes, group_info) in done:
+            pre_bugle_volumes.update(volumes)
+            if group_info is not None:
+                pre_existing_groups[coord_uid] = group_info
+        for coord_uid, e in failed:
+            log(f"WARNING: Could not snapshot group of {topology.name(coord_uid)}: {e}")
+        # A group whose snapshot is still running cannot be restored reliably;
+        # its targets sit this play out.
+        reachable = _drop_laggards(
+            reachable, [sp for coord_uid in late for sp in targets_by_coord[coord_uid]], "snapshot"
+        )
 
-        time.sleep(1)
+        # grouping: speaker uid -> coordinator uid (None = unknown), kept in step
+        # with every join/unjoin so Phases 2, 3, 5 and 6 only issue the operations
+        # that actually change something.
+        grouping = topology.coordinators()
 
-        # =====================================================================
-        # Phase 4: Play
-        # =====================================================================
-        # Fetch duration *before* play_uri so we don't touch the bugle group
-        # if the URL is unreachable, and avoid a redundant HTTP round-trip.
-        print("  ⏳ Fetching audio duration...")
-        duration = get_mp3_duration(audio_url, default_wait)
-        wait_secs = duration + 1
+        log(f"INFO: Snapshot summary — {len(pre_existing_groups)} pre-existing group(s)")
+        if not reachable:
+            log("ERROR: No speaker finished the snapshot phase in time. Aborting.")
+            print("  ❌ No speaker responded in time.", file=sys.stderr)
+            sys.exit(1)
 
-        bugle_coordinator.play_uri(audio_url)
-        log(f"SUCCESS: Playing {audio_url} on {bugle_coordinator.player_name} (and group members)")
+        # Members of the bugle group besides its coordinator (set in Phase 3).
+        # Phase 5 makes any of them without a recorded original group standalone.
+        bugle_members = []
 
-        log(f"INFO: Waiting {wait_secs} seconds for playback to finish")
-        print(f"  ▶️  Playing — waiting ~{wait_secs} seconds for playback to finish...")
-        time.sleep(wait_secs)
+        try:
+            # =================================================================
+            # Phase 2: Tear down pre-existing groups
+            # =================================================================
+            teardown_timeout = _phase_timeout(budget, "teardown")
+            teardown_ends = None if teardown_timeout is None else time.monotonic() + teardown_timeout
+
+            playing_coords = [
+                info["coordinator_speaker"] for info in pre_existing_groups.values() if info["was_playing"]
+            ]
+            done, failed, late = _run_concurrently(
+                lambda coord: _timed_call(coord, "pause"), playing_coords, discovery_workers, teardown_timeout,
+            )
+            for coord, _ in done:
+                log(f"INFO: Paused {coord.player_name}")
+            for coord, e in failed:
+                log(f"WARNING: Could not pause {coord.player_name}: {e}")
+            for coord in late:
+                log(f"WARNING: Pause of {coord.ip_address} did not finish within the teardown budget")
+
+            # Only the bugle coordinator ever needs to leave its group first: it
+            # unjoins when it is a member of another group or its group holds a
+            # speaker that must not hear the bugle call.  Targets simply join it
+            # in Phase 3 (join() works from any group).
+            unjoins, _, _ = plan_regroup(grouping, {bugle_coordinator.uid: [sp.uid for sp in reachable]})
+            to_unjoin = [sp for sp in reachable if sp.uid in unjoins]
+            done, failed, late = _run_concurrently(
+                lambda sp: _timed_call(sp, "unjoin"), to_unjoin, discovery_workers, _time_left(teardown_ends),
+            )
+            _record_ops(grouping, done, failed, late)
+            for sp, _ in done:
+                log(f"INFO: Unjoined {sp.player_name} from pre-existing group")
+            for sp, e in failed:
+                log(f"WARNING: Could not unjoin {sp.ip_address}: {e}")
+            reachable = _drop_laggards(reachable, late, "teardown")
+            if not reachable:
+                raise RuntimeError("no speaker finished teardown within the play budget")
+
+            _settle(
+                reachable[0],
+                {sp.uid: sp.uid for sp, _ in done},
+                settle_timeout if teardown_ends is None else min(settle_timeout, _time_left(teardown_ends)),
+                "unjoin",
+            )
 
-    except Exception as play_err:
-        log(f"ERROR: Playback failed — {play_err}")
-        print(f"  ❌ Error during playback: {play_err}", file=sys.stderr)
+            # =================================================================
+            # Phase 3: Form temporary bugle group
+            # =================================================================
+            # Re-pick the coordinator: the elected speaker may have been dropped
+            # as a laggard in Phase 1 or 2.
+            if bugle_coordinator is not reachable[0]:
+                bugle_coordinator = reachable[0]
+                log(f"INFO: Bugle coordinator changed to {bugle_coordinator.player_name}")
+                # The new coordinator may itself still need to leave its group.
+                unjoins, _, _ = plan_regroup(grouping, {bugle_coordinator.uid: [sp.uid for sp in reachable]})
+                if bugle_coordinator.uid in unjoins:
+                    _timed_call(bugle_coordinator, "unjoin")
+                    apply_unjoin(grouping, bugle_coordinator.uid)
+            with _timed(bugle_coordinator, "volume"):
+                bugle_coordinator.volume = spk_vol_map.get(bugle_coordinator.ip_address, default_vol)
+            bugle_members = reachable[1:]
+            _, joins, _ = plan_regroup(grouping, {bugle_coordinator.uid: [sp.uid for sp in reachable]})
+            need_join = {uid for uid, _ in joins}
+            log(
+                f"INFO: Bugle group needs {len(need_join)} join(s); "
+                f"{len(bugle_members) - len(need_join)} member(s) already in place"
+            )
+            group_timeout = _phase_timeout(budget, "group")
+            group_ends = None if group_timeout is None else time.monotonic() + group_timeout
+            done, failed, late = _run_concurrently(
+                lambda sp: _join_bugle_group(
+                    sp, bugle_coordinator, spk_vol_map.get(sp.ip_address, default_vol), sp.uid in need_join,
+                ),
+                bugle_members, discovery_workers, group_timeout,
+            )
+            done = [(sp, r) for sp, r in done if sp.uid in need_join]
+            _record_ops(
+                grouping, done, [(sp, e) for sp, e in failed if sp.uid in need_join],
+                [sp for sp in late if sp.uid in need_join], bugle_coordinator.uid,
+            )
+            for sp, _ in done:
+                log(f"INFO: {sp.player_name} joined bugle group")
+            for sp, e in failed:
+                log(f"WARNING: Could not add {sp.ip_address} to bugle group: {e}")
+            for sp in late:
+                log(
+                    f"WARNING: {sp.ip_address} did not join the bugle group within the play budget; "
+                    "playing without waiting for it"
+                )
+
+            _settle(
+                bugle_coordinator,
+                {sp.uid: bugle_coordinator.uid for sp, _ in done},
+                settle_timeout if group_ends is None else min(settle_timeout, _time_left(group_ends)),
+                "bugle group join",
+            )
 
-    finally:
-        # =====================================================================
-        # Phase 5: Tear down bugle group
-        # =====================================================================
-        try:
-            bugle_coordinator.stop()
-            log(f"INFO: Stopped playback on {bugle_coordinator.player_name}")
-        except Exception as stop_err:
-            # Sonos raises an error when stop() is called on a non-coordinator group
-            # member.  We detect this via SoCoSlaveException (if available in the
-            # installed soco version) or by matching the canonical message fragment
-            # "coordinator" as a fallback for older soco versions.
-            is_slave_error = (
-                SoCoSlaveException is not None and isinstance(stop_err, SoCoSlaveException)
-            ) or "coordinator" in str(stop_err).lower()
-            if is_slave_error:
-                try:
-                    bugle_coordinator.group.coordinator.stop()
-                    log(
-                        f"INFO: Stopped playback via group coordinator fallback "
-                        f"on {bugle_coordinator.player_name}"
-                    )
-                except Exception as coord_stop_err:
+            # =================================================================
+            # Phase 4: Play
+            # =================================================================
+            # Claim the followers now; one that has meanwhile started on its own
+            # keeps its clips.
+            if followers:
+                claimed = set(claim_followers(schedule_name, [name for name, _ in followers]))
+                for name, _ in followers:
+                    if name not in claimed:
+                        log(f"INFO: '{name}' is playing on its own; dropping it from this play")
+                clips = [clip for clip, owner in zip(clips, clip_owners) if owner is None or owner in claimed]
+
+            # A sequence plays its clips back to back on the same bugle group;
+            # a clip that fails ends the sequence (the finally block restores).
+            for index, (audio_url, gap, duration_future) in enumerate(clips):
+                if index and gap:
+                    log(f"INFO: Pausing {gap} s before clip {index + 1} of {len(clips)}")
+                    time.sleep(gap)
+                wait_secs = _start_clip(
+                    bugle_coordinator, audio_url, duration_future, default_wait,
+                    play_at_deadline if index == 0 else None,
+                )
+                if index == 0 and budget is not None:
                     log(
-                        f"WARNING: Fallback coordinator stop also failed "
-                        f"for {bugle_coordinator.player_name}: {coord_stop_err}"
+                        f"INFO: Playing {time.monotonic() - play_started:.1f} s after start "
+                        f"(budget {budget.total_secs:g} s)"
                     )
-            else:
-                log(f"WARNING: stop() failed on {bugle_coordinator.player_name}: {stop_err}")
 
-        for sp in reachable[1:]:
-            try:
-                sp.unjoin()
-                log(f"INFO: Unjoined {sp.player_name} from bugle group")
-            except Exception as e:
-                log(f"WARNING: Could not unjoin {sp.player_name} from bugle group: {e}")
-
-        # =====================================================================
-        # Phase 6: Restore pre-existing groups
-        # =====================================================================
-        # Identity of speakers is compared by Sonos UID rather than Python object
-        # identity: the same physical speaker can be represented by different SoCo
-        # instances (one created in Phase 0 for `reachable`, another captured here
-        # from `sp.group.coordinator` in Phase 1).
-
-        # First pass: rejoin all pre-existing group members (including non-targets
-        # captured in Phase 1 as full SoCo objects via `member_speakers`).
-        for uid, info in pre_existing_groups.items():
-            group_coord = info["coordinator_speaker"]
-            for member in info["member_speakers"]:
-                try:
-                    member.join(group_coord)
-                except Exception as e:
-                    log(f"WARNING: Could not rejoin {member.player_name} to original group: {e}")
+                max_wait = wait_secs + playback_overrun
+                log(f"INFO: Waiting for playback to finish (expected ~{wait_secs} s, at most {max_wait} s)")
+                print(f"  ▶️  Playing — waiting ~{wait_secs} seconds for playback to finish...")
+                end_state, waited = wait_for_playback_end(
+                    bugle_coordinator, wait_secs, max_wait, use_events=use_transport_events,
+                )
+                if end_state is None:
+                    log(f"WARNING: Transport still active after {waited:.1f} s; tearing down anyway")
+                else:
+                    log(f"INFO: Playback ended after {waited:.1f} s (transport {end_state})")
 
-        # Sleep once after all rejoins (not once per group) to allow Sonos devices
-        # to settle after the group topology changes before restoring transport state.
-        time.sleep(1)
+        except Exception as play_err:
+            log(f"ERROR: Playback failed — {play_err}")
+            print(f"  ❌ Error during playback: {play_err}", file=sys.stderr)
 
-        # Second pass: restore transport state for each pre-existing group.
-        for uid, info in pre_existing_groups.items():
+        finally:
+            # =================================================================
+            # Phase 5: Tear down bugle group
+            # =================================================================
             try:
-                group_coord = info["coordinator_speaker"]
-                if info["was_playing"] or not skip_restore_if_idle:
-                    info["snapshot"].restore()
-                    log(
-                        f"INFO: Restored {group_coord.player_name} "
-                        f"(was_playing={info['was_playing']})"
-                    )
+                _timed_call(bugle_coordinator, "stop")
+                log(f"INFO: Stopped playback on {bugle_coordinator.player_name}")
+            except Exception as stop_err:
+                # Sonos raises an error when stop() is called on a non-coordinator group
+                # member.  We detect this via SoCoSlaveException (if available in the
+                # installed soco version) or by matching the canonical message fragment
+                # "coordinator" as a fallback for older soco versions.
+                try:
+                    from soco.exceptions import SoCoSlaveException
+                except ImportError:
+                    SoCoSlaveException = None
+                is_slave_error = (
+                    SoCoSlaveException is not None and isinstance(stop_err, SoCoSlaveException)
+                ) or "coordinator" in str(stop_err).lower()
+                if is_slave_error:
+                    try:
+                        bugle_coordinator.group.coordinator.stop()
+                        log(
+                            f"INFO: Stopped playback via group coordinator fallback "
+                            f"on {bugle_coordinator.player_name}"
+                        )
+                    except Exception as coord_stop_err:
+                        log(
+                            f"WARNING: Fallback coordinator stop also failed "
+                            f"for {bugle_coordinator.player_name}: {coord_stop_err}"
+                        )
                 else:
-                    log(
-                        f"INFO: Skipping restore for {group_coord.player_name} "
-                        f"(was idle and skip_restore_if_idle=True)"
-                    )
-            except Exception as e:
-                log(f"ERROR: Failed to restore group for coordinator uid={uid}: {e}")
+                    log(f"WARNING: stop() failed on {bugle_coordinator.player_name}: {stop_err}")
+
+            # Diff the current grouping against the original groups: a member that
+            # was grouped with the bugle coordinator before the call stays where
+            # it is, anyone else rejoins its original coordinator directly, and
+            # only speakers that were standalone (or must coordinate again) unjoin.
+            original_groups = {
+                uid: [m.uid for m in info["member_speakers"]] for uid, info in pre_existing_groups.items()
+            }
+            placed = set(original_groups).union(*original_groups.values())
+            for sp in [bugle_coordinator] + bugle_members:
+                if sp.uid not in placed:
+                    original_groups[sp.uid] = []
+            # Group mates another play holds may have moved since Phase 1.
+            for uid in busy:
+                grouping[uid] = None
+            unjoins, joins, _ = plan_regroup(grouping, original_groups)
+
+            # =================================================================
+            # Phase 6: Restore pre-existing groups
+            # =================================================================
+            # Identity of speakers is compared by Sonos UID rather than Python object
+            # identity: the same physical speaker can be represented by different SoCo
+            # instances (one created in Phase 0 for `reachable`, another captured here
+            # from `sp.group.coordinator` in Phase 1).
+            #
+            # Each group is unjoined, rejoined (including non-targets captured in
+            # Phase 1 via `member_speakers`), settled and restored by its own
+            # worker.  The bugle coordinator's original group stays in place and
+            # would play its restored music on every speaker still in the bugle
+            # group, so it is restored last: its worker is submitted after all
+            # the others (the pool is FIFO, so none is left queued behind it)
+            # and waits until they have left the bugle group.
+            joins_by_coord = {uid: [] for uid in original_groups}
+            for uid, coord_uid in joins:
+                joins_by_coord[coord_uid].append(uid)
+            unjoin_set = set(unjoins)
+            regrouped = {uid: threading.Event() for uid in original_groups if uid != bugle_coordinator.uid}
+            restore_order = list(regrouped) + [uid for uid in original_groups if uid not in regrouped]
+            restore_start = time.monotonic()
+            done, failed, _ = _run_concurrently(
+                lambda uid: _restore_group(
+                    uid,
+                    pre_existing_groups.get(uid),
+                    uid in unjoin_set,
+                    joins_by_coord[uid],
+                    topology,
+                    settle_timeout,
+                    not skip_restore_if_idle,
+                    regrouped=regrouped.get(uid),
+                    after=() if uid in regrouped else list(regrouped.values()),
+                ),
+                restore_order,
+                discovery_workers,
+            )
+            for uid, secs in done:
+                log(f"INFO: Group {topology.name(uid)} restored after {secs:.2f} s")
+            for uid, exc in failed:
+                log(f"ERROR: Failed to restore group for coordinator uid={uid}: {exc}")
+            log(
+                f"INFO: Restoring {len(original_groups)} group(s) took {len(unjoins)} unjoin(s) "
+                f"and {len(joins)} join(s) in {time.monotonic() - restore_start:.2f} s"
+            )
 
-        # =====================================================================
-        # Phase 7: Restore per-speaker volumes
-        # =====================================================================
-        for sp in reachable:
-            try:
-                if sp.uid in pre_bugle_volumes:
-                    sp.volume = pre_bugle_volumes[sp.uid]
-                    log(f"INFO: Restored volume on {sp.player_name}")
-            except Exception as e:
+            # =================================================================
+            # Phase 7: Restore per-speaker volumes
+            # =================================================================
+            _, failed, _ = _run_concurrently(
+                lambda sp: _restore_volume(sp, pre_bugle_volumes[sp.uid]),
+                [sp for sp in reachable if sp.uid in pre_bugle_volumes],
+                discovery_workers,
+            )
+            for sp, e in failed:
                 log(f"WARNING: Could not restore volume for {sp.player_name}: {e}")
 
-        print("  ✅ Playback complete.")
+            print("  ✅ Playback complete.")
+
+    finally:
+        if member_lock is not None:
+            release_play_lock(member_lock)
+        # Paired with _begin_latency_stats() on every path, including the
+        # sys.exit() aborts, so the resident daemon's count stays balanced.
+        _finish_latency_stats()
 
 
 if __name__ == "__main__":
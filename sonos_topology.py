@@ -0,0 +1,375 @@
+"""
+sonos_topology.py — One-shot Sonos zone group topology for sonos_play.py.
+
+Every access to ``SoCo.group`` (and ``group.coordinator`` / ``group.members``)
+can trigger its own ``GetZoneGroupState`` round-trip once soco's short topology
+cache expires, so walking the target speakers one by one costs O(N) network
+calls per play.  This module instead reads the household topology **once**
+from a single speaker and parses it into an in-memory map from speaker UID to
+group coordinator and group members.  ``sonos_play.py`` builds one
+:class:`Topology` per play and reuses it for the snapshot, teardown and
+restore phases.
+
+If the single fetch fails (some large households answer ``GetZoneGroupState``
+with HTTP 501) the topology is built from the per-speaker ``group`` properties
+instead — the behaviour before this module existed.
+
+:func:`plan_regroup` diffs a grouping against a desired set of groups and
+returns only the join/unjoin operations needed to get there, so speakers that
+are already in place cost no SOAP calls at all.
+
+:func:`wait_for_topology` re-reads the topology in a short poll loop after a
+join/unjoin so callers can continue as soon as the household reports the new
+grouping, instead of sleeping a fixed amount.
+"""
+
+import logging
+import time
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from urllib.parse import urlparse
+
+from config import lazy_import
+
+soco = lazy_import("soco")  # loaded by the first play, not on import
+
+_log = logging.getLogger(__name__)
+
+
+class Topology:
+    """
+    In-memory view of the household's zone groups, keyed by Sonos UID.
+
+    Each visible speaker maps to the UID of its group coordinator; each
+    coordinator maps to the ordered list of member UIDs (coordinator first).
+    Invisible zones (the hidden half of a stereo pair, home-theatre
+    satellites) are left out because they cannot be joined or unjoined on
+    their own.
+    """
+
+    def __init__(self):
+        self._coordinator = {}  # member uid -> coordinator uid
+        self._members = {}      # coordinator uid -> [member uids], coordinator first
+        self._ip = {}           # uid -> IP address
+        self._name = {}         # uid -> zone name
+        self._speakers = {}     # uid -> SoCo instance already known to the caller
+        self._wired = {}        # uid -> True (Ethernet) / False (wireless), when reported
+
+    def add_group(self, coordinator_uid, members):
+        """
+        Record one zone group.
+
+        Args:
+            coordinator_uid (str): UID of the group coordinator.
+            members (list[tuple[str, str | None, str | None]]): ``(uid, ip,
+                name)`` for every visible member, including the coordinator.
+        """
+        uids = [uid for uid, _, _ in members]
+        if coordinator_uid in uids:
+            uids.remove(coordinator_uid)
+        uids.insert(0, coordinator_uid)
+        self._members[coordinator_uid] = uids
+        for uid, ip, name in members:
+            self._coordinator[uid] = coordinator_uid
+            if ip:
+                self._ip[uid] = ip
+            if name:
+                self._name[uid] = name
+        self._coordinator.setdefault(coordinator_uid, coordinator_uid)
+
+    def bind(self, speakers):
+        """
+        Register already-connected SoCo instances so :meth:`speaker` reuses them.
+
+        Args:
+            speakers (list[soco.SoCo]): Speakers whose ``uid`` is already known.
+        """
+        for sp in speakers:
+            self._speakers[sp.uid] = sp
+
+    def __contains__(self, uid):
+        return uid in self._coordinator
+
+    def coordinator(self, uid):
+        """Return the coordinator UID of the group containing *uid* (``None`` if unknown)."""
+        return self._coordinator.get(uid)
+
+    def members(self, uid):
+        """Return the member UIDs (coordinator first) of the group containing *uid*."""
+        coord = self._coordinator.get(uid)
+        return list(self._members.get(coord, [])) if coord is not None else []
+
+    def coordinators(self):
+        """Return a ``{uid: coordinator_uid}`` copy for every known speaker."""
+        return dict(self._coordinator)
+
+    def groups(self):
+        """Return a ``{coordinator_uid: [member uids]}`` copy of every group."""
+        return {coord: list(uids) for coord, uids in self._members.items()}
+
+    def set_wired(self, uid, wired):
+        """Record whether *uid* is connected by Ethernet (``True``) or wirelessly."""
+        self._wired[uid] = wired
+
+    def wired(self, uid):
+        """Return ``True``/``False`` for a wired/wireless *uid*, ``None`` if not reported."""
+        return self._wired.get(uid)
+
+    def ip(self, uid):
+        """Return the IP address of *uid*, or ``None`` when unknown."""
+        return self._ip.get(uid)
+
+    def name(self, uid):
+        """Return the zone name for *uid*, or *uid* itself when the name is unknown."""
+        return self._name.get(uid, uid)
+
+    def speaker(self, uid):
+        """
+        Return a SoCo instance for *uid* without any network I/O.
+
+        Bound speakers are returned as-is; other members are constructed from
+        the IP address in the topology (soco caches instances per IP, so this
+        is cheap).
+
+        Raises:
+            KeyError: If *uid* is neither bound nor has a known IP address.
+        """
+        sp = self._speakers.get(uid)
+        if sp is None:
+            sp = soco.SoCo(self._ip[uid])
+            self._speakers[uid] = sp
+        return sp
+
+
+def parse_zone_group_state(payload):
+    """
+    Parse a ``GetZoneGroupState`` XML payload into a :class:`Topology`.
+
+    Accepts both the current ``<ZoneGroupState><ZoneGroups>…`` layout and the
+    pre-10.1 firmware layout where ``<ZoneGroup>`` elements are top level.
+    A member's ``EthLink`` attribute (reported by current firmware) records
+    whether it is wired.
+
+    Args:
+        payload (str | bytes): The ``ZoneGroupState`` value.
+
+    Returns:
+        Topology: The parsed topology.
+
+    Raises:
+        ValueError: If *payload* is not valid XML or contains no zone groups.
+    """
+    try:
+        root = ET.fromstring(payload)
+    except (ET.ParseError, TypeError) as exc:
+        raise ValueError(f"Unparseable ZoneGroupState payload: {exc}") from exc
+
+    topology = Topology()
+    found = False
+    for group in root.iter("ZoneGroup"):
+        coordinator_uid = group.attrib.get("Coordinator")
+        if not coordinator_uid:
+            continue
+        members = []
+        for member in group.findall("ZoneGroupMember"):
+            if member.attrib.get("Invisible") == "1":
+                continue
+            location = member.attrib.get("Location", "")
+            eth_link = member.attrib.get("EthLink")
+            if member.attrib.get("UUID") and eth_link in ("0", "1"):
+                topology.set_wired(member.attrib["UUID"], eth_link == "1")
+            members.append((
+                member.attrib.get("UUID"),
+                urlparse(location).hostname if location else None,
+                member.attrib.get("ZoneName"),
+            ))
+        topology.add_group(coordinator_uid, [m for m in members if m[0]])
+        found = True
+    if not found:
+        raise ValueError("ZoneGroupState payload contains no ZoneGroup elements")
+    return topology
+
+
+def fetch_topology(speaker):
+    """
+    Read the whole household topology with a single call to *speaker*.
+
+    Args:
+        speaker (soco.SoCo): Any reachable speaker in the household.
+
+    Returns:
+        Topology: The parsed topology.
+
+    Raises:
+        Exception: Whatever the SOAP call or :func:`parse_zone_group_state`
+            raises.
+    """
+    payload = speaker.zoneGroupTopology.GetZoneGroupState()["ZoneGroupState"]
+    return parse_zone_group_state(payload)
+
+
+def topology_from_groups(speakers):
+    """
+    Build a :class:`Topology` from each speaker's ``group`` property.
+
+    Fallback for :func:`load_topology`.  Costs one topology query per distinct
+    group rather than one per speaker, since speakers already seen as members
+    of an earlier group are skipped.
+
+    Args:
+        speakers (list[soco.SoCo]): Target speakers.
+
+    Returns:
+        Topology: Topology covering the groups of *speakers*.
+    """
+    topology = Topology()
+    for sp in speakers:
+        try:
+            if sp.uid in topology:
+                continue
+            group = sp.group
+            coordinator = group.coordinator
+            members = list(group.members)
+        except Exception as exc:
+            _log.warning("Could not read group for %s: %s", getattr(sp, "ip_address", sp), exc)
+            continue
+        topology.add_group(coordinator.uid, [(m.uid, None, None) for m in members])
+        topology.bind(members + [coordinator])
+    return topology
+
+
+def load_topology(speakers):
+    """
+    Return the topology for *speakers*, fetched once from the first of them.
+
+    Falls back to :func:`topology_from_groups` when the single fetch fails or
+    does not cover every target speaker.
+
+    Args:
+        speakers (list[soco.SoCo]): Reachable target speakers (non-empty).
+
+    Returns:
+        Topology: Topology with *speakers* bound.
+    """
+    try:
+        topology = fetch_topology(speakers[0])
+        missing = [sp for sp in speakers if sp.uid not in topology]
+        if missing:
+            raise ValueError(f"{len(missing)} target speaker(s) missing from ZoneGroupState")
+        _log.info("Zone group topology read once from %s", speakers[0].ip_address)
+    except Exception as exc:
+        _log.warning("Single topology fetch failed (%s); querying each speaker's group", exc)
+        topology = topology_from_groups(speakers)
+    topology.bind(speakers)
+    return topology
+
+
+def apply_unjoin(grouping, uid):
+    """
+    Update *grouping* (``{uid: coordinator uid or None}``) for ``unjoin()`` of *uid*.
+
+    If *uid* was coordinating other speakers, Sonos hands their group to a
+    new coordinator of its choosing, so they are marked unknown (``None``).
+    """
+    _leave_group(grouping, uid)
+    grouping[uid] = uid
+
+
+def apply_join(grouping, uid, coordinator):
+    """Update *grouping* for ``join()`` of *uid* to *coordinator* (see :func:`apply_unjoin`)."""
+    _leave_group(grouping, uid)
+    grouping[uid] = coordinator
+
+
+def _leave_group(grouping, uid):
+    if grouping.get(uid) == uid:
+        for other, coord in grouping.items():
+            if coord == uid and other != uid:
+                grouping[other] = None
+
+
+def plan_regroup(grouping, desired):
+    """
+    Return the minimal join/unjoin operations that turn *grouping* into *desired*.
+
+    A speaker is only touched when its current coordinator differs from the
+    desired one.  A desired coordinator is unjoined when it is currently a
+    member of someone else's group (or its state is unknown), or when its
+    group holds a speaker that *desired* does not mention and that therefore
+    must not be moved — the coordinator leaves instead, as it did before the
+    planner existed.  ``join()`` works from any state, so members never need
+    an unjoin first.
+
+    Args:
+        grouping (dict[str, str | None]): Current speaker UID -> coordinator
+            UID (``None`` when unknown, e.g. after a failed operation).
+        desired (dict[str, list[str]]): Coordinator UID -> member UIDs of
+            each group that must exist afterwards (the coordinator may be
+            listed among its members).
+
+    Returns:
+        tuple[list[str], list[tuple[str, str]], dict[str, str | None]]:
+        ``(unjoins, joins, result)`` — UIDs to unjoin (run these first),
+        ``(uid, coordinator_uid)`` pairs to join, and *grouping* as it will
+        be once every operation has succeeded.
+    """
+    want = {}
+    for coord, members in desired.items():
+        for uid in members:
+            want[uid] = coord
+        want[coord] = coord
+
+    groups = defaultdict(set)
+    for uid, coord in grouping.items():
+        if coord is not None:
+            groups[coord].add(uid)
+
+    result = dict(grouping)
+    unjoins = []
+    for coord in desired:
+        if grouping.get(coord) == coord and all(uid in want for uid in groups[coord]):
+            continue
+        unjoins.append(coord)
+        apply_unjoin(result, coord)
+
+    joins = []
+    for uid, coord in want.items():
+        if uid != coord and result.get(uid) != coord:
+            joins.append((uid, coord))
+            apply_join(result, uid, coord)
+    return unjoins, joins, result
+
+
+def wait_for_topology(speaker, expected, timeout, interval=0.2):
+    """
+    Poll the household topology until every speaker sits under its expected coordinator.
+
+    Args:
+        speaker (soco.SoCo): Speaker to read ``GetZoneGroupState`` from.
+        expected (dict[str, str]): Speaker UID -> expected coordinator UID (a
+            speaker expected to be standalone maps to its own UID).
+        timeout (float): Give up after this many seconds.
+        interval (float): Delay between reads.
+
+    Returns:
+        tuple[bool | None, float]: ``(confirmed, elapsed)`` — ``True`` once
+        the topology matches, ``False`` if *timeout* passed first, ``None`` if
+        the topology could not be read at all (the caller should fall back
+        to a fixed delay).
+    """
+    start = time.monotonic()
+    slept = 0.0
+    while True:
+        try:
+            topology = fetch_topology(speaker)
+        except Exception as exc:
+            _log.debug("Topology read for readiness check failed: %s", exc)
+            return None, max(time.monotonic() - start, slept)
+        elapsed = max(time.monotonic() - start, slept)
+        if all(topology.coordinator(uid) == coord for uid, coord in expected.items()):
+            return True, elapsed
+        if elapsed >= timeout:
+            return False, elapsed
+        pause = min(interval, timeout - elapsed)
+        time.sleep(pause)
+        slept += pause
@@ -0,0 +1,236 @@
+"""
+sunset_table.py — Precomputed sunset instants for the configured location.
+
+Every ``sunset`` / ``sunset±Nmin`` fire time used to cost a fresh
+``LocationInfo``, a pytz zone and a full ``astral.sun()`` computation, and the
+play guard repeats that for each sunset schedule on every play.  This module
+keeps a small binary file with the sunset instant of each of the next
+``TABLE_DAYS`` local days, so a fire time is one array index away:
+
+* the file is keyed by latitude, longitude and timezone — a table for another
+  location is ignored;
+* ``schedule_sonos.py`` refreshes it on its 02:00 reschedule run (and on
+  boot) whenever it is missing, belongs to another location, or covers fewer
+  than ``REFRESH_MARGIN_DAYS`` more days, so it is rewritten about once a
+  year rather than every night;
+* :func:`lookup` returns ``None`` when the table cannot answer, and callers
+  fall back to computing the sunset with astral as before.
+
+File layout (little-endian): ``FLSS`` magic, format version (``B``),
+latitude and longitude (``d``), timezone name (``H`` length + UTF-8), first
+day (``I`` proleptic Gregorian ordinal), day count (``H``), then one ``q``
+per day: the sunset as Unix seconds, or ``NO_SUNSET`` on a day the sun does
+not set (polar day or night).
+
+Only the standard library and ``config`` are imported here; astral is
+needed only to build a table.  A missing or corrupt table only costs an
+astral computation.
+"""
+
+import array
+import logging
+import struct
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+from config import SUNSET_TABLE_FILE, load_if_changed, save_file
+
+_log = logging.getLogger(__name__)
+
+TABLE_DAYS = 366
+REFRESH_MARGIN_DAYS = 30
+NO_SUNSET = -(2 ** 63)
+
+_MAGIC = b"FLSS"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBddH")
+_RANGE = struct.Struct("<IH")
+
+# Path -> (st_mtime_ns, SunsetTable) of tables already read by this process.
+_LOADED = {}
+
+
+class SunsetTable:
+    """Sunset instants of *len(instants)* consecutive local days from *start*."""
+
+    def __init__(self, latitude, longitude, tz_name, start, instants):
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.tz_name = tz_name
+        self.start = start
+        self.instants = array.array("q", instants)
+
+    @classmethod
+    def build(cls, latitude, longitude, tz_name, start, days=TABLE_DAYS):
+        """
+        Compute the table with astral.
+
+        Args:
+            latitude (float): Degrees north.
+            longitude (float): Degrees east.
+            tz_name (str): IANA timezone whose local days are tabulated.
+            start (date): First local day.
+            days (int): Number of days.
+
+        Returns:
+            SunsetTable: The new table.
+        """
+        from astral import Observer
+        from astral.sun import sunset
+        import pytz
+
+        tz_obj = pytz.timezone(tz_name)
+        observer = Observer(float(latitude), float(longitude))
+        instants = []
+        for offset in range(days):
+            try:
+                instant = sunset(observer, date=start + timedelta(days=offset), tzinfo=tz_obj)
+                instants.append(int(instant.timestamp()))
+            except ValueError:
+                instants.append(NO_SUNSET)
+        return cls(latitude, longitude, tz_name, start, instants)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Return the table stored at *path*, or ``None`` if missing or unreadable.
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            _log.warning("Ignoring unreadable sunset table %s: %s", path, e)
+            return None
+        try:
+            magic, version, latitude, longitude, tz_len = _HEADER.unpack_from(data)
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError("not a sunset table of this version")
+            offset = _HEADER.size
+            tz_name = data[offset:offset + tz_len].decode()
+            offset += tz_len
+            start_ordinal, count = _RANGE.unpack_from(data, offset)
+            offset += _RANGE.size
+            instants = array.array("q")
+            instants.frombytes(data[offset:offset + 8 * count])
+            if len(instants) != count:
+                raise ValueError("truncated")
+        except (struct.error, ValueError) as e:
+            _log.warning("Ignoring malformed sunset table %s: %s", path, e)
+            return None
+        if sys.byteorder != "little":
+            instants.byteswap()
+        return cls(latitude, longitude, tz_name, date.fromordinal(start_ordinal), instants)
+
+    def save(self, path):
+        """
+        Atomically write the table to *path*.
+
+        Returns:
+            bool: ``True`` if the file was written.
+        """
+        tz_bytes = self.tz_name.encode()
+        instants = array.array("q", self.instants)
+        if sys.byteorder != "little":
+            instants.byteswap()
+        data = (
+            _HEADER.pack(_MAGIC, _VERSION, self.latitude, self.longitude, len(tz_bytes))
+            + tz_bytes
+            + _RANGE.pack(self.start.toordinal(), len(instants))
+            + instants.tobytes()
+        )
+        return save_file(path, data, "sunset table")
+
+    def matches(self, latitude, longitude, tz_name):
+        """Return True if this table was built for the given location."""
+        return (self.latitude, self.longitude, self.tz_name) == (
+            float(latitude), float(longitude), tz_name,
+        )
+
+    def days_left(self, day):
+        """Return how many days from *day* on the table covers (0 if none)."""
+        index = day.toordinal() - self.start.toordinal()
+        return len(self.instants) - index if 0 <= index < len(self.instants) else 0
+
+    def sunset(self, day):
+        """
+        Return the sunset of local *day* as an aware UTC datetime.
+
+        Raises:
+            KeyError: If *day* is outside the table.
+            ValueError: If the sun does not set on *day* (like astral).
+        """
+        index = day.toordinal() - self.start.toordinal()
+        if not 0 <= index < len(self.instants):
+            raise KeyError(day)
+        instant = self.instants[index]
+        if instant == NO_SUNSET:
+            raise ValueError(f"The sun does not set on {day.isoformat()} at this location")
+        return datetime.fromtimestamp(instant, timezone.utc)
+
+
+def _cached_table(path):
+    """Return the table at *path*, read again only when the file changed."""
+    return load_if_changed(path, SunsetTable.load, _LOADED)
+
+
+def lookup(latitude, longitude, tz_name, day, path=None):
+    """
+    Return the sunset of local *day* at the location from the table.
+
+    Args:
+        latitude (float): Degrees north.
+        longitude (float): Degrees east.
+        tz_name (str): IANA timezone name.
+        day (date): Local day.
+        path (str | None): Table file (default ``SUNSET_TABLE_FILE``).
+
+    Returns:
+        datetime | None: The sunset as an aware UTC datetime, or ``None`` if
+        the table is missing, belongs to another location or does not cover
+        *day* — compute it with astral instead.
+
+    Raises:
+        ValueError: If the table records that the sun does not set on *day*.
+    """
+    table = _cached_table(path or SUNSET_TABLE_FILE)
+    try:
+        if table is None or not table.matches(latitude, longitude, tz_name):
+            return None
+        return table.sunset(day)
+    except (KeyError, TypeError):
+        return None
+
+
+def refresh(latitude, longitude, tz_name, today=None, path=None):
+    """
+    Rebuild the table at *path* if it cannot serve the next ``REFRESH_MARGIN_DAYS``.
+
+    Args:
+        latitude (float): Degrees north.
+        longitude (float): Degrees east.
+        tz_name (str): IANA timezone name.
+        today (date | None): First day of a new table (default: today).
+        path (str | None): Table file (default ``SUNSET_TABLE_FILE``).
+
+    Returns:
+        bool: ``True`` if a new table was written.
+    """
+    path = path or SUNSET_TABLE_FILE
+    today = today or date.today()
+    table = _cached_table(path)
+    if (
+        table is not None
+        and table.matches(latitude, longitude, tz_name)
+        and table.days_left(today) > REFRESH_MARGIN_DAYS
+    ):
+        return False
+    table = SunsetTable.build(latitude, longitude, tz_name, today)
+    if not table.save(path):
+        return False
+    _log.info(
+        "Wrote sunset table %s: %d days from %s for %.4f, %.4f (%s)",
+        path, TABLE_DAYS, today.isoformat(), table.latitude, table.longitude, tz_name,
+    )
+    return True
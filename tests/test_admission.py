@@ -0,0 +1,155 @@
+"""
+tests/test_admission.py — Unit tests for queued admission to the play lock.
+
+Run with:
+    python -m pytest tests/
+  or:
+    python -m unittest discover tests/
+"""
+import sys
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import PlayAdmission, speaker_lock_path, try_flock  # noqa: E402
+
+
+class _AdmissionTestCase(unittest.TestCase):
+    """A fresh admission queue on a temporary lock path."""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, "flag.lock")
+        self.admission = PlayAdmission(self.path, poll_secs=0.02)
+
+    def _acquire_in_thread(self, name, priority=0, max_wait=5, order=None, speakers=None):
+        result = {}
+
+        def run():
+            result["lock"] = self.admission.acquire(name, priority, max_wait, speakers)
+            if order is not None:
+                order.append(name)
+            if result["lock"] is not None:
+                self.admission.release(result["lock"])
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread, result
+
+    def _wait_for_depth(self, depth):
+        for _ in range(200):
+            if len(self.admission.status()["waiting"]) == depth:
+                return
+            time.sleep(0.01)
+        self.fail(f"queue never reached depth {depth}")
+
+
+class TestPlayAdmission(_AdmissionTestCase):
+    """Contended plays wait in priority order until their deadline."""
+
+    def test_no_wait_skips_like_flock_n(self):
+        lock = self.admission.acquire("retreat")
+        self.assertIsNotNone(lock)
+        self.assertIsNone(self.admission.acquire("colors", max_wait=0))
+        self.admission.release(lock)
+        self.assertEqual(self.admission.status()["skipped"], 1)
+
+    def test_waiting_play_starts_when_current_finishes(self):
+        lock = self.admission.acquire("retreat")
+        thread, result = self._acquire_in_thread("colors")
+        self._wait_for_depth(1)
+        self.assertEqual([p["name"] for p in self.admission.status()["playing"]], ["retreat"])
+        time.sleep(0.2)
+        self.admission.release(lock)
+        thread.join(5)
+        self.assertIsNotNone(result["lock"])
+        status = self.admission.status()
+        self.assertEqual((status["admitted"], status["skipped"]), (2, 0))
+        self.assertGreater(status["max_wait_secs"], 0)
+
+    def test_higher_priority_admitted_first(self):
+        lock = self.admission.acquire("retreat")
+        order = []
+        low, _ = self._acquire_in_thread("low", priority=0, order=order)
+        self._wait_for_depth(1)
+        high, _ = self._acquire_in_thread("high", priority=5, order=order)
+        self._wait_for_depth(2)
+        self.assertEqual([w["name"] for w in self.admission.status()["waiting"]], ["high", "low"])
+        self.admission.release(lock)
+        low.join(5)
+        high.join(5)
+        self.assertEqual(order, ["high", "low"])
+
+    def test_skipped_after_max_wait(self):
+        lock = self.admission.acquire("retreat")
+        self.assertIsNone(self.admission.acquire("colors", max_wait=0.1))
+        self.admission.release(lock)
+        self.assertEqual(self.admission.status()["waiting"], [])
+
+    def test_lock_held_by_another_process_is_polled(self):
+        """The flock is shared with plays outside this process."""
+        other = try_flock(self.path)
+        thread, result = self._acquire_in_thread("colors")
+        self._wait_for_depth(1)
+        other.close()
+        thread.join(5)
+        self.assertIsNotNone(result["lock"])
+
+
+class TestSpeakerLocks(_AdmissionTestCase):
+    """Plays lock only their own speakers."""
+
+    def test_lock_file_per_speaker(self):
+        self.assertEqual(speaker_lock_path("/run/flag.lock", "10.0.0.1"), "/run/flag-10.0.0.1.lock")
+        self.assertEqual(speaker_lock_path("/run/flag.lock", None), "/run/flag.lock")
+
+    def test_disjoint_speakers_play_concurrently(self):
+        flagpole = self.admission.acquire("colors", speakers=["10.0.0.1"])
+        chapel = self.admission.acquire("chapel-bell", speakers=["10.0.0.2", "10.0.0.3"])
+        self.assertIsNotNone(flagpole)
+        self.assertIsNotNone(chapel)
+        self.assertEqual(len(self.admission.status()["playing"]), 2)
+        self.admission.release(flagpole)
+        self.admission.release(chapel)
+
+    def test_shared_speaker_serializes(self):
+        lock = self.admission.acquire("colors", speakers=["10.0.0.1", "10.0.0.2"])
+        self.assertIsNone(self.admission.acquire("chapel-bell", speakers=["10.0.0.2"]))
+        self.admission.release(lock)
+        self.assertIsNotNone(self.admission.acquire("chapel-bell", speakers=["10.0.0.2"]))
+
+    def test_waiting_request_is_not_overtaken_on_its_speakers(self):
+        """A later request for a speaker wanted by an earlier waiter queues behind it."""
+        lock = self.admission.acquire("retreat", speakers=["10.0.0.1"])
+        waiter, _ = self._acquire_in_thread("colors", speakers=["10.0.0.1", "10.0.0.2"])
+        self._wait_for_depth(1)
+        self.assertIsNone(self.admission.acquire("chapel-bell", speakers=["10.0.0.2"]))
+        self.assertIsNotNone(self.admission.acquire("garden", speakers=["10.0.0.3"]))
+        self.admission.release(lock)
+        waiter.join(5)
+
+    def test_partly_held_set_takes_no_locks(self):
+        """Speakers locked by another process block the play without stranding its other locks."""
+        other = try_flock(speaker_lock_path(self.path, "10.0.0.2"))
+        self.assertIsNone(self.admission.acquire("colors", speakers=["10.0.0.1", "10.0.0.2"]))
+        self.assertIsNotNone(self.admission.acquire("garden", speakers=["10.0.0.1"]))
+        other.close()
+
+    def test_try_acquire_takes_the_free_speakers(self):
+        """Group mates are locked where free and reported where another play holds them."""
+        held = self.admission.acquire("taps", speakers=["10.0.0.2"])
+        lock, busy = self.admission.try_acquire("colors (group members)", ["10.0.0.1", "10.0.0.2"])
+        self.assertEqual((lock.speakers, busy), (["10.0.0.1"], ["10.0.0.2"]))
+        self.assertIsNone(self.admission.acquire("garden", speakers=["10.0.0.1"]))
+        self.admission.release(lock)
+        self.admission.release(held)
+        self.assertEqual(self.admission.try_acquire("colors", ["10.0.0.2"])[1], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
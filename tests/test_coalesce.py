@@ -0,0 +1,67 @@
+"""
+tests/test_coalesce.py — Unit tests for coalescing near-simultaneous schedules.
+
+Run with:
+    python -m pytest tests/
+  or:
+    python -m unittest discover tests/
+"""
+import sys
+import os
+import json
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coalesce import claim_followers, group_fire_times, merged_into, start_own_play  # noqa: E402
+
+
+class TestGroupFireTimes(unittest.TestCase):
+    """Fire times within the window of a group's first schedule share its play."""
+
+    def test_window_measured_from_group_leader(self):
+        fire_times = [("taps", 21 * 3600), ("colors", 1140 * 60), ("first-call", 1138 * 60 + 30),
+                      ("late", 1140 * 60 + 60)]
+        self.assertEqual(
+            group_fire_times(fire_times, 120),
+            [["first-call", "colors"], ["late"], ["taps"]],
+        )
+
+    def test_ties_keep_configured_order(self):
+        self.assertEqual(group_fire_times([("b", 60), ("a", 60)], 30), [["b", "a"]])
+
+    def test_zero_window_disables_coalescing(self):
+        self.assertEqual(group_fire_times([("a", 60), ("b", 60)], 0), [["a"], ["b"]])
+
+
+class TestMergedRecord(unittest.TestCase):
+    """The leader records its followers so their own units skip the play."""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, "flag-merged.json")
+
+    def test_round_trip(self):
+        self.assertIsNone(merged_into("colors", path=self.path))
+        self.assertEqual(claim_followers("first-call", ["colors"], path=self.path), ["colors"])
+        self.assertEqual(merged_into("colors", path=self.path), "first-call")
+        self.assertIsNone(merged_into("first-call", path=self.path))
+        self.assertEqual(start_own_play("colors", path=self.path), "first-call")
+
+    def test_started_follower_is_not_claimed(self):
+        """Whichever of claim and start comes first wins, so the clip plays once."""
+        self.assertIsNone(start_own_play("colors", path=self.path))
+        self.assertEqual(claim_followers("first-call", ["colors", "retreat"], path=self.path), ["retreat"])
+        self.assertIsNone(merged_into("colors", path=self.path))
+        self.assertEqual(claim_followers("other", ["retreat"], path=self.path), [])
+
+    def test_record_from_another_day_is_ignored(self):
+        with open(self.path, "w") as f:
+            json.dump({"date": "2000-01-01", "merged": {"colors": "first-call"}}, f)
+        self.assertIsNone(merged_into("colors", path=self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
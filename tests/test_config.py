@@ -76,5 +76,103 @@ class TestValidateConfigTimezone(unittest.TestCase):
                            "An invalid timezone string should produce a warning")
 
 
+class TestScheduleSpeakers(unittest.TestCase):
+    """A schedule may target a subset of the configured speakers."""
+
+    CFG = {
+        "speakers": [
+            {"ip": "10.0.0.1", "name": "Flagpole"},
+            {"ip": "10.0.0.2", "name": "Chapel"},
+            "10.0.0.3",
+        ],
+        "schedules": [
+            {"name": "colors", "time": "08:00", "audio_url": "http://h/c.mp3"},
+            {"name": "bell", "time": "08:00", "audio_url": "http://h/b.mp3",
+             "speakers": ["10.0.0.3", "Chapel"]},
+            {"name": "bad", "time": "08:00", "audio_url": "http://h/b.mp3", "speakers": ["Garage"]},
+            {"name": "Chapel Taps", "time": "21:00", "audio_url": "http://h/t.mp3", "speakers": ["Chapel"],
+             "priority": 5},
+        ],
+    }
+
+    def test_names_and_ips_in_configured_order(self):
+        self.assertEqual(config.speaker_ips(self.CFG, "bell"), ["10.0.0.2", "10.0.0.3"])
+
+    def test_without_list_all_speakers_play(self):
+        self.assertEqual(config.speaker_ips(self.CFG, "colors"), ["10.0.0.1", "10.0.0.2", "10.0.0.3"])
+        self.assertEqual(config.schedule_speakers(self.CFG), self.CFG["speakers"])
+
+    def test_unknown_speaker_rejected(self):
+        with self.assertRaises(ValueError):
+            config.schedule_speakers(self.CFG, "bad")
+
+    def test_unit_name_finds_spaced_schedule(self):
+        """Units pass the sanitised name; it resolves to the configured entry."""
+        self.assertEqual(config.schedule_key("Chapel Taps"), "Chapel-Taps")
+        for name in ("Chapel-Taps", "Chapel Taps"):
+            self.assertEqual(config.speaker_ips(self.CFG, name), ["10.0.0.2"])
+            self.assertEqual(config.get_play_admission(self.CFG, name)[0], 5)
+
+
+class TestNumberSettings(unittest.TestCase):
+    """The numeric getters share read_number_setting's parse/range/default rules."""
+
+    def test_invalid_and_out_of_range_values_warn_and_default(self):
+        cases = [
+            (config.get_preroll_seconds, {"preroll_seconds": "soon"}, 0),
+            (config.get_preroll_seconds, {"preroll_seconds": 500}, 0),
+            (config.get_coalesce_window_seconds, {"coalesce_window_seconds": -1}, 60),
+            (lambda cfg: config.get_play_admission(cfg)[1], {"max_lateness_seconds": 5000}, 60),
+        ]
+        for getter, cfg, expected in cases:
+            with self.subTest(cfg=cfg), patch.object(config._log, "warning") as warn:
+                self.assertEqual(getter(cfg), expected)
+                warn.assert_called_once()
+
+    def test_valid_and_missing_values(self):
+        with patch.object(config._log, "warning") as warn:
+            self.assertEqual(config.get_preroll_seconds({"preroll_seconds": "30"}), 30)
+            self.assertEqual(config.get_coalesce_window_seconds({}), 60)
+            self.assertEqual(config.read_number_setting({"x": 2.5}, "x", 1, 0, 3), 2.5)
+        warn.assert_not_called()
+
+
+class TestAtomicWrite(unittest.TestCase):
+    """atomic_write/save_file replace the file whole and leave no temp file behind."""
+
+    def setUp(self):
+        import tempfile
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.dir = tmpdir.name
+        self.path = os.path.join(self.dir, "state.json")
+
+    def test_text_and_bytes_replace_file(self):
+        config.atomic_write(self.path, "old")
+        config.atomic_write(self.path, b"new")
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"new")
+        self.assertEqual(os.listdir(self.dir), ["state.json"])
+
+    def test_failed_rename_removes_temp_file(self):
+        with patch("config.os.replace", side_effect=OSError("read-only")), \
+             patch.object(config._log, "warning") as warn:
+            self.assertFalse(config.save_file(self.path, "x", "test state"))
+        self.assertEqual(os.listdir(self.dir), [])
+        self.assertIn("test state", warn.call_args.args[1])
+
+    def test_load_if_changed_reads_again_after_rewrite(self):
+        memo = {}
+        load = MagicMock(side_effect=["first", "second"])
+        self.assertIsNone(config.load_if_changed(self.path, load, memo))
+        config.atomic_write(self.path, "1")
+        self.assertEqual(config.load_if_changed(self.path, load, memo), "first")
+        self.assertEqual(config.load_if_changed(self.path, load, memo), "first")
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        self.assertEqual(config.load_if_changed(self.path, load, memo), "second")
+        self.assertEqual(load.call_count, 2)
+
+
 if __name__ == "__main__":
     unittest.main()
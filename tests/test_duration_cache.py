@@ -0,0 +1,177 @@
+"""
+tests/test_duration_cache.py — Unit tests for the on-disk audio duration cache.
+
+Run with:
+    python -m pytest tests/
+  or:
+    python -m unittest discover tests/
+"""
+import sys
+import os
+import json
+import tempfile
+import unittest
+import urllib.error
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from duration_cache import DurationCache  # noqa: E402
+
+URL = "http://10.0.0.5:8000/taps.mp3"
+
+
+class _CacheDirTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "duration_cache.json")
+
+
+class TestDurationCache(_CacheDirTest):
+    """Round-trip, validation and LRU bounds of DurationCache."""
+
+    def test_round_trip(self):
+        cache = DurationCache.load(self.path)
+        self.assertTrue(cache.put(URL, 67.5, size=1000, etag='"abc"'))
+        self.assertTrue(cache.save())
+        entry = DurationCache.load(self.path).get(URL)
+        self.assertEqual(entry["duration"], 67.5)
+        self.assertEqual(entry["etag"], '"abc"')
+        self.assertEqual(entry["size"], 1000)
+
+    def test_entry_without_validator_is_not_stored(self):
+        cache = DurationCache.load(self.path)
+        self.assertFalse(cache.put(URL, 10.0))
+        self.assertNotIn(URL, cache)
+        self.assertFalse(cache.save())
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_corrupt_file_is_ignored(self):
+        with open(self.path, "w") as f:
+            f.write("{not json")
+        self.assertEqual(len(DurationCache.load(self.path)), 0)
+
+    def test_lru_eviction_by_entry_count(self):
+        cache = DurationCache.load(self.path, max_entries=2)
+        for name in ("a", "b", "c"):
+            cache.put(f"http://h/{name}.mp3", 1.0, last_modified="x")
+        cache.touch("http://h/b.mp3")
+        cache.put("http://h/d.mp3", 1.0, last_modified="x")
+        cache.save()
+        with open(self.path) as f:
+            self.assertEqual(list(json.load(f)), ["http://h/b.mp3", "http://h/d.mp3"])
+
+    def test_lru_eviction_by_size(self):
+        cache = DurationCache.load(self.path, max_bytes=600)
+        for i in range(10):
+            cache.put(f"http://h/{i}.mp3", 1.0, etag=f'"{i}"')
+        cache.save()
+        self.assertLessEqual(os.path.getsize(self.path), 600)
+        kept = DurationCache.load(self.path)
+        self.assertIn("http://h/9.mp3", kept)
+        self.assertNotIn("http://h/0.mp3", kept)
+
+    def test_concurrent_lookups_keep_each_others_entries(self):
+        """Two lookups loaded before either saved both end up in the file."""
+        import threading
+        first, second = DurationCache.load(self.path), DurationCache.load(self.path)
+        first.put("http://h/a.mp3", 1.0, etag='"a"')
+        second.put("http://h/b.mp3", 2.0, etag='"b"')
+        threads = [threading.Thread(target=cache.save) for cache in (first, second)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        kept = DurationCache.load(self.path)
+        self.assertIn("http://h/a.mp3", kept)
+        self.assertIn("http://h/b.mp3", kept)
+
+    def test_discard_survives_merge(self):
+        cache = DurationCache.load(self.path)
+        cache.put(URL, 5.0, etag='"e"')
+        cache.save()
+        stale = DurationCache.load(self.path)
+        stale.discard(URL)
+        stale.save()
+        self.assertNotIn(URL, DurationCache.load(self.path))
+
+    def test_touching_most_recent_entry_does_not_write(self):
+        cache = DurationCache.load(self.path)
+        cache.put(URL, 5.0, etag='"e"')
+        cache.save()
+        cache.touch(URL)
+        self.assertFalse(cache.save())
+
+    def test_unwritable_directory_is_not_fatal(self):
+        cache = DurationCache(os.path.join(self.tmpdir.name, "missing", "c.json"))
+        cache.put(URL, 5.0, etag='"e"')
+        self.assertFalse(cache.save())
+
+
+def _head_response(headers):
+    response = MagicMock()
+    response.headers = headers
+    response.__enter__.return_value = response
+    return response
+
+
+class TestCachedMp3Duration(_CacheDirTest):
+    """get_mp3_duration reuses a cached duration after a conditional HEAD."""
+
+    def setUp(self):
+        super().setUp()
+        cache = DurationCache(self.path)
+        cache.put(URL, 67.5, size=1000, etag='"v1"')
+        cache.save()
+        path_patch = patch("sonos_play.DURATION_CACHE_FILE", self.path)
+        path_patch.start()
+        self.addCleanup(path_patch.stop)
+
+    def test_not_modified_uses_cache_without_download(self):
+        """A 304 answer to the HEAD means no Range request and no download."""
+        import sonos_play
+
+        not_modified = urllib.error.HTTPError(URL, 304, "Not Modified", {}, None)
+        with patch("sonos_play.urllib.request.urlopen", side_effect=not_modified) as mock_open, \
+             patch("sonos_play._header_duration") as mock_probe:
+            self.assertEqual(sonos_play.get_mp3_duration(URL, 60), 67)
+        req = mock_open.call_args.args[0]
+        self.assertEqual(req.get_method(), "HEAD")
+        self.assertEqual(req.headers["If-none-match"], '"v1"')
+        mock_probe.assert_not_called()
+
+    def test_same_etag_on_200_uses_cache(self):
+        """Servers that ignore conditionals still validate by ETag and size."""
+        import sonos_play
+
+        response = _head_response({"ETag": '"v1"', "Content-Length": "1000"})
+        with patch("sonos_play.urllib.request.urlopen", return_value=response), \
+             patch("sonos_play._header_duration") as mock_probe:
+            self.assertEqual(sonos_play.get_mp3_duration(URL, 60), 67)
+        mock_probe.assert_not_called()
+
+    def test_changed_file_is_measured_again(self):
+        """A new ETag re-measures the file and replaces the cache entry."""
+        import sonos_play
+
+        response = _head_response({"ETag": '"v2"', "Content-Length": "2000"})
+        with patch("sonos_play.urllib.request.urlopen", return_value=response), \
+             patch("sonos_play._header_duration",
+                   return_value=(12.2, 2000, {"ETag": '"v2"'})) as mock_probe:
+            self.assertEqual(sonos_play.get_mp3_duration(URL, 60), 12)
+        mock_probe.assert_called_once_with(URL)
+        entry = DurationCache.load(self.path).get(URL)
+        self.assertEqual((entry["duration"], entry["etag"]), (12.2, '"v2"'))
+
+    def test_unreachable_server_falls_back_to_cached_value(self):
+        """If the HEAD cannot reach the server, the cached duration beats default_wait."""
+        import sonos_play
+
+        with patch("sonos_play.urllib.request.urlopen",
+                   side_effect=urllib.error.URLError("no route")):
+            self.assertEqual(sonos_play.get_mp3_duration(URL, 60), 67)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+tests/test_fire_plan.py — Unit tests for the compiled daily fire-time plan.
+
+Run with:
+    python -m pytest tests/
+  or:
+    python -m unittest discover tests/
+"""
+import sys
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fire_plan  # noqa: E402
+from fire_plan import FirePlan, config_hash, current  # noqa: E402
+
+CONFIG = {
+    "speakers": ["10.0.0.1", "10.0.0.2"],
+    "timezone": "America/New_York",
+    "latitude": 42.1,
+    "longitude": -71.5,
+    "schedules": [
+        {"name": "colors", "time": "08:00", "audio_url": "http://example.com/colors.mp3"},
+        {"name": "retreat", "time": "sunset-5min", "audio_url": "http://example.com/retreat.mp3",
+         "speakers": ["10.0.0.1"]},
+    ],
+}
+
+
+class _PlanTestCase(unittest.TestCase):
+    """A plan file in a temporary directory."""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, "fire_plan.json")
+        self.today = date.today()
+
+    def _save(self, config=CONFIG, day=None, times=None):
+        day = day or self.today
+        times = times or {"08:00": (8, 0), "sunset-5min": (18, 5)}
+        FirePlan(config_hash(config), {day.isoformat(): times}, {"retreat": ["10.0.0.1"]}).save(self.path)
+
+
+class TestFirePlan(_PlanTestCase):
+    """The plan is only used for the config and day it was compiled for."""
+
+    def test_round_trip(self):
+        self._save()
+        plan = current(CONFIG, path=self.path)
+        self.assertEqual(plan.fire_time("Sunset-5min ", self.today), (18, 5))
+        self.assertEqual(plan.speakers, {"retreat": ["10.0.0.1"]})
+
+    def test_stale_plan_ignored(self):
+        self._save()
+        edited = dict(CONFIG, sunset_offset_minutes=10)
+        self.assertIsNone(current(edited, path=self.path))
+        self.assertIsNone(current(CONFIG, day=self.today + timedelta(days=2), path=self.path))
+        self.assertIsNone(current(CONFIG, path=self.path + ".missing"))
+
+    def test_unrelated_config_keys_keep_plan(self):
+        self._save()
+        self.assertIsNotNone(current(dict(CONFIG, volume=80, paused_until=None), path=self.path))
+
+    def test_corrupt_plan_ignored(self):
+        with open(self.path, "w") as f:
+            f.write('{"version": 1, "fire_times": [')
+        self.assertIsNone(current(CONFIG, path=self.path))
+
+    def test_fire_time_falls_back_to_live_resolution(self):
+        self._save(times={"08:00": (8, 0)})
+        plan = current(CONFIG, path=self.path)
+        with patch("schedule_resolve.resolve_fire_time", return_value=(18, 6)) as resolve:
+            self.assertEqual(fire_plan.fire_time(CONFIG, "08:00", plan), (8, 0))
+            resolve.assert_not_called()
+            self.assertEqual(fire_plan.fire_time(CONFIG, "sunset-5min", plan), (18, 6))
+            self.assertEqual(fire_plan.fire_time(CONFIG, "sunset-5min", None), (18, 6))
+        self.assertEqual(resolve.call_count, 2)
+
+
+class TestRescheduleWritesPlan(_PlanTestCase):
+    """schedule_sonos compiles today's and tomorrow's times."""
+
+    def test_today_and_tomorrow_written(self):
+        import schedule_sonos
+        entries = [{"name": "colors", "time": "08:00"}, {"name": "retreat", "time": "Sunset-5min"},
+                   {"name": "skipped", "time": "sunset+1min"}]
+        today_times = {"colors": (8, 0), "retreat": (18, 5)}
+        speaker_sets = {"colors": frozenset({"10.0.0.2", "10.0.0.1"}), "retreat": frozenset({"10.0.0.1"})}
+        with patch.object(fire_plan, "FIRE_PLAN_FILE", self.path), \
+             patch("schedule_sonos.resolve_fire_time", side_effect=[(8, 0), (18, 4)]):
+            self.assertTrue(schedule_sonos._write_fire_plan(
+                CONFIG, config_hash(CONFIG), entries, today_times, speaker_sets, today=self.today,
+            ))
+        plan = current(CONFIG, day=self.today + timedelta(days=1), path=self.path)
+        self.assertEqual(plan.fire_times, {
+            self.today.isoformat(): {"08:00": (8, 0), "sunset-5min": (18, 5)},
+            (self.today + timedelta(days=1)).isoformat(): {"08:00": (8, 0), "sunset-5min": (18, 4)},
+        })
+        self.assertEqual(plan.speakers, {"colors": ["10.0.0.1", "10.0.0.2"], "retreat": ["10.0.0.1"]})
+
+
+class TestPlayPathUsesPlan(_PlanTestCase):
+    """sonos_play reads planned fire times instead of resolving sunset."""
+
+    def test_guard_uses_planned_sunset(self):
+        import sonos_play
+        config = dict(CONFIG, allow_quiet_hours_play=False)
+        self._save(config=config)
+        now = datetime.combine(self.today, datetime.min.time()).replace(hour=18, minute=5)
+        with patch.object(fire_plan, "FIRE_PLAN_FILE", self.path), \
+             patch("schedule_resolve.get_sunset_local_time_with_offset") as live:
+            self.assertTrue(sonos_play.check_play_guard(config, now=now))
+            self.assertFalse(sonos_play.check_play_guard(config, now=now.replace(hour=12)))
+        live.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
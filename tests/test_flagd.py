@@ -0,0 +1,127 @@
+"""
+tests/test_flagd.py — Unit tests for the resident playback daemon.
+
+Run with:
+    python -m pytest tests/
+  or:
+    python -m unittest discover tests/
+"""
+import sys
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flagd  # noqa: E402
+
+AUDIO_URL = "http://10.0.0.5:8000/taps.mp3"
+
+
+class TestFlagDaemon(unittest.TestCase):
+    """Round trips through a real Unix socket with sonos_play.main patched out."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "flagd.sock")
+        self.server = flagd.FlagDaemon(self.path)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        import sonos_play
+        self.lock = MagicMock()
+        for name, value in (("acquire_play_lock", MagicMock(return_value=self.lock)),
+                            ("main", MagicMock())):
+            p = patch.object(sonos_play, name, value)
+            p.start()
+            self.addCleanup(p.stop)
+        self.sonos_play = sonos_play
+
+    def test_play_runs_in_daemon_and_releases_lock(self):
+        status = flagd.request_play(["--ignore-guard", AUDIO_URL], path=self.path)
+        self.assertEqual(status, 0)
+        self.sonos_play.main.assert_called_once_with(["--ignore-guard", AUDIO_URL])
+        self.lock.close.assert_called_once()
+
+    def test_exit_status_is_passed_back(self):
+        self.sonos_play.main.side_effect = SystemExit(1)
+        self.assertEqual(flagd.request_play([AUDIO_URL], path=self.path), 1)
+
+    def test_busy_lock_skips_play(self):
+        """A play while another holds /run/flag.lock is skipped, like ``flock -n``."""
+        self.sonos_play.acquire_play_lock.return_value = None
+        self.assertEqual(flagd.request_play([AUDIO_URL], path=self.path), 1)
+        self.sonos_play.main.assert_not_called()
+
+    def test_sleeping_request_takes_lock_inside_sonos_play(self):
+        """Sunset requests are not locked up front, and their own lock is released after."""
+        argv = ["--sleep-until-schedule", "taps", AUDIO_URL]
+        with patch.object(self.sonos_play, "release_play_lock") as release:
+            self.assertEqual(flagd.request_play(argv, path=self.path), 0)
+        self.sonos_play.acquire_play_lock.assert_not_called()
+        release.assert_called_once()
+
+    def test_coalesced_schedule_skips_before_locking(self):
+        """A follower already played in an earlier session exits 0 while that play holds the lock."""
+        self.sonos_play.acquire_play_lock.return_value = None
+        with patch("flagd.merged_into", return_value="retreat"):
+            status = flagd.request_play(["--schedule", "colors", AUDIO_URL], path=self.path)
+        self.assertEqual(status, 0)
+        self.sonos_play.main.assert_not_called()
+
+    def test_follower_claimed_while_waiting_exits_cleanly(self):
+        """A follower whose leader claimed it during the lock wait is not a failed play."""
+        self.sonos_play.acquire_play_lock.return_value = None
+        with patch("flagd.merged_into", side_effect=[None, "retreat"]):
+            status = flagd.request_play(["--schedule", "colors", AUDIO_URL], path=self.path)
+        self.assertEqual(status, 0)
+        self.sonos_play.main.assert_not_called()
+
+    def test_queue_status_query(self):
+        status = flagd.request_queue_status(path=self.path)
+        self.assertEqual(status["waiting"], [])
+        self.assertIn("max_wait_secs", status)
+
+    def test_malformed_request_is_rejected(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(self.path)
+            conn.sendall(b"not json\n")
+            reply = conn.makefile("rb").readline()
+        self.assertIn(b'"status": 2', reply)
+        self.sonos_play.main.assert_not_called()
+
+
+class TestClientFallback(unittest.TestCase):
+    """flagd.py play never loses a play when the daemon is unavailable."""
+
+    def test_missing_daemon_plays_locally(self):
+        with patch("flagd._run_locally", return_value=0) as local:
+            status = flagd.request_play([AUDIO_URL], path="/nonexistent/flagd.sock")
+        self.assertEqual(status, 0)
+        local.assert_called_once_with([AUDIO_URL])
+
+    def test_local_follower_claimed_while_waiting_exits_cleanly(self):
+        """Without the daemon, a follower claimed during the lock wait also exits 0."""
+        admission = MagicMock()
+        admission.return_value.acquire.return_value = None
+        with patch("flagd.PlayAdmission", admission), \
+             patch("flagd.merged_into", side_effect=[None, "retreat"]), \
+             patch("flagd.os.execv") as execv:
+            status = flagd.request_play(["--schedule", "colors", AUDIO_URL], path="/nonexistent/flagd.sock")
+        self.assertEqual(status, 0)
+        execv.assert_not_called()
+
+    def test_main_passes_sonos_play_options_through(self):
+        with patch("flagd.request_play", return_value=0) as request:
+            flagd.main(["play", "--sleep-until-schedule", "taps", AUDIO_URL])
+        request.assert_called_once_with(["--sleep-until-schedule", "taps", AUDIO_URL])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+tests/test_latency_stats.py — Unit tests for the rolling speaker latency statistics.
+
+Run with:
+    python -m pytest tests/
+  or:
+    python -m unittest discover tests/
+"""
+import sys
+import os
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from latency_stats import LatencyStats, main, percentile  # noqa: E402
+
+
+class _StatsDirTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "latency_stats.json")
+
+
+class TestLatencyStats(_StatsDirTest):
+    """Percentiles, rolling window and persistence of LatencyStats."""
+
+    def test_percentiles_nearest_rank(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 95), 95)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertIsNone(percentile([], 50))
+
+    def test_only_recent_samples_are_kept(self):
+        stats = LatencyStats(self.path, max_samples=3)
+        for ms in (10, 20, 30, 40):
+            stats.record("10.0.0.1", "join", ms / 1000)
+        self.assertEqual(stats.samples("10.0.0.1", "join"), [20, 30, 40])
+
+    def test_round_trip_and_summary(self):
+        stats = LatencyStats.load(self.path)
+        stats.record("10.0.0.1", "join", 0.120)
+        stats.record("10.0.0.1", "play_uri", 0.050)
+        self.assertTrue(stats.save())
+        self.assertFalse(stats.save())
+        rows = LatencyStats.load(self.path).summary()
+        self.assertEqual([(r["op"], r["n"], r["p50"]) for r in rows],
+                         [("join", 1, 120.0), ("play_uri", 1, 50.0)])
+
+    def test_least_recent_speaker_is_dropped(self):
+        stats = LatencyStats(self.path, max_speakers=2)
+        for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+            stats.record(ip, "join", 0.1)
+        self.assertNotIn("10.0.0.1", stats)
+        self.assertIn("10.0.0.3", stats)
+
+    def test_profile_cached_across_runs(self):
+        stats = LatencyStats(self.path)
+        stats.update_profile("10.0.0.1", model="S16", wired=True)
+        stats.save()
+        stats = LatencyStats.load(self.path)
+        stats.update_profile("10.0.0.1", model=None, wired=False)
+        self.assertEqual(stats.profile("10.0.0.1"), {"model": "S16", "wired": False})
+
+    def test_corrupt_file_is_ignored(self):
+        with open(self.path, "w") as f:
+            f.write("[1, 2")
+        self.assertEqual(LatencyStats.load(self.path).summary(), [])
+
+    def test_cli_prints_percentiles(self):
+        stats = LatencyStats(self.path)
+        stats.record("10.0.0.1", "stop", 0.2)
+        stats.save()
+        out = io.StringIO()
+        with patch("latency_stats._speaker_names", return_value={"10.0.0.1": "Flag"}), \
+             redirect_stdout(out):
+            main(["--path", self.path])
+        self.assertIn("Flag (10.0.0.1)", out.getvalue())
+        self.assertIn("stop", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
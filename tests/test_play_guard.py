@@ -107,10 +107,10 @@ class TestPlayGuardRefusesAtWrongTime(unittest.TestCase):
 
     def _guard(self, now):
         config = _six_schedule_config(sunset_hour=19, sunset_minute=42)
-        with patch("schedule_sonos.get_sunset_local_time",
+        with patch("schedule_resolve.get_sunset_local_time",
                    return_value=(19, 42)), \
-             patch("schedule_sonos.get_sunset_local_time_with_offset",
-                   side_effect=lambda cfg, off: (19, 42 + off)):
+             patch("schedule_resolve.get_sunset_local_time_with_offset",
+                   side_effect=lambda cfg, off, day: (19, 42 + off)):
             return sonos_play.check_play_guard(config, now=now)
 
     def test_refuses_at_02_00_26(self):
@@ -150,10 +150,10 @@ class TestPlayGuardPermitsAtCorrectTime(unittest.TestCase):
     def _guard(self, now, sunset_hour=19, sunset_minute=42):
         config = _six_schedule_config(sunset_hour=sunset_hour,
                                       sunset_minute=sunset_minute)
-        with patch("schedule_sonos.get_sunset_local_time",
+        with patch("schedule_resolve.get_sunset_local_time",
                    return_value=(sunset_hour, sunset_minute)), \
-             patch("schedule_sonos.get_sunset_local_time_with_offset",
-                   side_effect=lambda cfg, off: (19, sunset_minute + off)):
+             patch("schedule_resolve.get_sunset_local_time_with_offset",
+                   side_effect=lambda cfg, off, day: (19, sunset_minute + off)):
             return sonos_play.check_play_guard(config, now=now)
 
     def test_permits_at_sunset_19_42(self):
@@ -192,10 +192,10 @@ class TestPlayGuardBoundary(unittest.TestCase):
     def _guard(self, now, tolerance_minutes=2):
         config = _six_schedule_config(sunset_hour=19, sunset_minute=42)
         config["play_guard_tolerance_minutes"] = tolerance_minutes
-        with patch("schedule_sonos.get_sunset_local_time",
+        with patch("schedule_resolve.get_sunset_local_time",
                    return_value=(19, 42)), \
-             patch("schedule_sonos.get_sunset_local_time_with_offset",
-                   side_effect=lambda cfg, off: (19, 42 + off)):
+             patch("schedule_resolve.get_sunset_local_time_with_offset",
+                   side_effect=lambda cfg, off, day: (19, 42 + off)):
             return sonos_play.check_play_guard(config, now=now)
 
     # -- Fixed-time schedule (taps @ 22:00) --
@@ -272,6 +272,28 @@ class TestPlayGuardBoundary(unittest.TestCase):
         )
 
 
+class TestPlayGuardPreroll(unittest.TestCase):
+    """With ``preroll_seconds`` the window opens that much earlier, and only earlier."""
+
+    def _guard(self, now, preroll):
+        config = _six_schedule_config()
+        config["play_guard_tolerance_minutes"] = 0
+        config["preroll_seconds"] = preroll
+        with patch("schedule_resolve.get_sunset_local_time", return_value=(19, 42)), \
+             patch("schedule_resolve.get_sunset_local_time_with_offset",
+                   side_effect=lambda cfg, off, day: (19, 42 + off)):
+            return sonos_play.check_play_guard(config, now=now)
+
+    def test_permits_early_start_within_preroll(self):
+        """21:59:40 is 20 s before taps 22:00 → permitted with a 30 s pre-roll."""
+        self.assertTrue(self._guard(datetime(2026, 4, 29, 21, 59, 40), preroll=30))
+        self.assertFalse(self._guard(datetime(2026, 4, 29, 21, 59, 40), preroll=0))
+
+    def test_preroll_does_not_widen_late_side(self):
+        """22:00:20 is 20 s after taps → still refused with zero tolerance."""
+        self.assertFalse(self._guard(datetime(2026, 4, 29, 22, 0, 20), preroll=30))
+
+
 # ---------------------------------------------------------------------------
 # Opt-out / bypass tests
 # ---------------------------------------------------------------------------
@@ -282,7 +304,7 @@ class TestPlayGuardOptOut(unittest.TestCase):
     def _guard_at_midnight(self, extra_config):
         config = _six_schedule_config()
         config.update(extra_config)
-        with patch("schedule_sonos.get_sunset_local_time", return_value=(19, 42)):
+        with patch("schedule_resolve.get_sunset_local_time", return_value=(19, 42)):
             return sonos_play.check_play_guard(config, now=_naive_dt(0, 0, 0))
 
     def test_play_guard_enabled_false_bypasses_check(self):
@@ -319,9 +341,9 @@ class TestPlayGuardOptOut(unittest.TestCase):
         config = _six_schedule_config()
         del config["play_guard_enabled"]
         # At 02:00 with guard enabled (default), guard must refuse
-        with patch("schedule_sonos.get_sunset_local_time", return_value=(19, 42)), \
-             patch("schedule_sonos.get_sunset_local_time_with_offset",
-                   side_effect=lambda cfg, off: (19, 42 + off)):
+        with patch("schedule_resolve.get_sunset_local_time", return_value=(19, 42)), \
+             patch("schedule_resolve.get_sunset_local_time_with_offset",
+                   side_effect=lambda cfg, off, day: (19, 42 + off)):
             result = sonos_play.check_play_guard(config, now=_naive_dt(2, 0, 26))
         self.assertFalse(
             result,
@@ -67,6 +67,8 @@ def _run_reschedule(mock_dt):
          patch("schedule_sonos.load_config", return_value=_base_config()), \
          patch("schedule_sonos._write_unit_file"), \
          patch("schedule_sonos._clean_stale_units", return_value=False), \
+         patch("schedule_sonos.sunset_table.refresh", return_value=False), \
+         patch("schedule_sonos.fire_plan.write", return_value=False), \
          patch("schedule_sonos.get_sunset_local_time", return_value=(19, 39)), \
          patch("schedule_sonos._is_timer_enabled", return_value=True), \
          patch("schedule_sonos._unit_file_content_matches", return_value=False), \
@@ -189,6 +191,8 @@ class TestUnchangedUnitNoRestart(unittest.TestCase):
              patch("schedule_sonos.load_config", return_value=_base_config()), \
              patch("schedule_sonos._write_unit_file"), \
              patch("schedule_sonos._clean_stale_units", return_value=False), \
+             patch("schedule_sonos.sunset_table.refresh", return_value=False), \
+             patch("schedule_sonos.fire_plan.write", return_value=False), \
              patch("schedule_sonos.get_sunset_local_time", return_value=(19, 39)), \
              patch("schedule_sonos._is_timer_enabled", return_value=True), \
              patch("schedule_sonos._unit_file_content_matches", return_value=True), \
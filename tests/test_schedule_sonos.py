@@ -66,6 +66,23 @@ _COMMON_PATCHES = {
 }
 
 
+# main() also writes the sunset table and the fire plan under INSTALL_DIR.
+_INSTALL_DIR_PATCHES = [
+    patch("schedule_sonos.sunset_table.refresh", return_value=False),
+    patch("schedule_sonos.fire_plan.write", return_value=False),
+]
+
+
+def setUpModule():
+    for patcher in _INSTALL_DIR_PATCHES:
+        patcher.start()
+
+
+def tearDownModule():
+    for patcher in _INSTALL_DIR_PATCHES:
+        patcher.stop()
+
+
 def _systemctl_calls(mock_run_systemctl):
     """Return the list of (action, unit) tuples from _run_systemctl mock calls."""
     result = []
@@ -231,6 +248,11 @@ class TestFirstInstallRun(unittest.TestCase):
         self.assertIn(("daemon-reload",), calls,
                       "Expected 'systemctl daemon-reload'")
 
+    def test_playback_daemon_enabled(self):
+        """The resident playback daemon is enabled and started on first install."""
+        calls = self._run_main_first_install()
+        self.assertIn(("enable", "--now", "flag-flagd.service"), calls)
+
 
 # ---------------------------------------------------------------------------
 # P1 optimisation tests: skip no-op restarts when unit files unchanged
@@ -736,6 +758,16 @@ class TestSunsetOffsetDecouplingAndWrap(unittest.TestCase):
         "schedules": [],
     }
 
+    def setUp(self):
+        # Each test patches the astral computation with a different sunset for
+        # the same day and location; drop sunsets memoized by earlier tests.
+        import schedule_resolve
+        schedule_resolve.sunset_on.cache_clear()
+        # ...and never read them from a sunset table left by another test.
+        no_table = patch("schedule_resolve.sunset_table.lookup", return_value=None)
+        no_table.start()
+        self.addCleanup(no_table.stop)
+
     def _make_sun_return(self, hour, minute, tz_name="America/New_York"):
         """
         Return a dict whose ``"sunset"`` key is a timezone-aware datetime
@@ -758,7 +790,7 @@ class TestSunsetOffsetDecouplingAndWrap(unittest.TestCase):
         import schedule_sonos
 
         sun_data = self._make_sun_return(19, 0)
-        with patch("schedule_sonos.sun", return_value=sun_data):
+        with patch("schedule_resolve._astral_sunset", return_value=sun_data["sunset"]):
             h, m = schedule_sonos.get_sunset_local_time_with_offset(
                 self._BASE_CONFIG, -5
             )
@@ -774,7 +806,7 @@ class TestSunsetOffsetDecouplingAndWrap(unittest.TestCase):
 
         # Sunset at 23:50 + 30 minutes crosses midnight
         sun_data = self._make_sun_return(23, 50)
-        with patch("schedule_sonos.sun", return_value=sun_data):
+        with patch("schedule_resolve._astral_sunset", return_value=sun_data["sunset"]):
             with self.assertRaises(ValueError) as ctx:
                 schedule_sonos.get_sunset_local_time_with_offset(
                     self._BASE_CONFIG, 30
@@ -790,7 +822,7 @@ class TestSunsetOffsetDecouplingAndWrap(unittest.TestCase):
 
         # Sunset at 00:30 − 60 minutes crosses back into the previous day
         sun_data = self._make_sun_return(0, 30)
-        with patch("schedule_sonos.sun", return_value=sun_data):
+        with patch("schedule_resolve._astral_sunset", return_value=sun_data["sunset"]):
             with self.assertRaises(ValueError) as ctx:
                 schedule_sonos.get_sunset_local_time_with_offset(
                     self._BASE_CONFIG, -60
@@ -807,7 +839,7 @@ class TestSunsetOffsetDecouplingAndWrap(unittest.TestCase):
         config = dict(self._BASE_CONFIG, sunset_offset_minutes=30)
         # Sunset at 23:50 + 30 min config offset crosses midnight
         sun_data = self._make_sun_return(23, 50)
-        with patch("schedule_sonos.sun", return_value=sun_data):
+        with patch("schedule_resolve._astral_sunset", return_value=sun_data["sunset"]):
             with self.assertRaises(ValueError) as ctx:
                 schedule_sonos.get_sunset_local_time(config)
         self.assertIn("crosses midnight", str(ctx.exception))
@@ -902,6 +934,180 @@ class TestBuildServiceUnitEscapesAudioUrl(unittest.TestCase):
         self.assertIn(url, tokens, "Plain URL must appear as a single token")
 
 
+class TestServiceUnitsUsePlaybackDaemon(unittest.TestCase):
+    """Schedule service units send their plays through flagd.py."""
+
+    def _exec_tokens(self, content):
+        import shlex
+        exec_line = [ln for ln in content.splitlines() if ln.startswith("ExecStart=")][0]
+        return shlex.split(exec_line[len("ExecStart="):])
+
+    def test_fixed_time_unit_runs_flagd_client(self):
+        import schedule_sonos
+        tokens = self._exec_tokens(schedule_sonos._build_service_unit("taps", "http://h/taps.mp3"))
+        self.assertEqual(
+            tokens[1:], [schedule_sonos.FLAGD, "play", "--schedule", "taps", "http://h/taps.mp3"],
+        )
+
+    def test_sunset_unit_passes_sleep_flag_through(self):
+        import schedule_sonos
+        tokens = self._exec_tokens(
+            schedule_sonos._build_sunset_service_unit("retreat", "http://h/retreat.mp3")
+        )
+        self.assertEqual(
+            tokens[1:],
+            [schedule_sonos.FLAGD, "play", "--sleep-until-schedule", "retreat", "http://h/retreat.mp3"],
+        )
+
+    def test_preroll_starts_timer_early_and_passes_fire_time(self):
+        """With a pre-roll the timer fires early and the service plays at the fire time."""
+        import schedule_sonos
+        timer = schedule_sonos._build_timer_unit("colors", 8, 0, preroll_seconds=15)
+        self.assertIn("OnCalendar=*-*-* 07:59:45\n", timer)
+        tokens = self._exec_tokens(
+            schedule_sonos._build_service_unit("colors", "http://h/c.mp3", play_at=(8, 0))
+        )
+        self.assertEqual(
+            tokens[2:], ["play", "--play-at", "08:00", "--schedule", "colors", "http://h/c.mp3"],
+        )
+
+    def test_preroll_wraps_to_previous_day(self):
+        import schedule_sonos
+        self.assertEqual(str(schedule_sonos._timer_start(0, 0, 10)), "23:59:50")
+
+    def test_daemon_unit_is_never_cleaned_up_as_stale(self):
+        import schedule_sonos
+        self.assertIn("flagd", schedule_sonos._RESERVED_NAMES)
+
+
+class TestSequenceEntries(unittest.TestCase):
+    """A ``sequence`` entry plays several clips from one service unit."""
+
+    SEQUENCE = [
+        "http://h/first_call.mp3",
+        {"audio_url": "http://h/colors.mp3", "gap_seconds": 180},
+    ]
+
+    def test_resolve_clips(self):
+        import schedule_sonos
+        self.assertEqual(
+            schedule_sonos.resolve_clips({"audio_url": "http://h/taps.mp3"}),
+            [("http://h/taps.mp3", 0)],
+        )
+        self.assertEqual(
+            schedule_sonos.resolve_clips({"sequence": self.SEQUENCE}),
+            [("http://h/first_call.mp3", 0), ("http://h/colors.mp3", 180)],
+        )
+
+    def test_invalid_sequences_rejected(self):
+        import schedule_sonos
+        for entry in (
+            {},
+            {"sequence": []},
+            {"sequence": ["ftp://h/a.mp3"]},
+            {"sequence": [{"audio_url": "http://h/a.mp3", "gap_seconds": -1}]},
+            {"audio_url": "http://h/a.mp3", "sequence": ["http://h/b.mp3"]},
+        ):
+            with self.subTest(entry=entry), self.assertRaises(ValueError):
+                schedule_sonos.resolve_clips(entry)
+
+    def test_service_unit_passes_clips_and_gaps(self):
+        import shlex
+        import schedule_sonos
+        clips = schedule_sonos.resolve_clips({"sequence": self.SEQUENCE})
+        for content, prefix in (
+            (schedule_sonos._build_service_unit("morning", clips), ["play", "--schedule", "morning"]),
+            (schedule_sonos._build_sunset_service_unit("evening", clips),
+             ["play", "--sleep-until-schedule", "evening"]),
+        ):
+            exec_line = [ln for ln in content.splitlines() if ln.startswith("ExecStart=")][0]
+            tokens = shlex.split(exec_line[len("ExecStart="):])
+            self.assertEqual(
+                tokens[2:],
+                prefix + ["--gaps", "180", "http://h/first_call.mp3", "http://h/colors.mp3"],
+            )
+
+
+class TestScheduleSpeakerSubsets(unittest.TestCase):
+    """Entries may list their own speakers; only same-speaker plays coalesce."""
+
+    def _run_main(self, cfg):
+        import io
+        import schedule_sonos
+        out = io.StringIO()
+        with patch("os.getuid", return_value=0), \
+             patch("schedule_sonos.load_config", return_value=cfg), \
+             patch("schedule_sonos._write_unit_file") as write, \
+             patch("schedule_sonos._clean_stale_units"), \
+             patch("schedule_sonos.get_sunset_local_time", return_value=(19, 39)), \
+             patch("schedule_sonos._is_timer_enabled", return_value=True), \
+             patch("schedule_sonos.datetime", _mock_datetime_before_colors()), \
+             patch("schedule_sonos._run_systemctl"), \
+             patch("sys.stdout", out):
+            schedule_sonos.main()
+        return [c.args[0] for c in write.call_args_list], out.getvalue()
+
+    def _config(self):
+        cfg = _base_config()
+        cfg["speakers"] = [{"ip": "192.168.1.100", "name": "Flagpole"}, {"ip": "192.168.1.101", "name": "Chapel"}]
+        cfg["schedules"] = [
+            {"name": "colors", "time": "08:00", "audio_url": "http://example.com/colors.mp3",
+             "speakers": ["Flagpole"]},
+            {"name": "bell", "time": "08:00", "audio_url": "http://example.com/bell.mp3",
+             "speakers": ["Chapel"]},
+        ]
+        return cfg
+
+    def test_disjoint_speakers_are_not_coalesced(self):
+        written, out = self._run_main(self._config())
+        self.assertIn("/etc/systemd/system/flag-bell.service", written)
+        self.assertIn("on 192.168.1.101", out)
+        self.assertNotIn("🔗", out)
+
+    def test_unknown_speaker_skips_entry(self):
+        cfg = self._config()
+        cfg["schedules"][1]["speakers"] = ["Garage"]
+        written, out = self._run_main(cfg)
+        self.assertNotIn("/etc/systemd/system/flag-bell.service", written)
+        self.assertIn("Skipping 'bell'", out)
+
+
+class TestSolarMemoization(unittest.TestCase):
+    """Sunset is computed once per day and location; the system timezone once per process."""
+
+    def setUp(self):
+        import schedule_resolve
+        schedule_resolve.sunset_on.cache_clear()
+        schedule_resolve.get_system_timezone.cache_clear()
+        self.addCleanup(schedule_resolve.sunset_on.cache_clear)
+        self.addCleanup(schedule_resolve.get_system_timezone.cache_clear)
+
+    def test_entries_share_one_sunset_computation(self):
+        import pytz
+        import schedule_sonos
+        from datetime import date, datetime as dt
+        config = {"latitude": 40.7128, "longitude": -74.0060, "timezone": "America/New_York"}
+        today = date.today()
+        sunset = pytz.timezone("America/New_York").localize(dt(today.year, today.month, today.day, 19, 0))
+        with patch("schedule_resolve.sunset_table.lookup", return_value=None), \
+             patch("schedule_resolve._astral_sunset", return_value=sunset) as sun:
+            times = [
+                schedule_sonos.resolve_fire_time(config, time_str)
+                for time_str in ("sunset-5min", "sunset", "sunset+1min")
+            ]
+        self.assertEqual(times, [(18, 55), (19, 0), (19, 1)])
+        sun.assert_called_once()
+
+    def test_system_timezone_resolved_once(self):
+        import schedule_sonos
+        with patch("schedule_resolve.os.path.exists", return_value=False), \
+             patch("subprocess.check_output",
+                   return_value="Timezone=Europe/Oslo\n") as check_output:
+            zones = [schedule_sonos.get_location({}).timezone for _ in range(3)]
+        self.assertEqual(zones, ["Europe/Oslo"] * 3)
+        check_output.assert_called_once()
+
+
 # ---------------------------------------------------------------------------
 # Bug 6: resolve_schedules rejects non-list / null schedules
 # ---------------------------------------------------------------------------
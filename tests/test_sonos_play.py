@@ -8,6 +8,7 @@ Run with:
 """
 import sys
 import os
+import time
 import unittest
 from unittest.mock import MagicMock, patch, call
 
@@ -45,6 +46,24 @@ def _base_config():
 
 AUDIO_URL = "http://example.com/bugle.mp3"
 
+# A --schedule play marks itself started in the merged-play record, and a play
+# locks its targets' group mates; both live under /run.
+_RUN_DIR = None
+
+
+def setUpModule():
+    import tempfile
+    from admission import PlayAdmission
+    global _RUN_DIR
+    _RUN_DIR = tempfile.TemporaryDirectory()
+    unittest.addModuleCleanup(_RUN_DIR.cleanup)
+    for patcher in (
+        patch("coalesce.MERGED_PLAYS_FILE", os.path.join(_RUN_DIR.name, "flag-merged.json")),
+        patch("sonos_play._admission", PlayAdmission(os.path.join(_RUN_DIR.name, "flag.lock"))),
+    ):
+        patcher.start()
+        unittest.addModuleCleanup(patcher.stop)
+
 # Common patches applied to every test to avoid file-system side effects.
 COMMON_PATCHES = [
     "sonos_play.log",
@@ -366,6 +385,15 @@ class TestRestoreLogic(unittest.TestCase):
         snap = self._run(was_playing=False, skip_restore_if_idle=False)
         snap.restore.assert_called_once()
 
+    def test_idle_group_skips_full_snapshot(self):
+        """was_playing=False + skip_restore_if_idle=True -> no media/queue snapshot at all."""
+        snap = self._run(was_playing=False, skip_restore_if_idle=True)
+        snap.snapshot.assert_not_called()
+
+    def test_playing_group_takes_full_snapshot(self):
+        snap = self._run(was_playing=True, skip_restore_if_idle=True)
+        snap.snapshot.assert_called_once()
+
 
 # ---------------------------------------------------------------------------
 # Volume restoration
@@ -1064,7 +1092,7 @@ class TestPlayUriCalledAfterDurationComputed(unittest.TestCase):
         """get_mp3_duration is invoked before play_uri in Phase 4."""
         call_order = []
 
-        def record_duration(url, default_wait):
+        def record_duration(url, default_wait, audio_port=None):
             call_order.append("duration")
             return 5
 
@@ -1089,5 +1117,1321 @@ class TestPlayUriCalledAfterDurationComputed(unittest.TestCase):
         )
 
 
+# ---------------------------------------------------------------------------
+# Phase 0: concurrent discovery
+# ---------------------------------------------------------------------------
+
+class TestParallelDiscovery(unittest.TestCase):
+    """discover_speakers probes concurrently, keeps config order, honours the deadline."""
+
+    def _speakers(self, names):
+        return {f"192.168.1.{100 + i}": _make_speaker(n, f"uid-{n}") for i, n in enumerate(names)}
+
+    def test_probes_run_concurrently(self):
+        """All probes are in flight at once (a 3-party barrier only releases if so)."""
+        import threading
+        import sonos_play
+
+        speakers = self._speakers(["A", "B", "C"])
+        barrier = threading.Barrier(3, timeout=2)
+        for sp in speakers.values():
+            sp.get_speaker_info.side_effect = lambda refresh: barrier.wait()
+        entries = [(ip, 30) for ip in speakers]
+
+        with patch("sonos_play.soco.SoCo", side_effect=speakers.__getitem__), \
+             patch("sonos_play.log"):
+            reachable, _ = sonos_play.discover_speakers(entries, max_workers=8, timeout=5)
+
+        self.assertEqual(len(reachable), 3)
+
+    def test_configured_order_preserved(self):
+        """reachable[0] is the first configured speaker even when it answers last."""
+        import time as _time
+        import sonos_play
+
+        speakers = self._speakers(["Slow", "Fast"])
+        speakers["192.168.1.100"].get_speaker_info.side_effect = lambda refresh: _time.sleep(0.2)
+        entries = [("192.168.1.100", 40), ("192.168.1.101", 50)]
+
+        with patch("sonos_play.soco.SoCo", side_effect=speakers.__getitem__), \
+             patch("sonos_play.log"):
+            reachable, vol_map = sonos_play.discover_speakers(entries, max_workers=8, timeout=5)
+
+        self.assertEqual([sp.player_name for sp in reachable], ["Slow", "Fast"])
+        self.assertEqual(vol_map, {"192.168.1.100": 40, "192.168.1.101": 50})
+
+    def test_deadline_skips_laggard(self):
+        """A speaker still probing when the deadline expires is skipped."""
+        import threading
+        import sonos_play
+
+        speakers = self._speakers(["Hung", "Online"])
+        release = threading.Event()
+        speakers["192.168.1.100"].get_speaker_info.side_effect = lambda refresh: release.wait(5)
+        entries = [("192.168.1.100", 30), ("192.168.1.101", 30)]
+
+        try:
+            with patch("sonos_play.soco.SoCo", side_effect=speakers.__getitem__), \
+                 patch("sonos_play.log"):
+                reachable, vol_map = sonos_play.discover_speakers(entries, max_workers=8, timeout=0.2)
+        finally:
+            release.set()
+
+        self.assertEqual([sp.player_name for sp in reachable], ["Online"])
+        self.assertNotIn("192.168.1.100", vol_map)
+
+    def test_unreachable_speaker_skipped(self):
+        """A probe that raises is logged and skipped without affecting the others."""
+        import sonos_play
+
+        speakers = self._speakers(["Online"])
+
+        def make(ip):
+            if ip not in speakers:
+                raise OSError("no route to host")
+            return speakers[ip]
+
+        entries = [("192.168.1.250", 30), ("192.168.1.100", 30)]
+        with patch("sonos_play.soco.SoCo", side_effect=make), \
+             patch("sonos_play.log") as mock_log:
+            reachable, _ = sonos_play.discover_speakers(entries, max_workers=2, timeout=5)
+
+        self.assertEqual([sp.player_name for sp in reachable], ["Online"])
+        self.assertTrue(any("192.168.1.250 is unreachable" in c.args[0] for c in mock_log.call_args_list))
+
+
+# ---------------------------------------------------------------------------
+# Play budget: per-phase time limits and laggard dropping
+# ---------------------------------------------------------------------------
+
+class TestPlayBudget(unittest.TestCase):
+    """PlayBudget splits the remaining time across phases in proportion to their shares."""
+
+    def test_phase_shares_of_remaining_time(self):
+        """Discovery gets 4/10 of the budget; unused time rolls forward."""
+        import sonos_play
+
+        with patch("sonos_play.time.monotonic", return_value=100.0):
+            budget = sonos_play.PlayBudget(10, start=100.0)
+            self.assertAlmostEqual(budget.phase_timeout("discovery"), 4.0)
+        # Discovery took only 1 s: 9 s remain for snapshot/teardown/group (2:2:2).
+        with patch("sonos_play.time.monotonic", return_value=101.0):
+            self.assertAlmostEqual(budget.phase_timeout("snapshot"), 3.0)
+
+    def test_overrun_budget_still_gives_minimum(self):
+        """Once the budget is spent every phase still gets _MIN_PHASE_SECS."""
+        import sonos_play
+
+        with patch("sonos_play.time.monotonic", return_value=200.0):
+            budget = sonos_play.PlayBudget(3, start=100.0)
+            self.assertEqual(budget.phase_timeout("group"), sonos_play._MIN_PHASE_SECS)
+
+    def test_no_budget_uses_default(self):
+        """Without a budget, _phase_timeout returns the per-phase default."""
+        import sonos_play
+
+        self.assertIsNone(sonos_play._phase_timeout(None, "snapshot"))
+        self.assertEqual(sonos_play._phase_timeout(None, "discovery", 10), 10)
+
+
+class TestPlayBudgetDropsLaggards(unittest.TestCase):
+    """With play_deadline_seconds set, slow speakers are dropped and the rest play."""
+
+    def setUp(self):
+        import threading
+
+        self.release = threading.Event()
+        self.sp1 = _make_speaker("Speaker 1", "uid-sp1")
+        self.sp1.ip_address = "192.168.1.100"
+        self.sp1.get_current_transport_info.return_value = {"current_transport_state": "STOPPED"}
+        self.sp2 = _make_speaker("Speaker 2", "uid-sp2")
+        self.sp2.ip_address = "192.168.1.101"
+        self.sp2.get_current_transport_info.return_value = {"current_transport_state": "STOPPED"}
+        group = _make_group([self.sp1, self.sp2], self.sp1)
+        self.sp1.group = group
+        self.sp2.group = group
+
+    def tearDown(self):
+        self.release.set()
+
+    def _run(self):
+        cfg = _base_config()
+        cfg["speakers"] = ["192.168.1.100", "192.168.1.101"]
+        cfg["play_deadline_seconds"] = 2
+        with patch("sonos_play.load_config", return_value=cfg), \
+             patch("sonos_play.soco.SoCo", side_effect=lambda ip: self.sp1 if ip.endswith("100") else self.sp2), \
+             patch("sonos_play.Snapshot", return_value=MagicMock()), \
+             patch("sonos_play.get_mp3_duration", return_value=5), \
+             patch("sonos_play.time.sleep"), \
+             patch("sonos_play.log"), \
+             patch("sys.argv", ["sonos_play.py", AUDIO_URL]):
+            import sonos_play
+            sonos_play.main()
+
+    def test_hung_unjoin_drops_coordinator_and_replays_on_next(self):
+        """A coordinator stuck in teardown is dropped; the next speaker plays."""
+        # Speaker 1 is a member of Speaker 2's group, so it must unjoin first.
+        group = _make_group([self.sp2, self.sp1], self.sp2)
+        self.sp1.group = group
+        self.sp2.group = group
+        self.sp1.unjoin.side_effect = lambda: self.release.wait(5)
+        self._run()
+
+        self.sp1.play_uri.assert_not_called()
+        self.sp2.play_uri.assert_called_once_with(AUDIO_URL)
+
+    def test_hung_join_does_not_block_play(self):
+        """A member whose join hangs does not stop the coordinator from playing."""
+        # Standalone speakers, so Speaker 2 has to join the bugle group.
+        self.sp1.group = _make_group([self.sp1], self.sp1)
+        self.sp2.group = _make_group([self.sp2], self.sp2)
+        # Only the first (Phase 3) join hangs; the Phase 6 rejoin returns at once.
+        calls = []
+
+        def hang_first(coord):
+            calls.append(coord)
+            if len(calls) == 1:
+                self.release.wait(5)
+
+        self.sp2.join.side_effect = hang_first
+        self._run()
+
+        self.sp1.play_uri.assert_called_once_with(AUDIO_URL)
+        # It was sent a join, so Phase 5 still unjoins it.
+        self.sp2.unjoin.assert_called()
+
+
+# ---------------------------------------------------------------------------
+# Single ZoneGroupTopology fetch
+# ---------------------------------------------------------------------------
+
+_ZGS_A_B_AND_C = """<ZoneGroupState><ZoneGroups>
+  <ZoneGroup Coordinator="uid-a" ID="uid-a:1">
+    <ZoneGroupMember UUID="uid-a" Location="http://192.168.1.100:1400/xml/device_description.xml" ZoneName="A"/>
+    <ZoneGroupMember UUID="uid-b" Location="http://192.168.1.101:1400/xml/device_description.xml" ZoneName="B"/>
+  </ZoneGroup>
+  <ZoneGroup Coordinator="uid-c" ID="uid-c:1">
+    <ZoneGroupMember UUID="uid-c" Location="http://192.168.1.102:1400/xml/device_description.xml" ZoneName="C"/>
+  </ZoneGroup>
+</ZoneGroups></ZoneGroupState>"""
+
+
+class TestSingleTopologyFetch(unittest.TestCase):
+    """Phases 1, 2 and 6 work from one GetZoneGroupState call, never sp.group."""
+
+    def setUp(self):
+        from unittest.mock import PropertyMock
+
+        self.speakers = {}
+        for ip, name in (("192.168.1.100", "A"), ("192.168.1.101", "B"), ("192.168.1.102", "C")):
+            sp = _make_speaker(name, f"uid-{name.lower()}")
+            sp.ip_address = ip
+            sp.get_current_transport_info.return_value = {"current_transport_state": "PLAYING"}
+            sp.zoneGroupTopology.GetZoneGroupState.return_value = {"ZoneGroupState": _ZGS_A_B_AND_C}
+            type(sp).group = PropertyMock(side_effect=AssertionError(f"{name}.group queried"))
+            self.speakers[ip] = sp
+        self.a, self.b, self.c = self.speakers.values()
+
+    def test_topology_read_once_and_reused(self):
+        cfg = _base_config()
+        cfg["speakers"] = list(self.speakers)
+        snaps = []
+
+        def make_snap(coord):
+            snap = MagicMock()
+            snap.coordinator = coord
+            snaps.append(snap)
+            return snap
+
+        with patch("sonos_play.load_config", return_value=cfg), \
+             patch("sonos_play.soco.SoCo", side_effect=self.speakers.__getitem__), \
+             patch("sonos_play.Snapshot", side_effect=make_snap), \
+             patch("sonos_play.get_mp3_duration", return_value=5), \
+             patch("sonos_play._settle") as mock_settle, \
+             patch("sonos_play.time.sleep"), \
+             patch("sonos_play.log"), \
+             patch("sys.argv", ["sonos_play.py", AUDIO_URL]):
+            import sonos_play
+            sonos_play.main()
+
+        # The settle checks re-read the topology on purpose (covered by
+        # TestTopologySettle); everything else uses the single read.
+        self.assertEqual(mock_settle.call_count, 3)
+        calls = sum(sp.zoneGroupTopology.GetZoneGroupState.call_count for sp in self.speakers.values())
+        self.assertEqual(calls, 1)
+        # One snapshot per pre-existing group coordinator (A and C).
+        self.assertEqual({snap.coordinator.player_name for snap in snaps}, {"A", "C"})
+        # B was already grouped with A (the bugle coordinator): left in place.
+        self.b.unjoin.assert_not_called()
+        self.b.join.assert_not_called()
+        # C was standalone: joins A for the call, unjoins afterwards.
+        self.c.join.assert_called_once_with(self.a)
+        self.c.unjoin.assert_called_once_with()
+        self.a.play_uri.assert_called_once_with(AUDIO_URL)
+
+
+class TestWaitForPlaybackEnd(unittest.TestCase):
+    """Phase 4 ends when the coordinator's transport leaves PLAYING, not on a timer."""
+
+    def _coordinator(self, states):
+        coord = _make_speaker("Coord")
+        coord.ip_address = "192.168.1.100"
+        coord.get_current_transport_info.side_effect = [
+            {"current_transport_state": s} for s in states
+        ]
+        return coord
+
+    def test_ends_when_transport_stops(self):
+        """A short clip (duration misread as 60 s) ends as soon as it stops."""
+        import sonos_play
+
+        coord = self._coordinator(["TRANSITIONING", "PLAYING", "PLAYING", "STOPPED"])
+        with patch("sonos_play.time.sleep") as mock_sleep:
+            state, elapsed = sonos_play.wait_for_playback_end(coord, 60, 75)
+        self.assertEqual(state, "STOPPED")
+        self.assertEqual(coord.get_current_transport_info.call_count, 4)
+        self.assertLess(elapsed, 60)
+        self.assertNotIn(call(1), mock_sleep.call_args_list)
+
+    def test_idle_before_start_is_not_trusted(self):
+        """STOPPED seen before PLAYING within the start grace does not end the wait."""
+        import sonos_play
+
+        coord = self._coordinator(["STOPPED", "PLAYING", "PAUSED_PLAYBACK"])
+        with patch("sonos_play.time.sleep"):
+            state, _ = sonos_play.wait_for_playback_end(coord, 10, 25)
+        self.assertEqual(state, "PAUSED_PLAYBACK")
+        self.assertEqual(coord.get_current_transport_info.call_count, 3)
+
+    def test_max_wait_bounds_a_stuck_transport(self):
+        """A transport that never leaves PLAYING is abandoned at max_secs."""
+        import sonos_play
+
+        coord = _make_speaker("Coord")
+        coord.get_current_transport_info.return_value = {"current_transport_state": "PLAYING"}
+        with patch("sonos_play.time.sleep") as mock_sleep:
+            state, elapsed = sonos_play.wait_for_playback_end(coord, 30, 45)
+        self.assertIsNone(state)
+        self.assertAlmostEqual(elapsed, 45)
+        self.assertAlmostEqual(sum(c.args[0] for c in mock_sleep.call_args_list), 45)
+        # Slow polls mid-clip: far fewer than one per fast interval.
+        self.assertLess(mock_sleep.call_count, 45 / sonos_play._END_POLL_FAST_SECS / 2)
+
+    def test_events_fall_back_to_polling(self):
+        """If the AVTransport subscription fails, transport state is polled instead."""
+        import sonos_play
+
+        coord = self._coordinator(["PLAYING", "STOPPED"])
+        coord.avTransport.subscribe.side_effect = OSError("no event listener")
+        with patch("sonos_play.time.sleep"), patch("sonos_play.log"):
+            state, _ = sonos_play.wait_for_playback_end(coord, 10, 25, use_events=True)
+        self.assertEqual(state, "STOPPED")
+
+    def test_events_path_unsubscribes(self):
+        """The event path ends on an idle transport_state event and unsubscribes."""
+        import queue
+        import sonos_play
+
+        coord = _make_speaker("Coord")
+        sub = MagicMock()
+        events = queue.Queue()
+        for state in ("PLAYING", "STOPPED"):
+            events.put(MagicMock(variables={"transport_state": state}))
+        sub.events = events
+        coord.avTransport.subscribe.return_value = sub
+        state, _ = sonos_play.wait_for_playback_end(coord, 10, 25, use_events=True)
+        self.assertEqual(state, "STOPPED")
+        sub.unsubscribe.assert_called_once()
+        coord.get_current_transport_info.assert_not_called()
+
+
+# ---------------------------------------------------------------------------
+# MP3 duration from the header via an HTTP Range request
+# ---------------------------------------------------------------------------
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, stereo, no padding: 417-byte frames.
+_CBR_FRAME = b"\xff\xfb\x90\x00" + b"\x00" * 413
+
+
+def _xing_frame(frames):
+    """Return a first frame carrying a Xing header that declares *frames* frames."""
+    body = b"\x00" * 32 + b"Xing" + (1).to_bytes(4, "big") + frames.to_bytes(4, "big")
+    return b"\xff\xfb\x90\x00" + body + b"\x00" * (413 - len(body))
+
+
+def _id3_tag(size):
+    """Return an ID3v2.4 tag with *size* bytes of (padding) payload."""
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x04\x00\x00" + syncsafe + b"\x00" * size
+
+
+class _RangeServer:
+    """Fake ``urlopen`` serving *payload*, honouring Range requests if asked to."""
+
+    def __init__(self, payload, honour_range=True):
+        self.payload = payload
+        self.honour_range = honour_range
+        self.ranges = []
+
+    def __call__(self, req, timeout=None):
+        import io
+        headers = getattr(req, "headers", {})
+        rng = headers.get("Range")
+        self.ranges.append(rng)
+        response = MagicMock()
+        if rng and self.honour_range:
+            start, end = (int(x) for x in rng.split("=")[1].split("-"))
+            body = self.payload[start:end + 1]
+            response.status = 206
+            response.headers = {"Content-Range": f"bytes {start}-{end}/{len(self.payload)}"}
+        else:
+            body = self.payload
+            response.status = 200
+            response.headers = {"Content-Length": str(len(self.payload))}
+        stream = io.BytesIO(body)
+        response.read.side_effect = stream.read
+        response.__enter__.return_value = response
+        return response
+
+
+class TestHeaderOnlyDuration(unittest.TestCase):
+    """get_mp3_duration reads the length from the first frames, not the whole file."""
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        cache_patch = patch("sonos_play.DURATION_CACHE_FILE",
+                            os.path.join(self.tmpdir.name, "duration_cache.json"))
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+
+    def test_cbr_length_from_bitrate_and_size(self):
+        """CBR: bitrate × Content-Range total, from a single Range request."""
+        import sonos_play
+
+        payload = _CBR_FRAME * 1500  # 625,500 bytes at 128 kbit/s ≈ 39.1 s
+        server = _RangeServer(payload)
+        with patch("sonos_play.urllib.request.urlopen", side_effect=server), \
+             patch("sonos_play._download_duration") as mock_download:
+            result = sonos_play.get_mp3_duration(AUDIO_URL, 60)
+        self.assertEqual(result, 39)
+        self.assertEqual(server.ranges, [f"bytes=0-{sonos_play._HEADER_PROBE_BYTES - 1}"])
+        mock_download.assert_not_called()
+
+    def test_xing_frame_count_after_large_id3_tag(self):
+        """A Xing header past a tag bigger than the probe is found with a second Range request."""
+        import sonos_play
+
+        tag = _id3_tag(40000)
+        payload = tag + _xing_frame(2000) + _CBR_FRAME * 10  # 2000 × 1152 / 44100 ≈ 52.2 s
+        server = _RangeServer(payload)
+        with patch("sonos_play.urllib.request.urlopen", side_effect=server), \
+             patch("sonos_play._download_duration") as mock_download:
+            result = sonos_play.get_mp3_duration(AUDIO_URL, 60)
+        self.assertEqual(result, 52)
+        self.assertEqual(len(server.ranges), 2)
+        self.assertTrue(server.ranges[1].startswith(f"bytes={len(tag)}-"))
+        mock_download.assert_not_called()
+
+    def test_server_ignoring_range_reads_only_the_prefix(self):
+        """A 200 response still works from the first bytes and Content-Length."""
+        import sonos_play
+
+        server = _RangeServer(_CBR_FRAME * 1500, honour_range=False)
+        with patch("sonos_play.urllib.request.urlopen", side_effect=server), \
+             patch("sonos_play._download_duration") as mock_download:
+            self.assertEqual(sonos_play.get_mp3_duration(AUDIO_URL, 60), 39)
+        mock_download.assert_not_called()
+
+    def test_inconclusive_header_falls_back_to_full_download(self):
+        """Bytes that do not sync to MPEG frames fall back to the full download."""
+        import sonos_play
+
+        server = _RangeServer(b"\x00" * 50000)
+        with patch("sonos_play.urllib.request.urlopen", side_effect=server), \
+             patch("sonos_play._download_duration", return_value=(12.5, 50000, {})) as mock_download:
+            self.assertEqual(sonos_play.get_mp3_duration(AUDIO_URL, 60), 12)
+        mock_download.assert_called_once_with(AUDIO_URL)
+
+    def test_rejected_range_falls_back_to_full_download(self):
+        """An HTTP error on the Range request falls back to the full download."""
+        import urllib.error
+        import sonos_play
+
+        err = urllib.error.HTTPError(AUDIO_URL, 416, "Range Not Satisfiable", {}, None)
+        with patch("sonos_play.urllib.request.urlopen", side_effect=err), \
+             patch("sonos_play._download_duration", return_value=(30.0, 50000, {})) as mock_download:
+            self.assertEqual(sonos_play.get_mp3_duration(AUDIO_URL, 60), 30)
+        mock_download.assert_called_once_with(AUDIO_URL)
+
+
+class TestLocalAudioFastPath(unittest.TestCase):
+    """URLs served by our own audio server are measured from AUDIO_DIR directly."""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        shutil.copy(os.path.join(repo, "audio", "carry_on.mp3"), self.tmpdir.name)
+        for target, value in (("sonos_play.AUDIO_DIR", self.tmpdir.name),
+                              ("sonos_play._LOCAL_DURATIONS", {})):
+            p = patch(target, value)
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_local_url_reads_file_without_network(self):
+        import sonos_play
+
+        with patch("sonos_play.urllib.request.urlopen") as mock_open:
+            result = sonos_play.get_mp3_duration(
+                "http://localhost:8000/carry_on.mp3", 60, audio_port=8000)
+        self.assertEqual(result, 4)
+        mock_open.assert_not_called()
+
+    def test_duration_memoized_by_inode_and_mtime(self):
+        import sonos_play
+
+        path = os.path.join(self.tmpdir.name, "carry_on.mp3")
+        with patch("sonos_play.MP3", wraps=sonos_play.MP3) as mock_mp3:
+            sonos_play._local_file_duration(path)
+            sonos_play._local_file_duration(path)
+            self.assertEqual(mock_mp3.call_count, 1)
+            os.utime(path, ns=(0, 10**18))
+            sonos_play._local_file_duration(path)
+            self.assertEqual(mock_mp3.call_count, 2)
+
+    def test_non_local_urls_are_not_mapped(self):
+        import sonos_play
+
+        local = sonos_play._local_audio_path
+        self.assertIsNone(local("http://localhost:9000/carry_on.mp3", 8000))
+        self.assertIsNone(local("http://localhost:8000/missing.mp3", 8000))
+        self.assertIsNone(local("http://localhost:8000/../carry_on.mp3", 8000))
+        self.assertIsNone(local("http://192.0.2.1:8000/carry_on.mp3", 8000))
+        self.assertEqual(local("http://127.0.0.1:8000/carry%5Fon.mp3", 8000),
+                         os.path.realpath(os.path.join(self.tmpdir.name, "carry_on.mp3")))
+
+
+class TestBackgroundDurationLookup(unittest.TestCase):
+    """The duration lookup runs concurrently with discovery and grouping."""
+
+    def setUp(self):
+        self.speaker = _make_speaker("Living Room", "uid-lr")
+        self.speaker.group = _make_group([self.speaker], self.speaker)
+        self.speaker.get_current_transport_info.return_value = {"current_transport_state": "STOPPED"}
+
+    def _run_main(self, duration_side_effect, soco_side_effect=None):
+        with patch("sonos_play.load_config", return_value=_base_config()), \
+             patch("sonos_play.soco.SoCo", side_effect=soco_side_effect or (lambda ip: self.speaker)), \
+             patch("sonos_play.Snapshot", return_value=MagicMock()), \
+             patch("sonos_play.get_mp3_duration", side_effect=duration_side_effect), \
+             patch("sonos_play.wait_for_playback_end", return_value=("STOPPED", 1.0)) as mock_wait, \
+             patch("sonos_play.time.sleep"), \
+             patch("sonos_play.log") as mock_log, \
+             patch("sys.argv", ["sonos_play.py", AUDIO_URL]):
+            import sonos_play
+            sonos_play.main()
+        return mock_wait, mock_log
+
+    def test_lookup_starts_before_discovery(self):
+        """get_mp3_duration is already running when the first speaker is probed."""
+        import threading
+        lookup_started = threading.Event()
+        seen_at_discovery = []
+
+        def duration(url, default_wait, audio_port=None):
+            lookup_started.set()
+            return 7
+
+        def probe(ip):
+            seen_at_discovery.append(lookup_started.wait(timeout=2))
+            return self.speaker
+
+        mock_wait, _ = self._run_main(duration, probe)
+        self.assertEqual(seen_at_discovery, [True])
+        self.speaker.play_uri.assert_called_once_with(AUDIO_URL)
+        # duration + 1 is the expected length passed to the end-of-playback wait.
+        self.assertEqual(mock_wait.call_args.args[1], 8)
+
+    def test_unfinished_lookup_falls_back_to_default_wait(self):
+        """A lookup still running at Phase 4 is abandoned after a short wait."""
+        import threading
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow_duration(url, default_wait, audio_port=None):
+            release.wait(timeout=5)
+            return 7
+
+        with patch("sonos_play._AUDIO_FETCH_TIMEOUT_SECS", 0.05):
+            mock_wait, mock_log = self._run_main(slow_duration)
+        self.assertEqual(mock_wait.call_args.args[1], 61)
+        self.speaker.play_uri.assert_called_once_with(AUDIO_URL)
+        self.assertTrue(any("duration lookup not finished" in c.args[0]
+                            for c in mock_log.call_args_list))
+
+
+    def test_play_uri_does_not_wait_for_lookup(self):
+        """play_uri goes out first; the duration is collected afterwards for the wait."""
+        import threading
+        played = threading.Event()
+        self.speaker.play_uri.side_effect = lambda url: played.set()
+
+        def duration_after_play(url, default_wait, audio_port=None):
+            played.wait(timeout=2)
+            return 7
+
+        with patch("sonos_play._AUDIO_FETCH_TIMEOUT_SECS", 1):
+            mock_wait, _ = self._run_main(duration_after_play)
+        self.assertTrue(played.is_set())
+        self.assertEqual(mock_wait.call_args.args[1], 8)
+
+
+class TestTopologySettle(unittest.TestCase):
+    """Join/unjoin steps wait for the topology to confirm instead of sleeping 1 s."""
+
+    _SOLO = """<ZoneGroupState><ZoneGroups>
+  <ZoneGroup Coordinator="uid-a" ID="uid-a:1"><ZoneGroupMember UUID="uid-a" ZoneName="A"/></ZoneGroup>
+  <ZoneGroup Coordinator="uid-b" ID="uid-b:1"><ZoneGroupMember UUID="uid-b" ZoneName="B"/></ZoneGroup>
+</ZoneGroups></ZoneGroupState>"""
+    _GROUPED = """<ZoneGroupState><ZoneGroups>
+  <ZoneGroup Coordinator="uid-a" ID="uid-a:1">
+    <ZoneGroupMember UUID="uid-a" ZoneName="A"/><ZoneGroupMember UUID="uid-b" ZoneName="B"/>
+  </ZoneGroup>
+</ZoneGroups></ZoneGroupState>"""
+
+    def _speaker(self, payloads):
+        sp = _make_speaker("A", "uid-a")
+        sp.zoneGroupTopology.GetZoneGroupState.side_effect = [
+            {"ZoneGroupState": p} for p in payloads
+        ]
+        return sp
+
+    def test_returns_as_soon_as_join_is_visible(self):
+        """Two reads: the first still shows B solo, the second shows B under A."""
+        import sonos_play
+
+        sp = self._speaker([self._SOLO, self._GROUPED])
+        with patch("sonos_play.time.sleep") as mock_sleep, patch("sonos_play.log") as mock_log:
+            elapsed = sonos_play._settle(sp, {"uid-b": "uid-a"}, 3, "bugle group join")
+        self.assertEqual([c.args[0] for c in mock_sleep.call_args_list], [sonos_play._SETTLE_POLL_SECS])
+        self.assertAlmostEqual(elapsed, sonos_play._SETTLE_POLL_SECS, places=2)
+        self.assertIn("confirmed after bugle group join", mock_log.call_args.args[0])
+
+    def test_gives_up_at_cap(self):
+        """A topology that never confirms is abandoned after the cap, with a warning."""
+        import sonos_play
+
+        sp = self._speaker([self._GROUPED] * 50)
+        with patch("sonos_play.time.sleep") as mock_sleep, patch("sonos_play.log") as mock_log:
+            elapsed = sonos_play._settle(sp, {"uid-b": "uid-b"}, 1, "unjoin")
+        self.assertAlmostEqual(elapsed, 1)
+        self.assertAlmostEqual(sum(c.args[0] for c in mock_sleep.call_args_list), 1)
+        self.assertTrue(mock_log.call_args.args[0].startswith("WARNING:"))
+
+    def test_unreadable_topology_falls_back_to_fixed_pause(self):
+        """If GetZoneGroupState fails, the old fixed 1 s pause is used."""
+        import sonos_play
+
+        sp = _make_speaker("A", "uid-a")
+        sp.zoneGroupTopology.GetZoneGroupState.side_effect = Exception("501")
+        with patch("sonos_play.time.sleep") as mock_sleep, patch("sonos_play.log"):
+            sonos_play._settle(sp, {"uid-b": "uid-a"}, 3, "rejoin")
+        mock_sleep.assert_called_once_with(sonos_play._FALLBACK_SETTLE_SECS)
+
+    def test_nothing_to_confirm_costs_nothing(self):
+        import sonos_play
+
+        sp = _make_speaker("A", "uid-a")
+        with patch("sonos_play.time.sleep") as mock_sleep:
+            self.assertEqual(sonos_play._settle(sp, {}, 3, "rejoin"), 0.0)
+        mock_sleep.assert_not_called()
+        sp.zoneGroupTopology.GetZoneGroupState.assert_not_called()
+
+
+class TestParallelSnapshots(unittest.TestCase):
+    """Phase 1 snapshots every pre-existing group coordinator concurrently."""
+
+    def setUp(self):
+        self.speakers = {}
+        for i, name in enumerate(("A", "B", "C")):
+            sp = _make_speaker(name, f"uid-{name.lower()}")
+            sp.ip_address = f"192.168.1.{100 + i}"
+            sp.group = _make_group([sp], sp)
+            sp.get_current_transport_info.return_value = {"current_transport_state": "PLAYING"}
+            self.speakers[sp.ip_address] = sp
+
+    def _run(self, make_snapshot):
+        cfg = _base_config()
+        cfg["speakers"] = list(self.speakers)
+        with patch("sonos_play.load_config", return_value=cfg), \
+             patch("sonos_play.soco.SoCo", side_effect=self.speakers.__getitem__), \
+             patch("sonos_play.Snapshot", side_effect=make_snapshot), \
+             patch("sonos_play.get_mp3_duration", return_value=5), \
+             patch("sonos_play.time.sleep"), \
+             patch("sonos_play.log") as mock_log, \
+             patch("sys.argv", ["sonos_play.py", AUDIO_URL]):
+            import sonos_play
+            sonos_play.main()
+        return mock_log
+
+    def test_snapshots_overlap(self):
+        """All three snapshots are in flight at once (a barrier would time out if serial)."""
+        import threading
+        barrier = threading.Barrier(3, timeout=2)
+        snaps = []
+
+        def make_snapshot(coord):
+            snap = MagicMock()
+            snap.snapshot.side_effect = barrier.wait
+            snaps.append(snap)
+            return snap
+
+        self._run(make_snapshot)
+        self.assertFalse(barrier.broken)
+        self.assertEqual(len(snaps), 3)
+        for snap in snaps:
+            snap.restore.assert_called_once()
+
+    def test_failed_snapshot_is_isolated(self):
+        """One coordinator failing to snapshot does not affect the others."""
+        snaps = {}
+
+        def make_snapshot(coord):
+            snap = MagicMock()
+            if coord.player_name == "B":
+                snap.snapshot.side_effect = RuntimeError("SOAP fault")
+            snaps[coord.player_name] = snap
+            return snap
+
+        mock_log = self._run(make_snapshot)
+        snaps["A"].restore.assert_called_once()
+        snaps["C"].restore.assert_called_once()
+        snaps["B"].restore.assert_not_called()
+        self.assertTrue(any("Could not snapshot group of uid-b" in c.args[0]
+                            for c in mock_log.call_args_list))
+        for sp in self.speakers.values():
+            self.assertEqual(sp.volume, 30)
+
+
+class TestConcurrentRestore(unittest.TestCase):
+    """Phase 6 restores groups concurrently; each group stays rejoin-then-restore."""
+
+    def setUp(self):
+        self.speakers = {}
+        for i, name in enumerate(("A", "B", "C")):
+            sp = _make_speaker(name, f"uid-{name.lower()}")
+            sp.ip_address = f"192.168.1.{100 + i}"
+            sp.group = _make_group([sp], sp)
+            sp.get_current_transport_info.return_value = {"current_transport_state": "PLAYING"}
+            self.speakers[sp.ip_address] = sp
+
+    def test_bugle_coordinator_restores_after_other_groups_regroup(self):
+        """The other groups restore together; the bugle coordinator's group waits until they have left it."""
+        import threading
+        barrier = threading.Barrier(2, timeout=2)
+        lock = threading.Lock()
+        events = []
+        snaps = []
+
+        def record(event):
+            with lock:
+                events.append(event)
+
+        for sp in self.speakers.values():
+            sp.unjoin.side_effect = lambda uid=sp.uid: record(("unjoin", uid))
+
+        def make_snapshot(coord):
+            snap = MagicMock()
+
+            def restore():
+                if not coord.play_uri.called:
+                    barrier.wait()
+                record(("restore", coord.uid))
+
+            snap.restore.side_effect = restore
+            snaps.append(snap)
+            return snap
+
+        cfg = _base_config()
+        cfg["speakers"] = list(self.speakers)
+        with patch("sonos_play.load_config", return_value=cfg), \
+             patch("sonos_play.soco.SoCo", side_effect=self.speakers.__getitem__), \
+             patch("sonos_play.Snapshot", side_effect=make_snapshot), \
+             patch("sonos_play.get_mp3_duration", return_value=5), \
+             patch("sonos_play.time.sleep"), \
+             patch("sonos_play.log") as mock_log, \
+             patch("sys.argv", ["sonos_play.py", AUDIO_URL]):
+            import sonos_play
+            sonos_play.main()
+
+        self.assertFalse(barrier.broken)
+        for snap in snaps:
+            snap.restore.assert_called_once()
+        bugle_uid = next(sp.uid for sp in self.speakers.values() if sp.play_uri.called)
+        others = {sp.uid for sp in self.speakers.values()} - {bugle_uid}
+        bugle_restore = events.index(("restore", bugle_uid))
+        for uid in others:
+            self.assertLess(events.index(("unjoin", uid)), bugle_restore)
+        messages = [c.args[0] for c in mock_log.call_args_list]
+        for uid in ("uid-a", "uid-b", "uid-c"):
+            self.assertTrue(any(m.startswith(f"INFO: Group {uid} restored after") for m in messages))
+
+    def _restore(self, coord, members, info):
+        import sonos_play
+        from sonos_topology import Topology
+        topology = Topology()
+        topology.add_group(coord.uid, [(coord.uid, None, None)])
+        topology.bind([coord] + members)
+        with patch("sonos_play._settle"), patch("sonos_play.log"):
+            return sonos_play._restore_group(
+                coord.uid, info, True, [m.uid for m in members], topology, 3, False,
+            )
+
+    def test_unjoin_and_rejoin_precede_restore(self):
+        """Within a group: coordinator unjoins, members rejoin, then the snapshot restores."""
+        order = MagicMock()
+        coord = _make_speaker("A", "uid-a")
+        member = _make_speaker("B", "uid-b")
+        order.attach_mock(coord.unjoin, "unjoin")
+        order.attach_mock(member.join, "join")
+        snap = MagicMock()
+        order.attach_mock(snap.restore, "restore")
+        info = {"snapshot": snap, "was_playing": True, "coordinator_speaker": coord}
+
+        secs = self._restore(coord, [member], info)
+
+        self.assertEqual([c[0] for c in order.mock_calls], ["unjoin", "join", "restore"])
+        self.assertGreaterEqual(secs, 0.0)
+
+    def test_failed_coordinator_unjoin_skips_rejoin_and_restore(self):
+        """Nothing is joined to or restored on a coordinator still in the bugle group."""
+        coord = _make_speaker("A", "uid-a")
+        coord.unjoin.side_effect = RuntimeError("SOAP fault")
+        member = _make_speaker("B", "uid-b")
+        snap = MagicMock()
+        info = {"snapshot": snap, "was_playing": True, "coordinator_speaker": coord}
+
+        self._restore(coord, [member], info)
+
+        member.join.assert_not_called()
+        snap.restore.assert_not_called()
+
+
+class TestPreroll(unittest.TestCase):
+    """--play-at prepares the speakers early and holds play_uri until the fire time."""
+
+    def test_deadline_wraps_past_midnight(self):
+        """A unit pre-rolled at 23:59:50 plays at 00:00 the next day, 10 s later."""
+        import sonos_play
+        from datetime import datetime as _dt
+        before = time.monotonic()
+        deadline = sonos_play._play_at_deadline({}, "00:00", now=_dt(2026, 4, 29, 23, 59, 50))
+        self.assertAlmostEqual(deadline - before, 10, delta=1)
+
+    def test_fire_time_too_far_ahead_is_not_waited_for(self):
+        import sonos_play
+        from datetime import datetime as _dt
+        with patch("sonos_play.log"):
+            self.assertIsNone(
+                sonos_play._play_at_deadline({}, "08:00", now=_dt(2026, 4, 29, 7, 50, 0))
+            )
+
+    def test_play_uri_waits_for_deadline(self):
+        """Phases 0–3 run first; play_uri follows a sleep up to the fire time."""
+        import sonos_play
+        speaker = _make_speaker("Living Room", "uid-lr")
+        speaker.group = _make_group([speaker], speaker)
+        speaker.get_current_transport_info.return_value = {"current_transport_state": "STOPPED"}
+        events = []
+        speaker.play_uri.side_effect = lambda url: events.append("play_uri")
+
+        def record_sleep(secs):
+            events.append(("sleep", secs))
+
+        with patch("sonos_play.load_config", return_value=_base_config()), \
+             patch("sonos_play.soco.SoCo", return_value=speaker), \
+             patch("sonos_play.Snapshot", return_value=MagicMock()), \
+             patch("sonos_play.get_mp3_duration", return_value=5), \
+             patch("sonos_play._play_at_deadline", side_effect=lambda cfg, at: time.monotonic() + 8), \
+             patch("sonos_play.time.sleep", side_effect=record_sleep), \
+             patch("sonos_play.log"):
+            sonos_play.main(["--ignore-guard", "--play-at", "08:00", AUDIO_URL])
+
+        play_index = events.index("play_uri")
+        hold = events[play_index - 1]
+        self.assertEqual(hold[0], "sleep")
+        self.assertAlmostEqual(hold[1], 8, delta=1)
+
+    def test_budget_counts_from_fire_time(self):
+        """A pre-roll longer than play_deadline_seconds does not use up the budget early."""
+        import sonos_play
+        cfg = _base_config()
+        cfg["play_deadline_seconds"] = 3
+        timeouts = []
+
+        def discover(entries, workers, timeout):
+            timeouts.append(timeout)
+            return [], {}
+
+        with patch("sonos_play.load_config", return_value=cfg), \
+             patch("sonos_play.discover_speakers", side_effect=discover), \
+             patch("sonos_play.get_mp3_duration", return_value=5), \
+             patch("sonos_play._play_at_deadline", side_effect=lambda cfg, at: time.monotonic() + 8), \
+             patch("sonos_play.log"):
+            with self.assertRaises(SystemExit):
+                sonos_play.main(["--ignore-guard", "--play-at", "08:00", AUDIO_URL])
+
+        # Discovery's share (4 of 10) of the ~11 s left until fire time + 3 s.
+        self.assertAlmostEqual(timeouts[0], 4.4, delta=0.5)
+
+
+class TestPlayRecordsLatency(unittest.TestCase):
+    """A play times each speaker operation and saves the samples."""
+
+    def test_main_records_operations(self):
+        import tempfile
+        import sonos_play
+        from latency_stats import LatencyStats
+
+        speaker = _make_speaker("Living Room", "uid-lr")
+        speaker.ip_address = "192.168.1.100"
+        speaker.group = _make_group([speaker], speaker)
+        speaker.get_current_transport_info.return_value = {"current_transport_state": "PLAYING"}
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "latency_stats.json")
+            with patch("sonos_play.LATENCY_STATS_FILE", path), \
+                 patch("sonos_play.load_config", return_value=_base_config()), \
+                 patch("sonos_play.soco.SoCo", return_value=speaker), \
+                 patch("sonos_play.Snapshot", return_value=MagicMock()), \
+                 patch("sonos_play.get_mp3_duration", return_value=5), \
+                 patch("sonos_play.time.sleep"), \
+                 patch("sonos_play.log"):
+                sonos_play.main(["--ignore-guard", AUDIO_URL])
+            stats = LatencyStats.load(path)
+
+        for op in ("speaker_info", "snapshot", "pause", "volume", "play_uri", "stop", "restore"):
+            self.assertTrue(stats.samples("192.168.1.100", op), f"no samples for {op}")
+        self.assertIsNone(sonos_play._latency)
+
+    def test_aborted_play_stops_recording(self):
+        """Every abort after discovery starts releases the play's hold on the statistics."""
+        import tempfile
+        import sonos_play
+
+        speaker = _make_speaker("Living Room", "uid-lr")
+        speaker.ip_address = "192.168.1.100"
+        aborts = {
+            "unreachable": patch("sonos_play.discover_speakers", return_value=([], {})),
+            "topology error": patch("sonos_play.load_topology", side_effect=RuntimeError("no topology")),
+        }
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for what, abort in aborts.items():
+                with self.subTest(abort=what), abort, \
+                     patch("sonos_play.LATENCY_STATS_FILE", os.path.join(tmpdir, "latency_stats.json")), \
+                     patch("sonos_play.load_config", return_value=_base_config()), \
+                     patch("sonos_play.soco.SoCo", return_value=speaker), \
+                     patch("sonos_play.get_mp3_duration", return_value=5), \
+                     patch("sonos_play.log"):
+                    with self.assertRaises((SystemExit, RuntimeError)):
+                        sonos_play.main(["--ignore-guard", AUDIO_URL])
+                    self.assertEqual(sonos_play._latency_users, 0)
+                    self.assertIsNone(sonos_play._latency)
+
+
+
+_ZGS_A_WIRELESS_B_WIRED = """<ZoneGroupState><ZoneGroups>
+  <ZoneGroup Coordinator="uid-a" ID="uid-a:1">
+    <ZoneGroupMember UUID="uid-a" Location="http://192.168.1.100:1400/xml/device_description.xml" ZoneName="A" EthLink="0"/>
+  </ZoneGroup>
+  <ZoneGroup Coordinator="uid-b" ID="uid-b:1">
+    <ZoneGroupMember UUID="uid-b" Location="http://192.168.1.101:1400/xml/device_description.xml" ZoneName="B" EthLink="1"/>
+  </ZoneGroup>
+</ZoneGroups></ZoneGroupState>"""
+
+
+class TestCoordinatorElection(unittest.TestCase):
+    """The bugle coordinator is elected by hardware, link and response time."""
+
+    def setUp(self):
+        import tempfile
+        from latency_stats import LatencyStats
+        from sonos_topology import Topology
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.stats = LatencyStats(os.path.join(tmpdir.name, "latency_stats.json"))
+        self.topology = Topology()
+        self.speakers = []
+        for i, name in enumerate("ABC"):
+            sp = _make_speaker(name, f"uid-{name.lower()}")
+            sp.ip_address = f"192.168.1.{100 + i}"
+            sp.speaker_info = {"model_number": "S16"}
+            self.speakers.append(sp)
+        self.a, self.b, self.c = self.speakers
+
+    def _ranked(self):
+        import sonos_play
+        ranked, _ = sonos_play.rank_coordinators(self.speakers, self.topology, self.stats)
+        return [sp.player_name for sp in ranked]
+
+    def test_no_information_keeps_configured_order(self):
+        self.assertEqual(self._ranked(), ["A", "B", "C"])
+
+    def test_legacy_model_and_wireless_rank_last(self):
+        self.a.speaker_info = {"model_number": "S1"}
+        self.topology.set_wired("uid-b", False)
+        self.assertEqual(self._ranked(), ["C", "B", "A"])
+
+    def test_measured_latency_needs_history_and_a_real_difference(self):
+        for _ in range(5):
+            self.stats.record("192.168.1.100", "speaker_info", 0.400)
+            self.stats.record("192.168.1.101", "speaker_info", 0.030)
+            self.stats.record("192.168.1.102", "speaker_info", 0.010)
+        # B and C are within one bucket, so configured order decides.
+        self.assertEqual(self._ranked(), ["B", "C", "A"])
+
+    def test_latency_compares_the_probe_only(self):
+        """A coordinator's slow pauses and snapshots do not count against it."""
+        for _ in range(5):
+            self.stats.record("192.168.1.100", "speaker_info", 0.020)
+            self.stats.record("192.168.1.100", "snapshot", 0.900)
+            self.stats.record("192.168.1.100", "pause", 0.700)
+            self.stats.record("192.168.1.101", "speaker_info", 0.300)
+            self.stats.record("192.168.1.101", "join", 0.010)
+            self.stats.record("192.168.1.101", "join", 0.010)
+        self.assertEqual(self._ranked(), ["A", "C", "B"])
+
+    def test_cached_profile_used_when_not_reported(self):
+        """A play that cannot read the wired status uses the last one seen."""
+        self.topology.set_wired("uid-a", False)
+        self._ranked()
+        self.assertEqual(self.stats.profile("192.168.1.100"), {"model": "S16", "wired": False})
+        from sonos_topology import Topology
+        self.topology = Topology()
+        self.a.speaker_info = MagicMock()
+        self.assertEqual(self._ranked(), ["B", "C", "A"])
+
+    def _play(self, cfg_overrides=None):
+        import sonos_play
+        speakers = {}
+        for ip, name in (("192.168.1.100", "A"), ("192.168.1.101", "B")):
+            sp = _make_speaker(name, f"uid-{name.lower()}")
+            sp.ip_address = ip
+            sp.get_current_transport_info.return_value = {"current_transport_state": "STOPPED"}
+            sp.zoneGroupTopology.GetZoneGroupState.return_value = {"ZoneGroupState": _ZGS_A_WIRELESS_B_WIRED}
+            speakers[ip] = sp
+        cfg = _base_config()
+        cfg["speakers"] = list(speakers)
+        cfg.update(cfg_overrides or {})
+        with patch("sonos_play.LATENCY_STATS_FILE", self.stats.path), \
+             patch("sonos_play.load_config", return_value=cfg), \
+             patch("sonos_play.soco.SoCo", side_effect=speakers.__getitem__), \
+             patch("sonos_play.Snapshot", return_value=MagicMock()), \
+             patch("sonos_play.get_mp3_duration", return_value=5), \
+             patch("sonos_play._settle"), \
+             patch("sonos_play.time.sleep"), \
+             patch("sonos_play.log"):
+            sonos_play.main(["--ignore-guard", AUDIO_URL])
+        return speakers.values()
+
+    def test_wired_speaker_coordinates_the_bugle_group(self):
+        a, b = self._play()
+        b.play_uri.assert_called_once_with(AUDIO_URL)
+        a.play_uri.assert_not_called()
+        a.join.assert_called_once_with(b)
+
+    def test_election_can_be_disabled(self):
+        a, b = self._play({"coordinator_election": "first"})
+        a.play_uri.assert_called_once_with(AUDIO_URL)
+        b.join.assert_called_once_with(a)
+
+
+
+class TestSequencePlayback(unittest.TestCase):
+    """Several audio URLs play back to back inside one grouping session."""
+
+    def test_clips_share_one_session(self):
+        import sonos_play
+        speaker = _make_speaker("Living Room", "uid-lr")
+        speaker.group = _make_group([speaker], speaker)
+        speaker.get_current_transport_info.return_value = {"current_transport_state": "PLAYING"}
+        events = []
+        speaker.play_uri.side_effect = lambda url: events.append(url)
+
+        with patch("sonos_play.load_config", return_value=_base_config()), \
+             patch("sonos_play.soco.SoCo", return_value=speaker), \
+             patch("sonos_play.Snapshot", return_value=MagicMock()) as mock_snapshot, \
+             patch("sonos_play.get_mp3_duration", return_value=5), \
+             patch("sonos_play.time.sleep", side_effect=lambda secs: events.append(("sleep", secs))), \
+             patch("sonos_play.log"):
+            sonos_play.main(["--ignore-guard", "--gaps", "4", AUDIO_URL, "http://example.com/colors.mp3"])
+
+        plays = [e for e in events if isinstance(e, str)]
+        self.assertEqual(plays, [AUDIO_URL, "http://example.com/colors.mp3"])
+        between = events[events.index(AUDIO_URL) + 1:events.index("http://example.com/colors.mp3")]
+        self.assertIn(("sleep", 4), between)
+        mock_snapshot.assert_called_once()
+        speaker.stop.assert_called_once()
+        speaker.pause.assert_called_once()
+
+    def test_gaps_validation(self):
+        import sonos_play
+        self.assertEqual(sonos_play._parse_gaps(None, 2), [0, 0])
+        self.assertEqual(sonos_play._parse_gaps("3", 3), [0, 3, 3])
+        self.assertEqual(sonos_play._parse_gaps("0,2.5", 3), [0, 0, 2.5])
+        for bad in ("1,2", "-1", "abc", "9999"):
+            with self.subTest(gaps=bad), self.assertRaises(ValueError):
+                sonos_play._parse_gaps(bad, 2 if bad == "1,2" else 3)
+
+
+
+class TestCoalescedSchedules(unittest.TestCase):
+    """A schedule firing right after another plays in the earlier one's session."""
+
+    def setUp(self):
+        import tempfile
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        p = patch("coalesce.MERGED_PLAYS_FILE", os.path.join(tmpdir.name, "flag-merged.json"))
+        p.start()
+        self.addCleanup(p.stop)
+        self.cfg = _base_config()
+        self.cfg["schedules"] = [
+            {"name": "retreat", "time": "19:00", "audio_url": AUDIO_URL},
+            {"name": "colors", "time": "19:01", "audio_url": "http://example.com/colors.mp3"},
+            {"name": "taps", "time": "21:00", "audio_url": "http://example.com/taps.mp3"},
+        ]
+        self.cfg["coalesce_window_seconds"] = 90
+
+    def _main(self, argv):
+        import sonos_play
+        speaker = _make_speaker("Living Room", "uid-lr")
+        speaker.group = _make_group([speaker], speaker)
+        speaker.get_current_transport_info.return_value = {"current_transport_state": "STOPPED"}
+        with patch("sonos_play.load_config", return_value=self.cfg), \
+             patch("sonos_play.soco.SoCo", return_value=speaker), \
+             patch("sonos_play.Snapshot", return_value=MagicMock()), \
+             patch("sonos_play.get_mp3_duration", return_value=5), \
+             patch("sonos_play.time.sleep"), \
+             patch("sonos_play.log"):
+            sonos_play.main(argv)
+        return speaker
+
+    def test_leader_plays_follower_and_follower_skips(self):
+        leader = self._main(["--ignore-guard", "--schedule", "retreat", AUDIO_URL])
+        self.assertEqual(
+            [c.args[0] for c in leader.play_uri.call_args_list],
+            [AUDIO_URL, "http://example.com/colors.mp3"],
+        )
+
+        with self.assertRaises(SystemExit) as cm:
+            self._main(["--ignore-guard", "--schedule", "colors", "http://example.com/colors.mp3"])
+        self.assertEqual(cm.exception.code, 0)
+
+    def test_aborted_leader_leaves_follower_to_play(self):
+        """A leader that never reaches play_uri does not suppress its follower."""
+        with patch("sonos_play.discover_speakers", return_value=([], {})), \
+             self.assertRaises(SystemExit):
+            self._main(["--ignore-guard", "--schedule", "retreat", AUDIO_URL])
+        follower = self._main(["--ignore-guard", "--schedule", "colors", "http://example.com/colors.mp3"])
+        follower.play_uri.assert_called_once_with("http://example.com/colors.mp3")
+
+    def test_started_follower_is_not_played_again(self):
+        """A follower that went ahead on its own is dropped from the leader's session."""
+        self._main(["--ignore-guard", "--schedule", "colors", "http://example.com/colors.mp3"])
+        leader = self._main(["--ignore-guard", "--schedule", "retreat", AUDIO_URL])
+        leader.play_uri.assert_called_once_with(AUDIO_URL)
+
+    def test_schedules_outside_window_play_alone(self):
+        speaker = self._main(["--ignore-guard", "--schedule", "taps", "http://example.com/taps.mp3"])
+        speaker.play_uri.assert_called_once_with("http://example.com/taps.mp3")
+
+    def test_schedules_on_other_speakers_play_alone(self):
+        """A schedule on its own speakers is not merged; it may play concurrently instead."""
+        self.cfg["speakers"] = ["192.168.1.100", "192.168.1.101"]
+        self.cfg["schedules"][1]["speakers"] = ["192.168.1.101"]
+        leader = self._main(["--ignore-guard", "--schedule", "retreat", AUDIO_URL])
+        leader.play_uri.assert_called_once_with(AUDIO_URL)
+
+
+class TestScheduleSpeakers(unittest.TestCase):
+    """A schedule listing its own speakers plays on those only."""
+
+    def test_only_listed_speakers_are_discovered(self):
+        import sonos_play
+        cfg = _base_config()
+        cfg["speakers"] = [{"ip": "192.168.1.100", "name": "Flagpole"}, {"ip": "192.168.1.101", "name": "Chapel"}]
+        cfg["schedules"] = [{"name": "bell", "time": "12:00", "audio_url": AUDIO_URL, "speakers": ["Chapel"]}]
+        speaker = _make_speaker("Chapel", "uid-ch")
+        speaker.group = _make_group([speaker], speaker)
+        speaker.get_current_transport_info.return_value = {"current_transport_state": "STOPPED"}
+        with patch("sonos_play.load_config", return_value=cfg), \
+             patch("sonos_play.soco.SoCo", return_value=speaker) as soco_cls, \
+             patch("sonos_play.Snapshot", return_value=MagicMock()), \
+             patch("sonos_play.get_mp3_duration", return_value=5), \
+             patch("sonos_play.time.sleep"), \
+             patch("sonos_play.log"):
+            sonos_play.main(["--ignore-guard", "--schedule", "bell", AUDIO_URL])
+        self.assertEqual({c.args[0] for c in soco_cls.call_args_list}, {"192.168.1.101"})
+        speaker.play_uri.assert_called_once_with(AUDIO_URL)
+
+    def test_spaced_schedule_name_from_unit(self):
+        """A unit for "Chapel Taps" passes --schedule Chapel-Taps and still plays on Chapel only."""
+        import sonos_play
+        cfg = _base_config()
+        cfg["speakers"] = [{"ip": "192.168.1.100", "name": "Flagpole"}, {"ip": "192.168.1.101", "name": "Chapel"}]
+        cfg["schedules"] = [{"name": "Chapel Taps", "time": "21:00", "audio_url": AUDIO_URL, "speakers": ["Chapel"]}]
+        speaker = _make_speaker("Chapel", "uid-ch")
+        speaker.group = _make_group([speaker], speaker)
+        speaker.get_current_transport_info.return_value = {"current_transport_state": "STOPPED"}
+        with patch("sonos_play.load_config", return_value=cfg), \
+             patch("sonos_play.soco.SoCo", return_value=speaker) as soco_cls, \
+             patch("sonos_play.Snapshot", return_value=MagicMock()), \
+             patch("sonos_play.get_mp3_duration", return_value=5), \
+             patch("sonos_play.time.sleep"), \
+             patch("sonos_play.log"):
+            sonos_play.main(["--ignore-guard", "--schedule", "Chapel-Taps", AUDIO_URL])
+        self.assertEqual({c.args[0] for c in soco_cls.call_args_list}, {"192.168.1.101"})
+        speaker.play_uri.assert_called_once_with(AUDIO_URL)
+
+    def test_unknown_speaker_aborts(self):
+        import sonos_play
+        cfg = _base_config()
+        cfg["schedules"] = [{"name": "bell", "time": "12:00", "audio_url": AUDIO_URL, "speakers": ["Chapel"]}]
+        with patch("sonos_play.load_config", return_value=cfg), \
+             patch("sonos_play.soco.SoCo") as soco_cls, \
+             patch("sonos_play.log"):
+            with self.assertRaises(SystemExit):
+                sonos_play.main(["--ignore-guard", "--schedule", "bell", AUDIO_URL])
+        soco_cls.assert_not_called()
+
+
+class TestGroupMateLocks(unittest.TestCase):
+    """Plays whose speakers only overlap through a pre-existing group do not fight over it."""
+
+    _ZGS = """<ZoneGroupState><ZoneGroups>
+  <ZoneGroup Coordinator="uid-f" ID="uid-f:1">
+    <ZoneGroupMember UUID="uid-f" Location="http://192.168.1.100:1400/xml/device_description.xml" ZoneName="Flagpole"/>
+    <ZoneGroupMember UUID="uid-c" Location="http://192.168.1.101:1400/xml/device_description.xml" ZoneName="Chapel"/>
+  </ZoneGroup>
+</ZoneGroups></ZoneGroupState>"""
+
+    def setUp(self):
+        self.speakers = {}
+        for ip, name in (("192.168.1.100", "Flagpole"), ("192.168.1.101", "Chapel")):
+            sp = _make_speaker(name, f"uid-{name[0].lower()}")
+            sp.ip_address = ip
+            sp.get_current_transport_info.return_value = {"current_transport_state": "PLAYING"}
+            sp.zoneGroupTopology.GetZoneGroupState.return_value = {"ZoneGroupState": self._ZGS}
+            self.speakers[ip] = sp
+        self.flagpole, self.chapel = self.speakers.values()
+        self.cfg = _base_config()
+        self.cfg["speakers"] = [{"ip": "192.168.1.100", "name": "Flagpole"}, {"ip": "192.168.1.101", "name": "Chapel"}]
+        self.cfg["schedules"] = [{"name": "colors", "time": "08:00", "audio_url": AUDIO_URL, "speakers": ["Flagpole"]}]
+
+    def _play(self):
+        import sonos_play
+        with patch("sonos_play.load_config", return_value=self.cfg), \
+             patch("sonos_play.soco.SoCo", side_effect=self.speakers.__getitem__), \
+             patch("sonos_play.Snapshot", return_value=MagicMock()), \
+             patch("sonos_play.get_mp3_duration", return_value=5), \
+             patch("sonos_play._settle"), \
+             patch("sonos_play.time.sleep"), \
+             patch("sonos_play.log"):
+            sonos_play.main(["--ignore-guard", "--schedule", "colors", AUDIO_URL])
+
+    def test_group_mate_held_by_another_play_is_left_alone(self):
+        """Chapel is playing for another schedule: it is not rejoined to Flagpole's group."""
+        import sonos_play
+        other = sonos_play.acquire_play_lock("taps", speakers=["192.168.1.101"])
+        self.addCleanup(sonos_play.release_play_lock, other)
+        self._play()
+        self.flagpole.play_uri.assert_called_once_with(AUDIO_URL)
+        self.chapel.join.assert_not_called()
+        self.chapel.unjoin.assert_not_called()
+
+    def test_free_group_mate_is_locked_until_restored(self):
+        """A play for Chapel cannot start while Flagpole's play will still rejoin it."""
+        import sonos_play
+        admitted = []
+
+        def try_other_play(url):
+            lock = sonos_play.acquire_play_lock("taps", speakers=["192.168.1.101"])
+            admitted.append(lock is not None)
+            if lock is not None:
+                sonos_play.release_play_lock(lock)
+
+        self.flagpole.play_uri.side_effect = try_other_play
+        self._play()
+        self.assertEqual(admitted, [False])
+        self.chapel.join.assert_called_once_with(self.flagpole)
+        lock = sonos_play.acquire_play_lock("taps", speakers=["192.168.1.101"])
+        self.assertIsNotNone(lock)
+        sonos_play.release_play_lock(lock)
+
+
+class TestFastStart(unittest.TestCase):
+    """soco and mutagen are only imported once a play goes ahead."""
+
+    # Generous for a Raspberry Pi; importing soco and mutagen eagerly took ~0.2 s
+    # on a desktop, the lazy import about a third of that.
+    IMPORT_BUDGET_SECS = 0.5
+    HEAVY_MODULES = ("soco.core", "soco.snapshot", "mutagen.mp3", "astral", "pytz", "schedule_sonos")
+
+    def _run(self, code, config=None):
+        """Run *code* in a fresh interpreter and return its JSON output."""
+        import json
+        import subprocess
+        import tempfile
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        env = dict(os.environ, FLAG_INSTALL_DIR=tmpdir.name)
+        if config is not None:
+            env["FLAG_CONFIG"] = os.path.join(tmpdir.name, "config.json")
+            with open(env["FLAG_CONFIG"], "w") as f:
+                json.dump(config, f)
+        out = subprocess.run(
+            [sys.executable, "-c", code], env=env, capture_output=True, text=True, timeout=60,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        self.assertEqual(out.returncode, 0, out.stderr)
+        return json.loads(out.stdout.splitlines()[-1])
+
+    def test_import_within_budget_without_playback_stack(self):
+        result = self._run(
+            "import json, sys, time\n"
+            "started = time.perf_counter()\n"
+            "import sonos_play\n"
+            "elapsed = time.perf_counter() - started\n"
+            f"print(json.dumps([elapsed, [m for m in {self.HEAVY_MODULES!r} if m in sys.modules]]))\n"
+        )
+        elapsed, loaded = result
+        self.assertEqual(loaded, [])
+        self.assertLess(elapsed, self.IMPORT_BUDGET_SECS)
+
+    def test_guard_refusal_never_loads_playback_stack(self):
+        from datetime import datetime, timedelta, timezone
+        fire = (datetime.now(timezone.utc) + timedelta(hours=6)).strftime("%H:%M")
+        config = dict(_base_config(), allow_quiet_hours_play=False, timezone="UTC", schedules=[
+            {"name": "colors", "time": fire, "audio_url": AUDIO_URL},
+        ])
+        result = self._run(
+            "import json, sys\n"
+            "import sonos_play\n"
+            "try:\n"
+            f"    sonos_play.main([{AUDIO_URL!r}])\n"
+            "except SystemExit as e:\n"
+            "    code = e.code\n"
+            f"print(json.dumps([code, [m for m in {self.HEAVY_MODULES!r} if m in sys.modules]]))\n",
+            config,
+        )
+        self.assertEqual(result, [1, []])
+
+
 if __name__ == "__main__":
     unittest.main()
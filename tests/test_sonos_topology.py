@@ -0,0 +1,181 @@
+"""
+tests/test_sonos_topology.py — Unit tests for the one-shot zone group topology.
+
+Run with:
+    python -m pytest tests/
+  or:
+    python -m unittest discover tests/
+"""
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock, PropertyMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sonos_topology  # noqa: E402
+
+
+ZGS_PAYLOAD = """<ZoneGroupState><ZoneGroups>
+  <ZoneGroup Coordinator="RINCON_A" ID="RINCON_A:1">
+    <ZoneGroupMember UUID="RINCON_A" Location="http://10.0.0.1:1400/xml/device_description.xml" ZoneName="Flag" EthLink="1"/>
+    <ZoneGroupMember UUID="RINCON_B" Location="http://10.0.0.2:1400/xml/device_description.xml" ZoneName="Porch" EthLink="0"/>
+    <ZoneGroupMember UUID="RINCON_B2" Location="http://10.0.0.9:1400/xml/device_description.xml" ZoneName="Porch" Invisible="1"/>
+  </ZoneGroup>
+  <ZoneGroup Coordinator="RINCON_C" ID="RINCON_C:7">
+    <ZoneGroupMember UUID="RINCON_C" Location="http://10.0.0.3:1400/xml/device_description.xml" ZoneName="Chapel"/>
+  </ZoneGroup>
+</ZoneGroups></ZoneGroupState>"""
+
+# Pre-10.1 firmware: no <ZoneGroups> wrapper.
+LEGACY_PAYLOAD = """<ZoneGroups>
+  <ZoneGroup Coordinator="RINCON_C" ID="RINCON_C:7">
+    <ZoneGroupMember UUID="RINCON_C" Location="http://10.0.0.3:1400/xml/device_description.xml" ZoneName="Chapel"/>
+  </ZoneGroup>
+</ZoneGroups>"""
+
+
+def _speaker(uid, ip):
+    sp = MagicMock()
+    sp.uid = uid
+    sp.ip_address = ip
+    return sp
+
+
+class TestParseZoneGroupState(unittest.TestCase):
+    """parse_zone_group_state builds the uid -> coordinator / members map."""
+
+    def test_coordinator_and_members(self):
+        topo = sonos_topology.parse_zone_group_state(ZGS_PAYLOAD)
+        self.assertEqual(topo.coordinator("RINCON_B"), "RINCON_A")
+        self.assertEqual(topo.members("RINCON_B"), ["RINCON_A", "RINCON_B"])
+        self.assertEqual(topo.members("RINCON_C"), ["RINCON_C"])
+        self.assertEqual(topo.name("RINCON_C"), "Chapel")
+
+    def test_invisible_members_excluded(self):
+        """The hidden half of a stereo pair is not a joinable member."""
+        topo = sonos_topology.parse_zone_group_state(ZGS_PAYLOAD)
+        self.assertNotIn("RINCON_B2", topo)
+
+    def test_wired_status_from_eth_link(self):
+        topo = sonos_topology.parse_zone_group_state(ZGS_PAYLOAD)
+        self.assertIs(topo.wired("RINCON_A"), True)
+        self.assertIs(topo.wired("RINCON_B"), False)
+        self.assertIsNone(topo.wired("RINCON_C"))
+
+    def test_legacy_layout(self):
+        topo = sonos_topology.parse_zone_group_state(LEGACY_PAYLOAD)
+        self.assertEqual(topo.groups(), {"RINCON_C": ["RINCON_C"]})
+
+    def test_garbage_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            sonos_topology.parse_zone_group_state("<not-zgs/>")
+        with self.assertRaises(ValueError):
+            sonos_topology.parse_zone_group_state("not xml at all")
+
+    def test_speaker_built_from_location_ip(self):
+        """Unbound members are constructed from the Location IP, bound ones reused."""
+        topo = sonos_topology.parse_zone_group_state(ZGS_PAYLOAD)
+        bound = _speaker("RINCON_A", "10.0.0.1")
+        topo.bind([bound])
+        with patch("sonos_topology.soco.SoCo") as mock_soco:
+            self.assertIs(topo.speaker("RINCON_A"), bound)
+            topo.speaker("RINCON_B")
+        mock_soco.assert_called_once_with("10.0.0.2")
+
+
+class TestLoadTopology(unittest.TestCase):
+    """load_topology fetches once and falls back to per-group queries."""
+
+    def test_single_fetch_from_first_speaker(self):
+        a, c = _speaker("RINCON_A", "10.0.0.1"), _speaker("RINCON_C", "10.0.0.3")
+        a.zoneGroupTopology.GetZoneGroupState.return_value = {"ZoneGroupState": ZGS_PAYLOAD}
+        type(a).group = PropertyMock(side_effect=AssertionError("group queried"))
+        type(c).group = PropertyMock(side_effect=AssertionError("group queried"))
+
+        topo = sonos_topology.load_topology([a, c])
+
+        a.zoneGroupTopology.GetZoneGroupState.assert_called_once()
+        c.zoneGroupTopology.GetZoneGroupState.assert_not_called()
+        self.assertIs(topo.speaker("RINCON_C"), c)
+
+    def test_fallback_to_group_properties(self):
+        """A failing GetZoneGroupState falls back to each speaker's group."""
+        a, b = _speaker("RINCON_A", "10.0.0.1"), _speaker("RINCON_B", "10.0.0.2")
+        a.zoneGroupTopology.GetZoneGroupState.side_effect = Exception("HTTP 501")
+        group = MagicMock()
+        group.coordinator = a
+        group.members = [a, b]
+        a.group = group
+        b.group = group
+
+        topo = sonos_topology.load_topology([a, b])
+
+        self.assertEqual(topo.members("RINCON_B"), ["RINCON_A", "RINCON_B"])
+        self.assertIs(topo.speaker("RINCON_A"), a)
+
+    def test_fallback_when_target_missing(self):
+        """A payload that does not cover every target is not trusted."""
+        a, x = _speaker("RINCON_A", "10.0.0.1"), _speaker("RINCON_X", "10.0.0.8")
+        a.zoneGroupTopology.GetZoneGroupState.return_value = {"ZoneGroupState": ZGS_PAYLOAD}
+        group = MagicMock()
+        group.coordinator = x
+        group.members = [x]
+        x.group = group
+        group_a = MagicMock()
+        group_a.coordinator = a
+        group_a.members = [a]
+        a.group = group_a
+
+        topo = sonos_topology.load_topology([a, x])
+
+        self.assertEqual(topo.coordinator("RINCON_X"), "RINCON_X")
+
+
+class TestPlanRegroup(unittest.TestCase):
+    """plan_regroup issues only the joins/unjoins that change something."""
+
+    def test_already_in_place_costs_nothing(self):
+        grouping = {"A": "A", "B": "A", "C": "C"}
+        self.assertEqual(sonos_topology.plan_regroup(grouping, {"A": ["A", "B"]})[:2], ([], []))
+
+    def test_standalone_targets_join_without_unjoin(self):
+        grouping = {"A": "A", "B": "B", "C": "C"}
+        unjoins, joins, result = sonos_topology.plan_regroup(grouping, {"A": ["A", "B", "C"]})
+        self.assertEqual(unjoins, [])
+        self.assertEqual(sorted(joins), [("B", "A"), ("C", "A")])
+        self.assertEqual(result, {"A": "A", "B": "A", "C": "A"})
+
+    def test_coordinator_with_non_target_member_leaves(self):
+        """D must not hear the call, so A unjoins; B (A's member) then needs a join."""
+        grouping = {"A": "A", "B": "A", "D": "A"}
+        unjoins, joins, result = sonos_topology.plan_regroup(grouping, {"A": ["A", "B"]})
+        self.assertEqual(unjoins, ["A"])
+        self.assertEqual(joins, [("B", "A")])
+        self.assertIsNone(result["D"])
+
+    def test_coordinator_that_is_a_member_elsewhere_unjoins(self):
+        grouping = {"A": "K", "K": "K"}
+        unjoins, joins, _ = sonos_topology.plan_regroup(grouping, {"A": ["A"]})
+        self.assertEqual((unjoins, joins), (["A"], []))
+
+    def test_restore_leaves_original_members_in_place(self):
+        """After the call only the borrowed speaker moves back."""
+        bugle = {"A": "A", "B": "A", "C": "A"}
+        original = {"A": ["B"], "C": []}
+        unjoins, joins, _ = sonos_topology.plan_regroup(bugle, original)
+        self.assertEqual((unjoins, joins), (["C"], []))
+
+    def test_restore_joins_member_back_to_non_target_coordinator(self):
+        bugle = {"A": "A", "B": "A", "K": "K", "E": "K"}
+        unjoins, joins, _ = sonos_topology.plan_regroup(bugle, {"K": ["E", "B"], "A": []})
+        self.assertEqual((unjoins, joins), ([], [("B", "K")]))
+
+    def test_unknown_state_gets_explicit_operation(self):
+        grouping = {"A": "A", "B": None}
+        self.assertEqual(sonos_topology.plan_regroup(grouping, {"A": ["B"]})[1], [("B", "A")])
+        self.assertEqual(sonos_topology.plan_regroup(grouping, {"B": []})[0], ["B"])
+
+
+if __name__ == "__main__":
+    unittest.main()
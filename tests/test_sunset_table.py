@@ -0,0 +1,90 @@
+"""
+tests/test_sunset_table.py — Unit tests for the precomputed sunset table.
+
+Run with:
+    python -m pytest tests/
+  or:
+    python -m unittest discover tests/
+"""
+import sys
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sunset_table  # noqa: E402
+from sunset_table import NO_SUNSET, SunsetTable, lookup, refresh  # noqa: E402
+
+LOCATION = (42.1, -71.5, "America/New_York")
+START = date(2026, 3, 1)
+
+
+class TestSunsetTable(unittest.TestCase):
+    """Lookups come from the file written for the same location."""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, "sunset_table.bin")
+
+    def test_matches_astral_across_dst_change(self):
+        import pytz
+        from astral import LocationInfo
+        from astral.sun import sun
+        self.assertTrue(refresh(*LOCATION, today=START, path=self.path))
+        loc = LocationInfo("x", "y", LOCATION[2], LOCATION[0], LOCATION[1])
+        tz_obj = pytz.timezone(LOCATION[2])
+        for day in (START, date(2026, 3, 8), date(2026, 3, 9), date(2026, 11, 2)):
+            expected = sun(loc.observer, date=day, tzinfo=tz_obj)["sunset"]
+            self.assertAlmostEqual(
+                lookup(*LOCATION, day, path=self.path).timestamp(), expected.timestamp(), delta=1,
+            )
+
+    def test_other_location_or_day_not_answered(self):
+        SunsetTable(*LOCATION, START, [1_790_000_000]).save(self.path)
+        self.assertIsNotNone(lookup(*LOCATION, START, path=self.path))
+        self.assertIsNone(lookup(42.1, -71.5, "UTC", START, path=self.path))
+        self.assertIsNone(lookup(*LOCATION, START + timedelta(days=1), path=self.path))
+        self.assertIsNone(lookup(*LOCATION, START, path=self.path + ".missing"))
+
+    def test_day_without_sunset_raises_like_astral(self):
+        SunsetTable(*LOCATION, START, [NO_SUNSET]).save(self.path)
+        with self.assertRaises(ValueError):
+            lookup(*LOCATION, START, path=self.path)
+
+    def test_rebuilt_only_when_running_out_or_moved(self):
+        SunsetTable(*LOCATION, START, [0] * 60).save(self.path)
+        with patch.object(SunsetTable, "build", wraps=SunsetTable.build) as build:
+            self.assertFalse(refresh(*LOCATION, today=START + timedelta(days=10), path=self.path))
+            self.assertTrue(refresh(*LOCATION, today=START + timedelta(days=40), path=self.path))
+            self.assertTrue(refresh(10.0, 10.0, "UTC", today=START, path=self.path))
+        self.assertEqual(build.call_count, 2)
+
+    def test_corrupt_file_ignored(self):
+        with open(self.path, "wb") as f:
+            f.write(b"FLSS\x01garbage")
+        self.assertIsNone(lookup(*LOCATION, START, path=self.path))
+
+
+class TestScheduleSonosUsesTable(unittest.TestCase):
+    """schedule_sonos reads sunset from the table and only falls back to astral."""
+
+    def setUp(self):
+        import schedule_resolve
+        schedule_resolve.sunset_on.cache_clear()
+
+    def test_table_hit_skips_astral(self):
+        import schedule_sonos
+        config = {"latitude": 42.1, "longitude": -71.5, "timezone": "America/New_York"}
+        sunset = datetime(2026, 7, 1, 0, 24, tzinfo=timezone.utc)  # 20:24 EDT
+        with patch.object(sunset_table, "lookup", return_value=sunset), \
+             patch("schedule_resolve._astral_sunset") as astral_sunset:
+            self.assertEqual(schedule_sonos.get_sunset_local_time_with_offset(config, -5), (20, 19))
+        astral_sunset.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()